@@ -0,0 +1,141 @@
+"""Automod cost per message: legacy automod_check + extra_automod vs the compiled pipeline.
+
+The legacy path is replayed detection-only (config copies, one regex per
+rule, list-building caps_ratio, per-rule lowercasing). The pipeline path is
+AutomodPipeline.check on a fresh AutomodContext. Per-rule latency is measured
+by running each compiled rule alone over the whole corpus.
+
+Usage: python bench/bench_automod.py [messages]
+"""
+import os
+import random
+import re
+import string
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+os.environ.setdefault("DB_PATH", os.path.join(tempfile.mkdtemp(prefix="leviathan-bench-"), "bench.db"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402
+
+GUILD = 1000
+USERS = 500
+INVITE_RE = re.compile(r"(discord\.gg/|discord\.com/invite/)", re.IGNORECASE)
+URL_RE = re.compile(r"https?://", re.IGNORECASE)
+
+
+def random_word(rng: random.Random) -> str:
+    return "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 9)))
+
+
+def corpus(rng: random.Random, n: int, badwords):
+    guild = SimpleNamespace(id=GUILD)
+    perms = SimpleNamespace(manage_messages=False)
+    msgs = []
+    for i in range(n):
+        words = [random_word(rng) for _ in range(rng.randint(2, 25))]
+        roll = rng.random()
+        if roll < 0.01:
+            words.append("discord.gg/" + random_word(rng))
+        elif roll < 0.02:
+            words.append("https://example.com/" + random_word(rng))
+        elif roll < 0.03:
+            words = [w.upper() for w in words]
+        elif roll < 0.04:
+            words.append(rng.choice(badwords))
+        author = SimpleNamespace(id=5000 + rng.randrange(USERS), guild_permissions=perms)
+        msgs.append(SimpleNamespace(content=" ".join(words), mentions=[], role_mentions=[], author=author, guild=guild))
+    return msgs
+
+
+def legacy_caps_ratio(text: str) -> int:
+    if not text:
+        return 0
+    letters = [c for c in text if c.isalpha()]
+    if not letters:
+        return 0
+    caps = [c for c in letters if c.isupper()]
+    return int((len(caps) / len(letters)) * 100)
+
+
+def legacy(msgs):
+    now = time.time()
+    for m in msgs:
+        addon = main.get_addon_config(GUILD)
+        content = m.content or ""
+        matcher = main.BADWORD_MATCHERS.peek(GUILD, main.badword_options(addon))
+        if matcher.find(content) and not m.author.guild_permissions.manage_messages:
+            continue
+        if len(m.mentions) + len(m.role_mentions) >= int(addon.get("mention_threshold") or 5) and not m.author.guild_permissions.manage_messages:
+            continue
+        normalized = re.sub(r"\s+", " ", content.strip().lower())
+        dq = main.RECENT_USER_MESSAGES.hit((GUILD, m.author.id), now, normalized, window=30)
+        if sum(1 for _, x in dq if x and x == normalized) >= 3 and not m.author.guild_permissions.manage_messages:
+            continue
+        cfg = main.get_guild_config(GUILD)
+        if cfg.get("anti_invite", 1) and INVITE_RE.search(content):
+            continue
+        if cfg.get("anti_link", 0) and URL_RE.search(content):
+            continue
+        if cfg.get("anti_caps", 0):
+            if legacy_caps_ratio(content) >= int(cfg.get("caps_threshold", 70)) and len(content) >= 10 and not m.author.guild_permissions.manage_messages:
+                continue
+        main.spam_tracker.hit((GUILD, m.author.id), now, window=float(cfg.get("spam_interval_sec", 2.0)))
+
+
+def pipeline(msgs):
+    now = time.time()
+    for m in msgs:
+        p = main.AUTOMOD_PIPELINES.peek(GUILD) or main.AUTOMOD_PIPELINES.build(GUILD)
+        p.check(main.AutomodContext(m, now))
+
+
+def per_rule(msgs):
+    p = main.AUTOMOD_PIPELINES.build(GUILD)
+    now = time.time()
+    contexts = [main.AutomodContext(m, now) for m in msgs]
+    for name, rule in p.rules:
+        for ctx in contexts:
+            ctx._found = None
+        t0 = time.perf_counter()
+        for ctx in contexts:
+            rule(ctx)
+        dt = time.perf_counter() - t0
+        print(f"  {name:<10} {dt / len(msgs) * 1e6:>7.2f} us/msg")
+
+
+def run(label: str, fn, msgs) -> float:
+    t0 = time.perf_counter()
+    fn(msgs)
+    dt = time.perf_counter() - t0
+    rate = len(msgs) / dt
+    print(f"{label:<10} {len(msgs)} messages in {dt:.3f}s -> {rate:,.0f} msg/s ({dt / len(msgs) * 1e6:.1f} us/msg)")
+    return rate
+
+
+def main_bench():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    rng = random.Random(7)
+    main.db_init()
+    main.db_init_plus()
+    badwords = sorted({"zq" + random_word(rng) for _ in range(200)})
+    for w in badwords:
+        main.badword_add(GUILD, w)
+    main.set_guild_config(GUILD, anti_invite=1, anti_link=1, anti_caps=1)
+    main.set_addon_config(GUILD, anti_bad_words=1, anti_mention_spam=1, anti_duplicate=1)
+    main.BADWORD_MATCHERS.build(GUILD, main.badword_options(main.get_addon_config(GUILD)))
+    msgs = corpus(rng, n, badwords)
+
+    before = run("legacy", legacy, msgs)
+    after = run("pipeline", pipeline, msgs)
+    print(f"speedup    x{after / before:.2f}")
+    print("per rule (each rule alone over the corpus):")
+    per_rule(msgs)
+    main.DB_POOL.close_all()
+
+
+if __name__ == "__main__":
+    main_bench()
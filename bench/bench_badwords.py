@@ -0,0 +1,86 @@
+"""Bad-word matching cost vs list size: legacy `w in lowered` loop vs BadwordMatcher.
+
+The wildcard table compares the old single alternation regex (one branch per
+'*' word) with BadwordMatcher anchoring each wildcard in the automaton.
+
+Usage: python bench/bench_badwords.py [messages]
+"""
+import os
+import random
+import re
+import string
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("DB_PATH", os.path.join(tempfile.mkdtemp(prefix="leviathan-bench-"), "bench.db"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402
+
+
+def random_word(rng: random.Random) -> str:
+    return "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(5, 10)))
+
+
+def corpus(rng: random.Random, n: int):
+    msgs = []
+    for _ in range(n):
+        msgs.append(" ".join(random_word(rng) for _ in range(rng.randint(3, 30))))
+    return msgs
+
+
+def legacy(words, msgs):
+    for content in msgs:
+        lowered = content.lower()
+        next((w for w in words if w and w in lowered), None)
+
+
+def legacy_wild_re(words):
+    parts = [r'\w*'.join(re.escape(seg) for seg in w.split('*')) for w in words]
+    return re.compile('|'.join(f'({p})' for p in parts))
+
+
+def legacy_wild(regex, msgs):
+    for content in msgs:
+        regex.search(content.lower())
+
+
+def compiled(matcher, msgs):
+    for content in msgs:
+        matcher.find(content)
+
+
+def timed(fn, *args) -> float:
+    t0 = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - t0
+
+
+def main_bench():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    rng = random.Random(42)
+    msgs = corpus(rng, n)
+    print(f"{'words':>7} {'legacy us/msg':>14} {'matcher us/msg':>15}")
+    for size in (10, 100, 1000, 10000):
+        words = sorted({"zq" + random_word(rng) for _ in range(size)})
+        matcher = main.BadwordMatcher(words)
+        t0 = time.perf_counter()
+        legacy(words, msgs)
+        t1 = time.perf_counter()
+        compiled(matcher, msgs)
+        t2 = time.perf_counter()
+        print(f"{size:>7} {(t1 - t0) / n * 1e6:>14.1f} {(t2 - t1) / n * 1e6:>15.1f}")
+    print(f"{'wildcards':>9} {'legacy us/msg':>14} {'matcher us/msg':>15}")
+    for size in (10, 100, 1000, 3000):
+        words = sorted({"zq" + random_word(rng)[:3] + "*" + random_word(rng)[:3] for _ in range(size)})
+        matcher = main.BadwordMatcher(words)
+        # the old alternation regex is too slow for the full corpus at large sizes
+        sample = msgs[:max(5, n * 10 // size)]
+        before = timed(legacy_wild, legacy_wild_re(words), sample) / len(sample)
+        after = timed(compiled, matcher, msgs) / n
+        print(f"{size:>9} {before * 1e6:>14.1f} {after * 1e6:>15.1f}")
+
+
+if __name__ == "__main__":
+    main_bench()
@@ -0,0 +1,101 @@
+"""Dashboard time-to-interactive: the loadAll request waterfall vs one /api/bootstrap.
+
+Drives the FastAPI app in-process (httpx ASGITransport) against a fake
+2000-member guild. Every request pays a simulated network round trip, so the
+waterfall costs its ten sequential requests and the bootstrap costs one.
+
+Usage: python bench/bench_bootstrap.py [iterations]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+os.environ.setdefault("DB_PATH", os.path.join(tempfile.mkdtemp(prefix="leviathan-bench-"), "bench.db"))
+os.environ.setdefault("ADMIN_KEY", "bench")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx  # noqa: E402
+
+import main  # noqa: E402
+
+GUILD = 1000
+MEMBERS = 2000
+
+
+class RTTTransport(httpx.AsyncBaseTransport):
+    def __init__(self, inner: httpx.AsyncBaseTransport, rtt: float):
+        self.inner = inner
+        self.rtt = rtt
+
+    async def handle_async_request(self, request):
+        if self.rtt:
+            await asyncio.sleep(self.rtt)
+        return await self.inner.handle_async_request(request)
+
+
+def fake_guild():
+    members = [SimpleNamespace(id=10_000 + i, name=f"user{i}", display_name=f"User {i}", bot=i % 50 == 0) for i in range(MEMBERS)]
+    return SimpleNamespace(id=GUILD, name="Bench", member_count=MEMBERS, members=members, channels=[], roles=[None] * 30, chunked=True)
+
+
+async def waterfall(client: httpx.AsyncClient, k: str, g: int):
+    body = {"k": k, "g": g}
+    await client.post("/api/info", json={"k": k})
+    await client.post("/api/config/get", json=body)
+    await client.post("/api/shop/list", json=body)
+    await client.get("/api/logs")
+    await client.post("/api/members/list", json={**body, "q": "", "limit": 200})
+    await client.post("/api/addons/get", json=body)
+    await client.post("/api/stats/overview", json=body)
+    await client.get("/api/healthz")
+    await client.post("/api/reactionroles/list", json=body)
+    await client.post("/api/tickets/config/get", json=body)
+
+
+async def bootstrap(client: httpx.AsyncClient, k: str, g: int):
+    r = await client.post("/api/bootstrap", json={"k": k, "g": g})
+    assert "overview" in r.json()
+
+
+async def timed(fn, client, iterations: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(iterations):
+        await fn(client, main.ADMIN_KEY, GUILD)
+    return (time.perf_counter() - t0) / iterations * 1000
+
+
+async def run(iterations: int):
+    guild = fake_guild()
+    main.bot.get_guild = lambda gid: guild if gid == GUILD else None
+    inner = httpx.ASGITransport(app=main.app)
+    print(f"{'rtt ms':>6} {'waterfall ms':>13} {'bootstrap ms':>13} {'speedup':>8}")
+    for rtt in (0, 20, 80):
+        async with httpx.AsyncClient(transport=RTTTransport(inner, rtt / 1000), base_url="http://panel") as client:
+            await bootstrap(client, main.ADMIN_KEY, GUILD)
+            before = await timed(waterfall, client, iterations)
+            after = await timed(bootstrap, client, iterations)
+        print(f"{rtt:>6} {before:>13.1f} {after:>13.1f} {before / after:>7.1f}x")
+    main.DB_EXECUTOR.shutdown()
+
+
+def main_bench():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    main.LOG_STDOUT.stream = open(os.devnull, "w")
+    main.db_init()
+    main.db_init_plus()
+    main.shop_seed_if_empty(GUILD)
+    for i in range(20):
+        main.rr_add(GUILD, 5000 + i, "⭐", 7000 + i)
+        main.badword_add(GUILD, f"mot{i}")
+    for i in range(300):
+        main.add_log(f"bench line {i}", guild_id=GUILD, subsystem="bench")
+    asyncio.run(run(iterations))
+    main.DB_POOL.close_all()
+    main.LOG_STDOUT.stop()
+
+
+if __name__ == "__main__":
+    main_bench()
@@ -0,0 +1,73 @@
+"""Messages/second through the per-message DB path, before and after pooling.
+
+Replays the SQLite work one incoming message triggers (automod + addon
+automod + leveling) against a throwaway database:
+
+  * "per-call"  -> a fresh sqlite3 connection per helper call (old db_connect)
+  * "pooled"    -> the thread-local DBPool connections used by main.py
+
+Usage: python bench/bench_db_pool.py [messages]
+"""
+import os
+import sys
+import sqlite3
+import tempfile
+import time
+
+TMP = tempfile.mkdtemp(prefix="leviathan-bench-")
+os.environ["DB_PATH"] = os.path.join(TMP, "bench.db")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402
+
+GUILDS = 5
+USERS = 200
+
+
+def legacy_connect():
+    con = sqlite3.connect(main.DB_PATH)
+    con.row_factory = sqlite3.Row
+    return con
+
+
+def one_message(i: int):
+    gid = 1000 + (i % GUILDS)
+    uid = 5000 + (i % USERS)
+    main.get_addon_config(gid)
+    main.badwords_list(gid)
+    main.get_guild_config(gid)
+    main.get_guild_config(gid)
+    row = main.xp_get(gid, uid)
+    main.XP_STORE.put(gid, uid, int(row["xp"]) + 15, int(row["level"]), i)
+
+
+def run(label: str, n: int) -> float:
+    t0 = time.perf_counter()
+    for i in range(n):
+        one_message(i)
+    dt = time.perf_counter() - t0
+    rate = n / dt
+    print(f"{label:<10} {n} messages in {dt:.3f}s -> {rate:,.0f} msg/s")
+    return rate
+
+
+def main_bench():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    main.db_init()
+    main.db_init_plus()
+    for gid in range(1000, 1000 + GUILDS):
+        main.badword_add(gid, "spamword")
+
+    pooled_connect = main.db_connect
+    main.db_connect = legacy_connect
+    try:
+        before = run("per-call", n)
+    finally:
+        main.db_connect = pooled_connect
+    after = run("pooled", n)
+    print(f"speedup    x{after / before:.2f}")
+    main.DB_POOL.close_all()
+
+
+if __name__ == "__main__":
+    main_bench()
@@ -0,0 +1,101 @@
+"""Concurrency stress test for the economy: legacy get/compute/set vs the transactional API.
+
+USERS accounts start with START coins each; WORKERS coroutines then fire
+random payments between them through the DB executor, like concurrent
+!pay commands. Payments only move coins, so the total must not change:
+
+  * "legacy"  -> econ_get, check, blind balance overwrite x2 (the old command pattern)
+  * "ledger"  -> econ_transfer (one conditional transaction + ledger rows)
+
+The run reports throughput, coins created/lost and, for the ledger path,
+users whose balance differs from their ledger sum (econ_audit).
+
+Usage: python bench/bench_economy.py [payments]
+"""
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("DB_PATH", os.path.join(tempfile.mkdtemp(prefix="leviathan-bench-"), "bench.db"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402
+
+USERS = 50
+START = 1000
+WORKERS = 64
+
+
+def legacy_econ_set(gid: int, uid: int, balance: int, last_daily_ts: int):
+    # the removed econ_set: blind overwrite of the balance read earlier
+    con = main.db_connect()
+    con.execute("""
+        INSERT INTO user_econ(guild_id,user_id,balance,last_daily_ts)
+        VALUES (?,?,?,?)
+        ON CONFLICT(guild_id,user_id) DO UPDATE SET balance=excluded.balance, last_daily_ts=excluded.last_daily_ts
+    """, (gid, uid, balance, last_daily_ts))
+    con.commit()
+
+
+async def legacy_pay(gid: int, src: int, dst: int, amount: int) -> bool:
+    me = await main.econ_get_async(gid, src)
+    if int(me["balance"]) < amount:
+        return False
+    you = await main.econ_get_async(gid, dst)
+    await main.DB_EXECUTOR.run(legacy_econ_set, gid, src, int(me["balance"]) - amount, int(me["last_daily_ts"]))
+    await main.DB_EXECUTOR.run(legacy_econ_set, gid, dst, int(you["balance"]) + amount, int(you["last_daily_ts"]))
+    return True
+
+
+async def ledger_pay(gid: int, src: int, dst: int, amount: int) -> bool:
+    return await main.econ_transfer_async(gid, [(src, dst, amount)], "pay")
+
+
+def total(gid: int) -> int:
+    cur = main.db_connect().cursor()
+    cur.execute("SELECT COALESCE(SUM(balance), 0) AS t FROM user_econ WHERE guild_id=?", (gid,))
+    return int(cur.fetchone()["t"])
+
+
+async def run(label: str, gid: int, pay, n: int):
+    for uid in range(USERS):
+        await main.econ_credit_async(gid, uid, START, "seed")
+    before = total(gid)
+    rng = random.Random(7)
+    jobs = [(rng.randrange(USERS), rng.randrange(USERS), rng.randint(1, 300)) for _ in range(n)]
+    jobs = [j for j in jobs if j[0] != j[1]]
+    queue = iter(jobs)
+    done = 0
+
+    async def worker():
+        nonlocal done
+        for src, dst, amount in queue:
+            if await pay(gid, src, dst, amount):
+                done += 1
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(WORKERS)))
+    dt = time.perf_counter() - t0
+    drift = total(gid) - before
+    audit = len(main.econ_audit(gid))
+    print(f"{label:<7} {len(jobs)} payments ({done} accepted) in {dt:.2f}s -> {len(jobs) / dt:,.0f} ops/s | "
+          f"coins created/lost: {drift:+d} | ledger mismatches: {audit}")
+
+
+async def main_bench():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    main.db_init()
+    await run("legacy", 1, legacy_pay, n)
+    await run("ledger", 2, ledger_pay, n)
+    removed = main.econ_ledger_compact(keep_days=-1)
+    print(f"compaction folded {removed} ledger rows, mismatches after: {len(main.econ_audit(2))}")
+    main.DB_EXECUTOR.shutdown()
+    main.DB_POOL.close_all()
+    main.LOG_STDOUT.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main_bench())
@@ -0,0 +1,52 @@
+"""Cost of add_log on the calling thread: legacy list + pop(0) + print vs LogRing + queue.
+
+stdout is pointed at /dev/null for both runs, so this measures what the
+event loop pays per line, not terminal speed. Results go to stderr.
+
+Usage: python bench/bench_logging.py [lines]
+"""
+import datetime
+import os
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("DB_PATH", os.path.join(tempfile.mkdtemp(prefix="leviathan-bench-"), "bench.db"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402
+
+legacy_logs = []
+
+
+def legacy_add_log(msg: str):
+    ts = datetime.datetime.now().strftime("%H:%M:%S")
+    line = f"[{ts}] {msg}"
+    legacy_logs.append(line)
+    if len(legacy_logs) > main.LOG_BUFFER_SIZE:
+        legacy_logs.pop(0)
+    print(line, flush=True)
+
+
+def run(label: str, fn, n: int) -> float:
+    t0 = time.perf_counter()
+    for i in range(n):
+        fn(f"Automod: message supprimé guild=1 user={i}")
+    dt = time.perf_counter() - t0
+    print(f"{label:<8} {n} lines in {dt:.3f}s -> {dt / n * 1e6:.1f} us/line", file=sys.stderr)
+    return dt
+
+
+def main_bench():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    devnull = open(os.devnull, "w")
+    sys.stdout = devnull
+    main.LOG_STDOUT.stream = devnull
+    before = run("legacy", legacy_add_log, n)
+    after = run("ring", main.add_log, n)
+    main.LOG_STDOUT.stop()
+    print(f"speedup  x{before / after:.2f}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main_bench()
@@ -0,0 +1,98 @@
+"""Join-raid handling: detection cost per join and mitigation latency per joiner.
+
+Detection replays a join flood through the old JOIN_TRACKER check (sliding
+window hit + len) and through RaidShield's ring + creation-date clusters.
+Mitigation compares muting a joiner with per-channel overwrites (one call per
+channel, CHANNEL_OPS_CONCURRENCY in flight) against one add_roles call with
+the pre-created quarantine role, every call paying a simulated round trip.
+
+Usage: python bench/bench_raid.py [joins]
+"""
+import asyncio
+import datetime
+import os
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+os.environ.setdefault("DB_PATH", os.path.join(tempfile.mkdtemp(prefix="leviathan-bench-"), "bench.db"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402
+
+GUILD = 1000
+CHANNELS = 60
+RTT = 0.05
+EPOCH = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+class FakeMember:
+    def __init__(self, member_id: int, guild):
+        self.id = member_id
+        self.guild = guild
+        self.created_at = EPOCH + datetime.timedelta(hours=member_id % 5000)
+
+    async def add_roles(self, role, reason=None):
+        await asyncio.sleep(RTT)
+
+
+class FakeChannel:
+    async def set_permissions(self, target, overwrite=None, reason=None):
+        await asyncio.sleep(RTT)
+
+
+def detection(n: int):
+    tracker = main.SlidingWindowTracker("bench_joins", per_key=200, ttl=3600)
+    t0 = time.perf_counter()
+    for i in range(n):
+        recent = tracker.hit(GUILD, i * 0.01, window=15)
+        len(recent) >= 20
+    legacy = (time.perf_counter() - t0) / n * 1e6
+
+    st = main.GuildRaidState(20)
+    t0 = time.perf_counter()
+    for i in range(n):
+        now = i * 0.01
+        st.join(now, i + 1, 15)
+        st.cluster(now, i % 5000, i + 1)
+    shield = (time.perf_counter() - t0) / n * 1e6
+    print(f"detection  legacy {legacy:.2f} us/join   shield {shield:.2f} us/join (ring + clusters)")
+
+
+async def mitigation(joins: int):
+    channels = [FakeChannel() for _ in range(CHANNELS)]
+    sem = asyncio.Semaphore(main.CHANNEL_OPS_CONCURRENCY)
+
+    async def overwrite(channel):
+        async with sem:
+            await channel.set_permissions(None)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(overwrite(c) for c in channels))
+    per_channel = (time.perf_counter() - t0) * 1000
+
+    guild = SimpleNamespace(id=GUILD, name="Bench", get_role=lambda rid: SimpleNamespace(id=rid, mention="@Quarantaine"), get_member=lambda mid: FakeMember(mid, guild))
+    addon = {'raid_join_threshold': 5, 'raid_join_window_sec': 15, 'raid_quarantine_role_id': 1}
+    for i in range(joins):
+        await main.RAID_SHIELD.on_join(FakeMember(10_000 + i, guild), addon)
+    stats = main.RAID_SHIELD.stats()
+    print(f"mitigation per-channel overwrites {per_channel:.0f} ms/joiner ({CHANNELS} channels, rtt {RTT * 1000:.0f} ms)")
+    print(f"mitigation quarantine role        avg {stats['mitigation']['avg_ms']:.0f} ms  p95 {stats['mitigation']['p95_ms']:.0f} ms over {stats['quarantined']} joiners")
+    print(f"detection in handler              avg {stats['detect']['avg_ms'] * 1000:.1f} us  p95 {stats['detect']['p95_ms'] * 1000:.1f} us")
+
+
+async def silent_modlog(guild, text):
+    pass
+
+
+def main_bench():
+    joins = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    main.send_modlog = silent_modlog
+    main.bot.get_guild = lambda gid: None
+    detection(100_000)
+    asyncio.run(mitigation(joins))
+
+
+if __name__ == "__main__":
+    main_bench()
@@ -8,7 +8,20 @@ import random
 import sqlite3
 import datetime
 import io
-from typing import Optional, Dict, Any, Tuple, List
+import bisect
+import heapq
+import itertools
+import unicodedata
+import sys
+import queue
+import threading
+import string
+import zlib
+import gzip
+import hashlib
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, Tuple, List, Callable, Iterable
 
 import discord
 from discord.ext import commands, tasks
@@ -16,7 +29,12 @@ from discord import app_commands
 
 import uvicorn
 from fastapi import FastAPI, Request
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse, Response
+
+try:
+    import brotli  # optional: adds pre-compressed br variants of the panel assets
+except ImportError:
+    brotli = None
 
 # =========================================================
 # ENV / CONFIG
@@ -31,10 +49,147 @@ START_TIME = time.time()
 # =========================================================
 # DATABASE
 # =========================================================
-def db_connect():
-    con = sqlite3.connect(DB_PATH)
-    con.row_factory = sqlite3.Row
-    return con
+DB_CACHE_KB = int(os.environ.get("DB_CACHE_KB", 16384))
+DB_MMAP_MB = int(os.environ.get("DB_MMAP_MB", 128))
+DB_CACHED_STATEMENTS = int(os.environ.get("DB_CACHED_STATEMENTS", 256))
+
+class DBPool:
+    """Long-lived SQLite connections, one per thread.
+
+    Connections are opened lazily on first use in a thread, tuned once
+    (WAL, synchronous=NORMAL, page cache, mmap) and then reused, so helpers
+    no longer pay an open/close per call. sqlite3 keeps a per-connection
+    cache of prepared statements, which only helps when the connection lives.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._all: List[sqlite3.Connection] = []
+
+    def _open(self) -> sqlite3.Connection:
+        con = sqlite3.connect(
+            self.path,
+            timeout=10,
+            check_same_thread=False,
+            cached_statements=DB_CACHED_STATEMENTS,
+        )
+        con.row_factory = sqlite3.Row
+        con.execute("PRAGMA journal_mode=WAL")
+        con.execute("PRAGMA synchronous=NORMAL")
+        con.execute(f"PRAGMA cache_size=-{DB_CACHE_KB}")
+        con.execute(f"PRAGMA mmap_size={DB_MMAP_MB * 1024 * 1024}")
+        con.execute("PRAGMA temp_store=MEMORY")
+        con.execute("PRAGMA busy_timeout=10000")
+        return con
+
+    def connection(self) -> sqlite3.Connection:
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = self._open()
+            self._local.con = con
+            with self._lock:
+                self._all.append(con)
+        return con
+
+    def close_all(self):
+        with self._lock:
+            cons, self._all = self._all, []
+        for con in cons:
+            try:
+                con.close()
+            except Exception:
+                pass
+        self._local = threading.local()
+
+DB_POOL = DBPool(DB_PATH)
+
+def db_connect() -> sqlite3.Connection:
+    """Return this thread's pooled connection. Callers must NOT close it."""
+    return DB_POOL.connection()
+
+class DBExecutor:
+    """Dedicated thread that runs every blocking SQLite call off the event loop.
+
+    One worker is enough: SQLite serialises writers anyway, and a single
+    thread means a single pooled connection with a warm statement cache.
+    Queue depth and wait/run times are tracked for /api/healthz.
+    """
+
+    def __init__(self, name: str = "leviathan-db"):
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.max_pending = 0
+        self.ops = 0
+        self.errors = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.run_total = 0.0
+        self.run_max = 0.0
+
+    def _call(self, enqueued: float, fn, args, kwargs):
+        started = time.perf_counter()
+        failed = False
+        try:
+            return fn(*args, **kwargs)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            ran = time.perf_counter() - started
+            waited = started - enqueued
+            with self._lock:
+                self.pending -= 1
+                self.ops += 1
+                self.errors += 1 if failed else 0
+                self.wait_total += waited
+                self.wait_max = max(self.wait_max, waited)
+                self.run_total += ran
+                self.run_max = max(self.run_max, ran)
+
+    async def run(self, fn, *args, **kwargs):
+        with self._lock:
+            self.pending += 1
+            self.max_pending = max(self.max_pending, self.pending)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool, self._call, time.perf_counter(), fn, args, kwargs)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            ops = self.ops or 1
+            return {
+                "queue_depth": self.pending,
+                "max_queue_depth": self.max_pending,
+                "ops": self.ops,
+                "errors": self.errors,
+                "avg_wait_ms": round(self.wait_total / ops * 1000, 3),
+                "max_wait_ms": round(self.wait_max * 1000, 3),
+                "avg_run_ms": round(self.run_total / ops * 1000, 3),
+                "max_run_ms": round(self.run_max * 1000, 3),
+            }
+
+    def shutdown(self):
+        self._pool.shutdown(wait=True)
+
+DB_EXECUTOR = DBExecutor()
+
+def db_async(fn):
+    """Build the awaitable twin of a blocking DB helper (runs on DB_EXECUTOR)."""
+    async def runner(*args, **kwargs):
+        return await DB_EXECUTOR.run(fn, *args, **kwargs)
+    runner.__name__ = runner.__qualname__ = f"{fn.__name__}_async"
+    runner.__doc__ = fn.__doc__
+    return runner
+
+def ensure_columns(cur: sqlite3.Cursor, table: str, columns: Dict[str, str]):
+    """Add missing columns to an existing table (CREATE IF NOT EXISTS won't)."""
+    cur.execute(f"PRAGMA table_info({table})")
+    existing = {r["name"] for r in cur.fetchall()}
+    for name, decl in columns.items():
+        if name not in existing:
+            cur.execute(f"ALTER TABLE {table} ADD COLUMN {name} {decl}")
 
 def db_init():
     con = db_connect()
@@ -114,6 +269,8 @@ def db_init():
         PRIMARY KEY (guild_id, user_id)
     )
     """)
+    # covering index for leaderboard loads: (guild, xp desc) with everything the board needs
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_user_xp_rank ON user_xp(guild_id, xp DESC, user_id, level)")
 
     # economy
     cur.execute("""
@@ -126,6 +283,28 @@ def db_init():
     )
     """)
 
+    # economy ledger: every balance change, append-only (compacted by econ_ledger_compact)
+    cur.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='econ_ledger'")
+    fresh_ledger = cur.fetchone() is None
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS econ_ledger (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        guild_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        delta INTEGER NOT NULL,
+        reason TEXT NOT NULL,
+        ref TEXT,
+        ts INTEGER NOT NULL
+    )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_econ_ledger_ts ON econ_ledger(ts)")
+    if fresh_ledger:
+        # opening entries so that SUM(delta) per user matches existing balances
+        cur.execute("""
+            INSERT INTO econ_ledger(guild_id,user_id,delta,reason,ts)
+            SELECT guild_id, user_id, balance, 'opening', ? FROM user_econ WHERE balance<>0
+        """, (int(time.time()),))
+
     # shop items
     cur.execute("""
     CREATE TABLE IF NOT EXISTS shop_items (
@@ -152,38 +331,123 @@ def db_init():
         ended INTEGER NOT NULL DEFAULT 0
     )
     """)
+    # entries_synced=1: entrants are recorded from reaction events into giveaway_entries
+    ensure_columns(cur, "giveaways", {"entries_synced": "INTEGER NOT NULL DEFAULT 0"})
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_giveaways_message ON giveaways(message_id)")
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS giveaway_entries (
+        giveaway_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        PRIMARY KEY (giveaway_id, user_id)
+    ) WITHOUT ROWID
+    """)
+
+    # checkpoints of in-memory state (see HotState)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS hot_state (
+        name TEXT PRIMARY KEY,
+        data BLOB NOT NULL,
+        saved_ts INTEGER NOT NULL
+    )
+    """)
 
     con.commit()
-    con.close()
 
 # --------- helpers: config ----------
-def get_guild_config(guild_id: int) -> Dict[str, Any]:
-    con = db_connect()
-    cur = con.cursor()
-    cur.execute("SELECT * FROM guild_config WHERE guild_id = ?", (guild_id,))
-    row = cur.fetchone()
-    if not row:
-        cur.execute("INSERT OR IGNORE INTO guild_config(guild_id) VALUES (?)", (guild_id,))
-        con.commit()
-        cur.execute("SELECT * FROM guild_config WHERE guild_id = ?", (guild_id,))
+class ConfigCache:
+    """Per-guild copy of one config table (guild_config / addon_config).
+
+    Once a guild has been loaded, reads never touch SQLite. Writes go to the
+    database first and then swap the cached row under the lock, so readers
+    see either the old row or the new one, never a half-applied update.
+    Callers always get a copy and may mutate it freely. version(guild_id)
+    moves on every write or invalidation of that guild (or of all guilds),
+    for caches derived from these rows.
+    """
+
+    def __init__(self, table: str):
+        self.table = table
+        self._rows: Dict[int, Dict[str, Any]] = {}
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self._versions: Dict[int, int] = {}
+        self._epoch = 0
+
+    def version(self, guild_id: int) -> Tuple[int, int]:
+        return self._epoch, self._versions.get(guild_id, 0)
+
+    def _bump(self, guild_id: int):
+        self._versions[guild_id] = self._versions.get(guild_id, 0) + 1
+
+    def peek(self, guild_id: int) -> Optional[Dict[str, Any]]:
+        row = self._rows.get(guild_id)
+        if row is None:
+            return None
+        self.hits += 1
+        return dict(row)
+
+    def _load(self, guild_id: int) -> Dict[str, Any]:
+        con = db_connect()
+        cur = con.cursor()
+        cur.execute(f"SELECT * FROM {self.table} WHERE guild_id=?", (guild_id,))
         row = cur.fetchone()
-    con.close()
-    return dict(row)
+        if not row:
+            cur.execute(f"INSERT OR IGNORE INTO {self.table}(guild_id) VALUES (?)", (guild_id,))
+            con.commit()
+            cur.execute(f"SELECT * FROM {self.table} WHERE guild_id=?", (guild_id,))
+            row = cur.fetchone()
+        return dict(row)
+
+    def get(self, guild_id: int) -> Dict[str, Any]:
+        row = self.peek(guild_id)
+        if row is not None:
+            return row
+        with self._lock:
+            row = self._rows.get(guild_id)
+            if row is None:
+                self.misses += 1
+                row = self._load(guild_id)
+                self._rows[guild_id] = row
+            return dict(row)
+
+    def set(self, guild_id: int, **kwargs):
+        if not kwargs:
+            return
+        keys = []
+        vals = []
+        for k, v in kwargs.items():
+            keys.append(f"{k}=?")
+            vals.append(v)
+        vals.append(guild_id)
+        with self._lock:
+            con = db_connect()
+            cur = con.cursor()
+            cur.execute(f"INSERT OR IGNORE INTO {self.table}(guild_id) VALUES (?)", (guild_id,))
+            cur.execute(f"UPDATE {self.table} SET {', '.join(keys)} WHERE guild_id=?", tuple(vals))
+            con.commit()
+            self._rows[guild_id] = self._load(guild_id)
+            self._bump(guild_id)
+
+    def invalidate(self, guild_id: Optional[int] = None):
+        with self._lock:
+            if guild_id is None:
+                self._epoch += 1
+                self._rows.clear()
+            else:
+                self._bump(guild_id)
+                self._rows.pop(guild_id, None)
+
+    def stats(self) -> Dict[str, int]:
+        return {"guilds": len(self._rows), "hits": self.hits, "misses": self.misses}
+
+GUILD_CONFIG_CACHE = ConfigCache("guild_config")
+
+def get_guild_config(guild_id: int) -> Dict[str, Any]:
+    return GUILD_CONFIG_CACHE.get(guild_id)
 
 def set_guild_config(guild_id: int, **kwargs):
-    if not kwargs:
-        return
-    con = db_connect()
-    cur = con.cursor()
-    keys = []
-    vals = []
-    for k, v in kwargs.items():
-        keys.append(f"{k}=?")
-        vals.append(v)
-    vals.append(guild_id)
-    cur.execute(f"UPDATE guild_config SET {', '.join(keys)} WHERE guild_id=?", tuple(vals))
-    con.commit()
-    con.close()
+    GUILD_CONFIG_CACHE.set(guild_id, **kwargs)
 
 # --------- helpers: infractions ----------
 def add_infraction(guild_id: int, user_id: int, mod_id: Optional[int], inf_type: str, reason: str):
@@ -194,7 +458,6 @@ def add_infraction(guild_id: int, user_id: int, mod_id: Optional[int], inf_type:
         (guild_id, user_id, mod_id, inf_type, reason, datetime.datetime.utcnow().isoformat())
     )
     con.commit()
-    con.close()
 
 def list_infractions(guild_id: int, user_id: int, limit: int = 20):
     con = db_connect()
@@ -204,7 +467,6 @@ def list_infractions(guild_id: int, user_id: int, limit: int = 20):
         (guild_id, user_id, limit)
     )
     rows = cur.fetchall()
-    con.close()
     return [dict(r) for r in rows]
 
 def clear_warns(guild_id: int, user_id: int):
@@ -212,9 +474,58 @@ def clear_warns(guild_id: int, user_id: int):
     cur = con.cursor()
     cur.execute("DELETE FROM infractions WHERE guild_id=? AND user_id=? AND type='warn'", (guild_id, user_id))
     con.commit()
-    con.close()
 
 # --------- helpers: reaction roles ----------
+class ReactionRoleIndex:
+    """message_id -> (guild_id, {emoji: role_id}) for every reaction-role message.
+
+    Loaded once at startup and kept in step by rr_add / rr_remove, so the
+    reaction handlers reject unrelated messages with a dict lookup. Inner maps
+    are replaced, never mutated, so readers on the event loop need no lock.
+    """
+
+    def __init__(self):
+        self._by_message: Dict[int, Tuple[int, Dict[str, int]]] = {}
+        self._lock = threading.Lock()
+
+    def load(self):
+        con = db_connect()
+        cur = con.cursor()
+        cur.execute("SELECT guild_id, message_id, emoji, role_id FROM reaction_roles")
+        index: Dict[int, Tuple[int, Dict[str, int]]] = {}
+        for r in cur.fetchall():
+            gid, roles = index.setdefault(int(r["message_id"]), (int(r["guild_id"]), {}))
+            roles[r["emoji"]] = int(r["role_id"])
+        with self._lock:
+            self._by_message = index
+
+    def get(self, guild_id: int, message_id: int, emoji: str) -> Optional[int]:
+        entry = self._by_message.get(message_id)
+        if entry is None or entry[0] != guild_id:
+            return None
+        return entry[1].get(emoji)
+
+    def put(self, guild_id: int, message_id: int, emoji: str, role_id: int):
+        with self._lock:
+            _, roles = self._by_message.get(message_id, (guild_id, {}))
+            self._by_message[message_id] = (guild_id, {**roles, emoji: int(role_id)})
+
+    def discard(self, guild_id: int, message_id: int, emoji: str):
+        with self._lock:
+            entry = self._by_message.get(message_id)
+            if entry is None or entry[0] != guild_id:
+                return
+            roles = {e: r for e, r in entry[1].items() if e != emoji}
+            if roles:
+                self._by_message[message_id] = (guild_id, roles)
+            else:
+                del self._by_message[message_id]
+
+    def __len__(self) -> int:
+        return len(self._by_message)
+
+RR_INDEX = ReactionRoleIndex()
+
 def rr_add(guild_id: int, message_id: int, emoji: str, role_id: int):
     con = db_connect()
     cur = con.cursor()
@@ -223,25 +534,20 @@ def rr_add(guild_id: int, message_id: int, emoji: str, role_id: int):
         (guild_id, message_id, emoji, role_id)
     )
     con.commit()
-    con.close()
+    RR_INDEX.put(guild_id, message_id, emoji, role_id)
 
 def rr_remove(guild_id: int, message_id: int, emoji: str):
     con = db_connect()
     cur = con.cursor()
     cur.execute("DELETE FROM reaction_roles WHERE guild_id=? AND message_id=? AND emoji=?", (guild_id, message_id, emoji))
     con.commit()
-    con.close()
+    RR_INDEX.discard(guild_id, message_id, emoji)
 
-def rr_get(guild_id: int, message_id: int, emoji: str) -> Optional[int]:
+def rr_list(guild_id: int) -> List[Dict[str, Any]]:
     con = db_connect()
     cur = con.cursor()
-    cur.execute(
-        "SELECT role_id FROM reaction_roles WHERE guild_id=? AND message_id=? AND emoji=?",
-        (guild_id, message_id, emoji)
-    )
-    row = cur.fetchone()
-    con.close()
-    return int(row["role_id"]) if row else None
+    cur.execute("SELECT * FROM reaction_roles WHERE guild_id=? ORDER BY message_id ASC", (guild_id,))
+    return [dict(r) for r in cur.fetchall()]
 
 # --------- helpers: reminders ----------
 def reminder_add(user_id: int, remind_at_ts: int, content: str):
@@ -252,47 +558,223 @@ def reminder_add(user_id: int, remind_at_ts: int, content: str):
         (user_id, remind_at_ts, content, datetime.datetime.utcnow().isoformat())
     )
     con.commit()
-    con.close()
+    return int(cur.lastrowid)
 
-def reminder_due(now_ts: int, limit: int = 20):
+def reminder_all() -> List[Dict[str, Any]]:
     con = db_connect()
     cur = con.cursor()
-    cur.execute("SELECT * FROM reminders WHERE remind_at_ts<=? ORDER BY remind_at_ts ASC LIMIT ?", (now_ts, limit))
-    rows = cur.fetchall()
-    con.close()
-    return [dict(r) for r in rows]
+    cur.execute("SELECT * FROM reminders ORDER BY remind_at_ts ASC")
+    return [dict(r) for r in cur.fetchall()]
 
-def reminder_delete(reminder_id: int):
+def reminder_delete_many(reminder_ids: List[int]):
+    if not reminder_ids:
+        return
     con = db_connect()
     cur = con.cursor()
-    cur.execute("DELETE FROM reminders WHERE id=?", (reminder_id,))
+    cur.executemany("DELETE FROM reminders WHERE id=?", [(int(i),) for i in reminder_ids])
     con.commit()
-    con.close()
 
 # --------- helpers: leveling ----------
-def xp_get(guild_id: int, user_id: int) -> Dict[str, int]:
-    con = db_connect()
-    cur = con.cursor()
-    cur.execute("SELECT * FROM user_xp WHERE guild_id=? AND user_id=?", (guild_id, user_id))
-    row = cur.fetchone()
-    if not row:
-        cur.execute("INSERT OR IGNORE INTO user_xp(guild_id,user_id) VALUES (?,?)", (guild_id, user_id))
-        con.commit()
+XP_FLUSH_INTERVAL_SEC = float(os.environ.get("XP_FLUSH_INTERVAL_SEC", 10))
+XP_IDLE_EVICT_SEC = int(os.environ.get("XP_IDLE_EVICT_SEC", 900))
+
+class XPStore:
+    """In-memory xp / level / last_xp_ts per (guild, user), written behind.
+
+    Leveling updates only touch memory and mark the row dirty; flush()
+    writes every dirty row to user_xp in one transaction. It runs on a
+    timer and at shutdown, so disk commits no longer scale with messages.
+    Rows loaded since the previous eviction are kept one more round, so a
+    flush queued behind xp_get_async cannot drop the row before award().
+    """
+
+    def __init__(self):
+        self._rows: Dict[Tuple[int, int], Dict[str, int]] = {}
+        self._dirty: set = set()
+        self._fresh: set = set()
+        self._lock = threading.Lock()
+        self.flushes = 0
+        self.rows_flushed = 0
+
+    def peek(self, guild_id: int, user_id: int) -> Optional[Dict[str, int]]:
+        row = self._rows.get((guild_id, user_id))
+        return dict(row) if row is not None else None
+
+    def load(self, guild_id: int, user_id: int) -> Dict[str, int]:
+        """Return the row, reading it from SQLite on a miss (DB thread only)."""
+        row = self.peek(guild_id, user_id)
+        if row is not None:
+            return row
+        con = db_connect()
+        cur = con.cursor()
         cur.execute("SELECT * FROM user_xp WHERE guild_id=? AND user_id=?", (guild_id, user_id))
-        row = cur.fetchone()
-    con.close()
-    return dict(row)
+        found = cur.fetchone()
+        if found:
+            loaded = dict(found)
+        else:
+            loaded = {"guild_id": guild_id, "user_id": user_id, "xp": 0, "level": 0, "last_xp_ts": 0}
+        with self._lock:
+            row = self._rows.setdefault((guild_id, user_id), loaded)
+            self._fresh.add((guild_id, user_id))
+            return dict(row)
+
+    def put(self, guild_id: int, user_id: int, xp: int, level: int, last_xp_ts: int):
+        with self._lock:
+            self._rows[(guild_id, user_id)] = {"guild_id": guild_id, "user_id": user_id, "xp": xp, "level": level, "last_xp_ts": last_xp_ts}
+            self._dirty.add((guild_id, user_id))
+            LEADERBOARDS.on_xp(guild_id, user_id, xp, level)
+
+    def award(self, guild_id: int, user_id: int, gain: int, now: int, cooldown: int) -> Optional[Tuple[int, int]]:
+        """Add gain XP unless the user is on cooldown. Returns (old_level, new_level)."""
+        with self._lock:
+            row = self._rows.get((guild_id, user_id))
+            if row is None or now - int(row["last_xp_ts"]) < cooldown:
+                return None
+            old_level = int(row["level"])
+            row["xp"] = int(row["xp"]) + gain
+            row["level"] = xp_level_from_xp(row["xp"])
+            row["last_xp_ts"] = now
+            self._dirty.add((guild_id, user_id))
+            LEADERBOARDS.on_xp(guild_id, user_id, row["xp"], row["level"])
+            return old_level, row["level"]
+
+    def flush(self) -> int:
+        """Write dirty rows to user_xp in one transaction (any thread)."""
+        with self._lock:
+            keys, self._dirty = self._dirty, set()
+            batch = [(r["guild_id"], r["user_id"], r["xp"], r["level"], r["last_xp_ts"]) for r in (self._rows[k] for k in keys)]
+        if batch:
+            try:
+                con = db_connect()
+                con.executemany("""
+                    INSERT INTO user_xp(guild_id,user_id,xp,level,last_xp_ts)
+                    VALUES (?,?,?,?,?)
+                    ON CONFLICT(guild_id,user_id) DO UPDATE SET xp=excluded.xp, level=excluded.level, last_xp_ts=excluded.last_xp_ts
+                """, batch)
+                con.commit()
+            except Exception:
+                with self._lock:
+                    self._dirty |= keys
+                raise
+            self.flushes += 1
+            self.rows_flushed += len(batch)
+        self._evict_idle()
+        return len(batch)
+
+    def _evict_idle(self):
+        cutoff = int(time.time()) - XP_IDLE_EVICT_SEC
+        with self._lock:
+            fresh, self._fresh = self._fresh, set()
+            idle = [k for k, r in self._rows.items() if k not in self._dirty and k not in fresh and r["last_xp_ts"] < cutoff]
+            for k in idle:
+                del self._rows[k]
+
+    def with_guild_rows(self, guild_id: int, fn: Callable[[List[Dict[str, int]]], Any]) -> Any:
+        """Call fn with copies of this guild's in-memory rows, under the store lock.
+
+        No award() or put() can run until fn returns, so whatever fn installs
+        sees every later change through LEADERBOARDS.on_xp.
+        """
+        with self._lock:
+            return fn([dict(r) for (gid, _), r in self._rows.items() if gid == guild_id])
 
-def xp_set(guild_id: int, user_id: int, xp: int, level: int, last_xp_ts: int):
-    con = db_connect()
-    cur = con.cursor()
-    cur.execute("""
-        INSERT INTO user_xp(guild_id,user_id,xp,level,last_xp_ts)
-        VALUES (?,?,?,?,?)
-        ON CONFLICT(guild_id,user_id) DO UPDATE SET xp=excluded.xp, level=excluded.level, last_xp_ts=excluded.last_xp_ts
-    """, (guild_id, user_id, xp, level, last_xp_ts))
-    con.commit()
-    con.close()
+    def stats(self) -> Dict[str, int]:
+        return {"rows": len(self._rows), "dirty": len(self._dirty), "flushes": self.flushes, "rows_flushed": self.rows_flushed}
+
+class GuildLeaderboard:
+    """One guild's XP ranking: a sorted list of (-xp, user_id) plus xp/level per user.
+
+    rank() and page() are a bisect / slice; an XP change moves one key.
+    """
+
+    def __init__(self):
+        self._keys: List[Tuple[int, int]] = []
+        self._users: Dict[int, Tuple[int, int]] = {}  # user_id -> (xp, level)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    @classmethod
+    def from_sorted(cls, rows: Iterable[Tuple[int, int, int]]) -> "GuildLeaderboard":
+        """Build from (user_id, xp, level) rows already ordered by xp DESC, user_id ASC."""
+        board = cls()
+        for user_id, xp, level in rows:
+            board._users[user_id] = (xp, level)
+            board._keys.append((-xp, user_id))
+        return board
+
+    def update(self, user_id: int, xp: int, level: int):
+        with self._lock:
+            old = self._users.get(user_id)
+            self._users[user_id] = (xp, level)
+            if old is not None:
+                if old[0] == xp:
+                    return
+                i = bisect.bisect_left(self._keys, (-old[0], user_id))
+                if i < len(self._keys) and self._keys[i] == (-old[0], user_id):
+                    del self._keys[i]
+            bisect.insort(self._keys, (-xp, user_id))
+
+    def rank(self, user_id: int) -> Optional[int]:
+        with self._lock:
+            row = self._users.get(user_id)
+            if row is None:
+                return None
+            return bisect.bisect_left(self._keys, (-row[0], user_id)) + 1
+
+    def page(self, offset: int = 0, limit: int = 10) -> List[Dict[str, int]]:
+        with self._lock:
+            keys = self._keys[offset:offset + limit]
+            return [
+                {"rank": offset + i + 1, "user_id": uid, "xp": -negxp, "level": self._users[uid][1]}
+                for i, (negxp, uid) in enumerate(keys)
+            ]
+
+class LeaderboardStore:
+    """Per-guild leaderboards, loaded on first use and kept current by XPStore."""
+
+    def __init__(self):
+        self._boards: Dict[int, GuildLeaderboard] = {}
+
+    def peek(self, guild_id: int) -> Optional[GuildLeaderboard]:
+        return self._boards.get(guild_id)
+
+    def on_xp(self, guild_id: int, user_id: int, xp: int, level: int):
+        # called by XPStore with its lock held
+        board = self._boards.get(guild_id)
+        if board is not None:
+            board.update(user_id, int(xp), int(level))
+
+    def load(self, guild_id: int) -> GuildLeaderboard:
+        """Build a guild's board from user_xp plus unflushed rows (DB thread only)."""
+        board = self._boards.get(guild_id)
+        if board is not None:
+            return board
+        con = db_connect()
+        cur = con.cursor()
+        cur.execute("SELECT user_id, xp, level FROM user_xp WHERE guild_id=? ORDER BY xp DESC, user_id ASC", (guild_id,))
+        board = GuildLeaderboard.from_sorted((int(r["user_id"]), int(r["xp"]), int(r["level"])) for r in cur.fetchall())
+
+        def install(rows: List[Dict[str, int]]) -> GuildLeaderboard:
+            # overlay unflushed rows; awards after this reach the board through on_xp
+            for row in rows:
+                board.update(row["user_id"], int(row["xp"]), int(row["level"]))
+            return self._boards.setdefault(guild_id, board)
+
+        return XP_STORE.with_guild_rows(guild_id, install)
+
+    def stats(self) -> Dict[str, int]:
+        return {"guilds": len(self._boards), "entries": sum(len(b) for b in list(self._boards.values()))}
+
+LEADERBOARDS = LeaderboardStore()
+XP_STORE = XPStore()
+
+def xp_get(guild_id: int, user_id: int) -> Dict[str, int]:
+    return XP_STORE.load(guild_id, user_id)
+
+def xp_flush() -> int:
+    return XP_STORE.flush()
 
 def xp_level_from_xp(xp: int) -> int:
     # simple curve
@@ -302,18 +784,8 @@ def xp_level_from_xp(xp: int) -> int:
 def xp_needed_for_level(level: int) -> int:
     return int((level ** 2) * 100)
 
-def xp_leaderboard(guild_id: int, limit: int = 10) -> List[Dict[str, Any]]:
-    con = db_connect()
-    cur = con.cursor()
-    cur.execute("""
-        SELECT user_id, xp, level FROM user_xp
-        WHERE guild_id=?
-        ORDER BY xp DESC
-        LIMIT ?
-    """, (guild_id, limit))
-    rows = cur.fetchall()
-    con.close()
-    return [dict(r) for r in rows]
+def xp_leaderboard(guild_id: int, limit: int = 10, offset: int = 0) -> List[Dict[str, Any]]:
+    return LEADERBOARDS.load(guild_id).page(offset, limit)
 
 # --------- helpers: economy ----------
 def econ_get(guild_id: int, user_id: int) -> Dict[str, int]:
@@ -326,19 +798,150 @@ def econ_get(guild_id: int, user_id: int) -> Dict[str, int]:
         con.commit()
         cur.execute("SELECT * FROM user_econ WHERE guild_id=? AND user_id=?", (guild_id, user_id))
         row = cur.fetchone()
-    con.close()
     return dict(row)
 
-def econ_set(guild_id: int, user_id: int, balance: int, last_daily_ts: int):
+# Transactional economy API. Each call is one transaction on the DB thread and
+# balance checks live in the UPDATE's WHERE clause, so concurrent commands can
+# neither lose an update nor spend the same coins twice. Every change is also
+# appended to econ_ledger: SUM(delta) per user always equals the balance.
+ECON_LEDGER_KEEP_DAYS = int(os.environ.get("ECON_LEDGER_KEEP_DAYS", 30))
+
+class _EconAbort(Exception):
+    """Rolls back an econ_transfer whose debit could not be covered."""
+
+def _econ_ensure(cur: sqlite3.Cursor, guild_id: int, user_id: int):
+    cur.execute("INSERT OR IGNORE INTO user_econ(guild_id,user_id) VALUES (?,?)", (guild_id, user_id))
+
+def _econ_balance(cur: sqlite3.Cursor, guild_id: int, user_id: int) -> int:
+    cur.execute("SELECT balance FROM user_econ WHERE guild_id=? AND user_id=?", (guild_id, user_id))
+    row = cur.fetchone()
+    return int(row["balance"]) if row else 0
+
+def _econ_ledger(cur: sqlite3.Cursor, guild_id: int, user_id: int, delta: int, reason: str, ref: Optional[str] = None):
+    cur.execute(
+        "INSERT INTO econ_ledger(guild_id,user_id,delta,reason,ref,ts) VALUES (?,?,?,?,?,?)",
+        (guild_id, user_id, delta, reason, ref, int(time.time()))
+    )
+
+def _econ_debit(cur: sqlite3.Cursor, guild_id: int, user_id: int, amount: int, reason: str, ref: Optional[str]) -> bool:
+    cur.execute(
+        "UPDATE user_econ SET balance=balance-? WHERE guild_id=? AND user_id=? AND balance>=?",
+        (amount, guild_id, user_id, amount)
+    )
+    if cur.rowcount == 0:
+        return False
+    _econ_ledger(cur, guild_id, user_id, -amount, reason, ref)
+    return True
+
+def _econ_credit(cur: sqlite3.Cursor, guild_id: int, user_id: int, amount: int, reason: str, ref: Optional[str]):
+    _econ_ensure(cur, guild_id, user_id)
+    cur.execute("UPDATE user_econ SET balance=balance+? WHERE guild_id=? AND user_id=?", (amount, guild_id, user_id))
+    _econ_ledger(cur, guild_id, user_id, amount, reason, ref)
+
+def econ_credit(guild_id: int, user_id: int, amount: int, reason: str, ref: Optional[str] = None) -> int:
+    """Add coins; returns the new balance."""
+    con = db_connect()
+    with con:
+        cur = con.cursor()
+        _econ_credit(cur, guild_id, user_id, amount, reason, ref)
+        return _econ_balance(cur, guild_id, user_id)
+
+def econ_debit(guild_id: int, user_id: int, amount: int, reason: str, ref: Optional[str] = None) -> Optional[int]:
+    """Take coins only if the balance covers them; returns the new balance or None."""
+    con = db_connect()
+    with con:
+        cur = con.cursor()
+        if not _econ_debit(cur, guild_id, user_id, amount, reason, ref):
+            return None
+        return _econ_balance(cur, guild_id, user_id)
+
+def econ_claim(guild_id: int, user_id: int, amount: int, now: int, cooldown: int, reason: str = "daily") -> Tuple[bool, int]:
+    """Cooldown-gated credit (daily). Returns (True, new balance) or (False, last claim ts)."""
+    con = db_connect()
+    with con:
+        cur = con.cursor()
+        _econ_ensure(cur, guild_id, user_id)
+        cur.execute(
+            "UPDATE user_econ SET balance=balance+?, last_daily_ts=? WHERE guild_id=? AND user_id=? AND last_daily_ts<=?",
+            (amount, now, guild_id, user_id, now - cooldown)
+        )
+        if cur.rowcount == 0:
+            cur.execute("SELECT last_daily_ts FROM user_econ WHERE guild_id=? AND user_id=?", (guild_id, user_id))
+            return False, int(cur.fetchone()["last_daily_ts"])
+        _econ_ledger(cur, guild_id, user_id, amount, reason)
+        return True, _econ_balance(cur, guild_id, user_id)
+
+def econ_transfer(guild_id: int, moves: List[Tuple[Optional[int], Optional[int], int]], reason: str, ref: Optional[str] = None) -> bool:
+    """Apply (from_user, to_user, amount) moves all-or-nothing in one transaction.
+
+    from_user=None mints, to_user=None burns. Returns False (nothing applied)
+    if any debit is not covered.
+    """
+    con = db_connect()
+    try:
+        with con:
+            cur = con.cursor()
+            for src, dst, amount in moves:
+                if amount <= 0:
+                    raise _EconAbort()
+                if src is not None and not _econ_debit(cur, guild_id, src, amount, reason, ref):
+                    raise _EconAbort()
+                if dst is not None:
+                    _econ_credit(cur, guild_id, dst, amount, reason, ref)
+    except _EconAbort:
+        return False
+    return True
+
+def econ_set_balance(guild_id: int, user_id: int, balance: int, reason: str = "panel") -> int:
+    """Admin override of a balance; the difference is recorded in the ledger."""
+    con = db_connect()
+    with con:
+        cur = con.cursor()
+        _econ_ensure(cur, guild_id, user_id)
+        delta = balance - _econ_balance(cur, guild_id, user_id)
+        if delta:
+            cur.execute("UPDATE user_econ SET balance=? WHERE guild_id=? AND user_id=?", (balance, guild_id, user_id))
+            _econ_ledger(cur, guild_id, user_id, delta, reason)
+    return balance
+
+def econ_ledger_compact(keep_days: int = ECON_LEDGER_KEEP_DAYS) -> int:
+    """Fold ledger rows older than keep_days into one 'compacted' row per user."""
+    cutoff = int(time.time()) - keep_days * 86400
+    con = db_connect()
+    with con:
+        cur = con.cursor()
+        cur.execute("SELECT MAX(id) AS m FROM econ_ledger WHERE ts<?", (cutoff,))
+        max_id = cur.fetchone()["m"]
+        if max_id is None:
+            return 0
+        groups = """
+            SELECT guild_id, user_id FROM econ_ledger WHERE id<=? AND ts<?
+            GROUP BY guild_id, user_id HAVING COUNT(*)>1
+        """
+        cur.execute(f"""
+            INSERT INTO econ_ledger(guild_id,user_id,delta,reason,ts)
+            SELECT guild_id, user_id, SUM(delta), 'compacted', MAX(ts) FROM econ_ledger
+            WHERE id<=? AND ts<? AND (guild_id, user_id) IN ({groups})
+            GROUP BY guild_id, user_id
+        """, (max_id, cutoff, max_id, cutoff))
+        cur.execute(f"""
+            DELETE FROM econ_ledger
+            WHERE id<=? AND ts<? AND (guild_id, user_id) IN ({groups})
+        """, (max_id, cutoff, max_id, cutoff))
+        return cur.rowcount
+
+def econ_audit(guild_id: Optional[int] = None) -> List[Dict[str, int]]:
+    """Users whose balance differs from their ledger sum (should always be empty)."""
     con = db_connect()
     cur = con.cursor()
     cur.execute("""
-        INSERT INTO user_econ(guild_id,user_id,balance,last_daily_ts)
-        VALUES (?,?,?,?)
-        ON CONFLICT(guild_id,user_id) DO UPDATE SET balance=excluded.balance, last_daily_ts=excluded.last_daily_ts
-    """, (guild_id, user_id, balance, last_daily_ts))
-    con.commit()
-    con.close()
+        SELECT e.guild_id, e.user_id, e.balance, COALESCE(l.total, 0) AS ledger
+        FROM user_econ e
+        LEFT JOIN (SELECT guild_id, user_id, SUM(delta) AS total FROM econ_ledger GROUP BY guild_id, user_id) l
+          ON l.guild_id=e.guild_id AND l.user_id=e.user_id
+        WHERE (? IS NULL OR e.guild_id=?) AND e.balance<>COALESCE(l.total, 0)
+    """, (guild_id, guild_id))
+    return [dict(r) for r in cur.fetchall()]
 
 def shop_seed_if_empty(guild_id: int):
     con = db_connect()
@@ -357,14 +960,25 @@ def shop_seed_if_empty(guild_id: int):
                 VALUES (?,?,?,?,?)
             """, (guild_id, key, name, price, desc))
         con.commit()
-    con.close()
+        SHOP_COUNTS.pop(guild_id, None)
+
+# guild_id -> number of shop items; dropped by every shop write
+SHOP_COUNTS: Dict[int, int] = {}
+
+def shop_count(guild_id: int) -> int:
+    count = SHOP_COUNTS.get(guild_id)
+    if count is None:
+        con = db_connect()
+        cur = con.cursor()
+        cur.execute("SELECT COUNT(*) AS c FROM shop_items WHERE guild_id=?", (guild_id,))
+        count = SHOP_COUNTS[guild_id] = int(cur.fetchone()["c"])
+    return count
 
 def shop_list(guild_id: int) -> List[Dict[str, Any]]:
     con = db_connect()
     cur = con.cursor()
     cur.execute("SELECT * FROM shop_items WHERE guild_id=? ORDER BY price ASC", (guild_id,))
     rows = cur.fetchall()
-    con.close()
     return [dict(r) for r in rows]
 
 # --------- helpers: giveaways ----------
@@ -372,31 +986,246 @@ def giveaway_create(guild_id: int, channel_id: int, message_id: int, end_ts: int
     con = db_connect()
     cur = con.cursor()
     cur.execute("""
-        INSERT INTO giveaways(guild_id,channel_id,message_id,end_ts,winners,prize,emoji,ended)
-        VALUES (?,?,?,?,?,?,?,0)
+        INSERT INTO giveaways(guild_id,channel_id,message_id,end_ts,winners,prize,emoji,ended,entries_synced)
+        VALUES (?,?,?,?,?,?,?,0,1)
     """, (guild_id, channel_id, message_id, end_ts, winners, prize, emoji))
     con.commit()
-    con.close()
+    return int(cur.lastrowid)
 
-def giveaway_due(now_ts: int, limit: int = 10) -> List[Dict[str, Any]]:
+def giveaway_active() -> List[Dict[str, Any]]:
     con = db_connect()
     cur = con.cursor()
-    cur.execute("""
-        SELECT * FROM giveaways
-        WHERE ended=0 AND end_ts<=?
-        ORDER BY end_ts ASC
-        LIMIT ?
-    """, (now_ts, limit))
-    rows = cur.fetchall()
-    con.close()
-    return [dict(r) for r in rows]
+    cur.execute("SELECT * FROM giveaways WHERE ended=0 ORDER BY end_ts ASC")
+    return [dict(r) for r in cur.fetchall()]
+
+def giveaway_get_by_message(message_id: int) -> Optional[Dict[str, Any]]:
+    con = db_connect()
+    cur = con.cursor()
+    cur.execute("SELECT * FROM giveaways WHERE message_id=? ORDER BY id DESC LIMIT 1", (message_id,))
+    row = cur.fetchone()
+    return dict(row) if row else None
 
 def giveaway_mark_ended(giveaway_id: int):
     con = db_connect()
     cur = con.cursor()
     cur.execute("UPDATE giveaways SET ended=1 WHERE id=?", (giveaway_id,))
     con.commit()
-    con.close()
+
+def giveaway_entry_add(giveaway_id: int, user_id: int):
+    con = db_connect()
+    cur = con.cursor()
+    cur.execute("INSERT OR IGNORE INTO giveaway_entries(giveaway_id,user_id) VALUES (?,?)", (giveaway_id, user_id))
+    con.commit()
+
+def giveaway_entry_remove(giveaway_id: int, user_id: int):
+    con = db_connect()
+    cur = con.cursor()
+    cur.execute("DELETE FROM giveaway_entries WHERE giveaway_id=? AND user_id=?", (giveaway_id, user_id))
+    con.commit()
+
+def giveaway_entries_apply(giveaway_id: int, added: List[int], removed: List[int]):
+    con = db_connect()
+    with con:
+        con.executemany("INSERT OR IGNORE INTO giveaway_entries(giveaway_id,user_id) VALUES (?,?)", [(giveaway_id, u) for u in added])
+        con.executemany("DELETE FROM giveaway_entries WHERE giveaway_id=? AND user_id=?", [(giveaway_id, u) for u in removed])
+
+def giveaway_entries(giveaway_id: int) -> List[int]:
+    con = db_connect()
+    cur = con.cursor()
+    cur.execute("SELECT user_id FROM giveaway_entries WHERE giveaway_id=?", (giveaway_id,))
+    return [int(r["user_id"]) for r in cur.fetchall()]
+
+def giveaway_entries_active() -> List[Tuple[int, int]]:
+    con = db_connect()
+    cur = con.cursor()
+    cur.execute("""
+        SELECT e.giveaway_id, e.user_id FROM giveaway_entries e
+        JOIN giveaways g ON g.id=e.giveaway_id
+        WHERE g.ended=0
+    """)
+    return [(int(r["giveaway_id"]), int(r["user_id"])) for r in cur.fetchall()]
+
+# --------- awaitable helpers (use these from coroutines) ----------
+async def get_guild_config_async(guild_id: int) -> Dict[str, Any]:
+    cfg = GUILD_CONFIG_CACHE.peek(guild_id)
+    if cfg is not None:
+        return cfg
+    return await DB_EXECUTOR.run(get_guild_config, guild_id)
+
+set_guild_config_async = db_async(set_guild_config)
+add_infraction_async = db_async(add_infraction)
+list_infractions_async = db_async(list_infractions)
+clear_warns_async = db_async(clear_warns)
+rr_add_async = db_async(rr_add)
+rr_remove_async = db_async(rr_remove)
+rr_list_async = db_async(rr_list)
+reminder_add_async = db_async(reminder_add)
+reminder_all_async = db_async(reminder_all)
+reminder_delete_many_async = db_async(reminder_delete_many)
+
+async def xp_get_async(guild_id: int, user_id: int) -> Dict[str, int]:
+    row = XP_STORE.peek(guild_id, user_id)
+    if row is not None:
+        return row
+    return await DB_EXECUTOR.run(xp_get, guild_id, user_id)
+
+xp_leaderboard_async = db_async(xp_leaderboard)
+xp_flush_async = db_async(xp_flush)
+
+async def leaderboard_async(guild_id: int) -> GuildLeaderboard:
+    board = LEADERBOARDS.peek(guild_id)
+    if board is None:
+        board = await DB_EXECUTOR.run(LEADERBOARDS.load, guild_id)
+    return board
+
+async def xp_top_async(guild_id: int, limit: int = 5) -> List[Dict[str, Any]]:
+    return (await leaderboard_async(guild_id)).page(0, limit)
+
+econ_get_async = db_async(econ_get)
+econ_credit_async = db_async(econ_credit)
+econ_debit_async = db_async(econ_debit)
+econ_claim_async = db_async(econ_claim)
+econ_transfer_async = db_async(econ_transfer)
+econ_set_balance_async = db_async(econ_set_balance)
+econ_ledger_compact_async = db_async(econ_ledger_compact)
+shop_seed_if_empty_async = db_async(shop_seed_if_empty)
+shop_list_async = db_async(shop_list)
+
+async def shop_count_async(guild_id: int) -> int:
+    count = SHOP_COUNTS.get(guild_id)
+    if count is not None:
+        return count
+    return await DB_EXECUTOR.run(shop_count, guild_id)
+
+giveaway_create_async = db_async(giveaway_create)
+giveaway_mark_ended_async = db_async(giveaway_mark_ended)
+giveaway_active_async = db_async(giveaway_active)
+giveaway_get_by_message_async = db_async(giveaway_get_by_message)
+giveaway_entry_add_async = db_async(giveaway_entry_add)
+giveaway_entry_remove_async = db_async(giveaway_entry_remove)
+giveaway_entries_async = db_async(giveaway_entries)
+giveaway_entries_apply_async = db_async(giveaway_entries_apply)
+giveaway_entries_active_async = db_async(giveaway_entries_active)
+
+# --------- helpers: hot state ----------
+HOT_STATE_INTERVAL_SEC = int(os.environ.get("HOT_STATE_INTERVAL_SEC", 120))
+
+def hot_state_get(name: str) -> Optional[bytes]:
+    con = db_connect()
+    cur = con.cursor()
+    cur.execute("SELECT data FROM hot_state WHERE name=?", (name,))
+    row = cur.fetchone()
+    return bytes(row["data"]) if row else None
+
+def hot_state_put_many(blobs: Dict[str, bytes]):
+    con = db_connect()
+    now = int(time.time())
+    with con:
+        con.executemany(
+            "INSERT INTO hot_state(name,data,saved_ts) VALUES (?,?,?) "
+            "ON CONFLICT(name) DO UPDATE SET data=excluded.data, saved_ts=excluded.saved_ts",
+            [(name, blob, now) for name, blob in blobs.items()]
+        )
+
+class HotState:
+    """Named in-memory state checkpointed to hot_state as zlib-compressed JSON.
+
+    Nothing is read at import: restore() loads every piece on the DB thread
+    once the bot is up and merges it into whatever was recorded meanwhile.
+    Only restored pieces are checkpointed, so a save taken early never
+    overwrites a snapshot nobody has loaded yet. dump() runs on the event
+    loop and only copies; encoding and compression happen in save().
+    """
+
+    def __init__(self):
+        self._pieces: Dict[str, Tuple[Any, Any]] = {}
+        self._loaded: set = set()
+        self._saved: Dict[str, bytes] = {}
+        self._restore_task: Optional[asyncio.Task] = None
+        self.restored = 0
+        self.saves = 0
+        self.errors = 0
+
+    def register(self, name: str, dump, load):
+        self._pieces[name] = (dump, load)
+
+    def _read(self, name: str) -> Optional[Any]:
+        """Fetch and decode one piece (DB thread)."""
+        blob = hot_state_get(name)
+        if not blob:
+            return None
+        self._saved[name] = blob
+        return json.loads(zlib.decompress(blob))
+
+    def start_restore(self):
+        if self._restore_task is None:
+            self._restore_task = asyncio.create_task(self.restore())
+
+    async def restore(self):
+        for name in list(self._pieces):
+            if name in self._loaded:
+                continue
+            try:
+                rows = await DB_EXECUTOR.run(self._read, name)
+                if rows is not None:
+                    self._pieces[name][1](rows)
+                    self.restored += 1
+            except Exception as e:
+                self.errors += 1
+                add_log(f"Hot state {name}: restauration impossible ({e})", level="ERROR", subsystem="hot_state")
+            self._loaded.add(name)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Shallow copies of the restored pieces (event loop thread, where they are mutated)."""
+        return {name: self._pieces[name][0]() for name in list(self._loaded)}
+
+    def save(self, copies: Dict[str, Any]):
+        """Encode a snapshot and write the pieces that changed (DB thread)."""
+        blobs = {}
+        for name, rows in copies.items():
+            blob = zlib.compress(json.dumps(rows, separators=(",", ":")).encode())
+            if blob != self._saved.get(name):
+                blobs[name] = blob
+        if not blobs:
+            return
+        hot_state_put_many(blobs)
+        self._saved.update(blobs)
+        self.saves += 1
+
+    def checkpoint(self):
+        self.save(self.snapshot())
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pieces": len(self._pieces),
+            "loaded": len(self._loaded),
+            "restored": self.restored,
+            "saves": self.saves,
+            "errors": self.errors,
+            "bytes": sum(len(b) for b in list(self._saved.values())),
+        }
+
+HOT_STATE = HotState()
+
+async def hot_state_checkpoint_async():
+    copies = HOT_STATE.snapshot()
+    if copies:
+        await DB_EXECUTOR.run(HOT_STATE.save, copies)
+
+class PersistentDict(dict):
+    """dict with tuple keys, checkpointed by HOT_STATE; entries set before the restore win."""
+
+    def __init__(self, name: str):
+        super().__init__()
+        self.name = name
+        HOT_STATE.register(name, self._dump, self._load)
+
+    def _dump(self) -> List[Any]:
+        return list(self.items())
+
+    def _load(self, rows: List[Any]):
+        for k, v in rows:
+            self.setdefault(tuple(k), v)
 
 # =========================================================
 # BOT SETUP
@@ -404,25 +1233,185 @@ def giveaway_mark_ended(giveaway_id: int):
 intents = discord.Intents.all()
 bot = commands.Bot(command_prefix="!", intents=intents)
 
-action_logs: List[str] = []
+LOG_BUFFER_SIZE = int(os.environ.get("LOG_BUFFER_SIZE", 400))
+LOG_STDOUT_MAX_PENDING = int(os.environ.get("LOG_STDOUT_MAX_PENDING", 10000))
+
+class LogEntry:
+    """One structured log line kept for the panel."""
+
+    __slots__ = ("seq", "ts", "level", "guild_id", "subsystem", "message", "line")
+
+    def __init__(self, seq: int, ts: float, level: str, guild_id: Optional[int], subsystem: Optional[str], message: str):
+        self.seq = seq
+        self.ts = ts
+        self.level = level
+        self.guild_id = guild_id
+        self.subsystem = subsystem
+        self.message = message
+        self.line = f"[{time.strftime('%H:%M:%S', time.localtime(ts))}] {message}"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.seq, "ts": self.ts, "level": self.level, "guild_id": self.guild_id,
+            "subsystem": self.subsystem, "line": self.line,
+        }
+
+class LogRing:
+    """Fixed-capacity ring buffer of LogEntry.
+
+    seq grows by one per entry and slot = (seq - 1) % capacity, so appends
+    are O(1) and a cursor maps straight to a slot without searching.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = max(1, capacity)
+        self._slots: List[Optional[LogEntry]] = [None] * self.capacity
+        self._next_seq = 1
+        self._lock = threading.Lock()
+
+    def append(self, ts: float, level: str, guild_id: Optional[int], subsystem: Optional[str], message: str) -> LogEntry:
+        with self._lock:
+            entry = LogEntry(self._next_seq, ts, level, guild_id, subsystem, message)
+            self._slots[(entry.seq - 1) % self.capacity] = entry
+            self._next_seq += 1
+        return entry
+
+    def since(self, cursor: int = 0) -> Tuple[List[LogEntry], int]:
+        """Entries after cursor and the seq to resume from, read under one lock.
+
+        A cursor at or past _next_seq was handed out by an earlier process
+        (seq restarts at 1), so the whole buffer is replayed.
+        """
+        with self._lock:
+            end = self._next_seq
+            if cursor >= end:
+                cursor = 0
+            start = max(cursor + 1, end - self.capacity, 1)
+            return [self._slots[(seq - 1) % self.capacity] for seq in range(start, end)], end - 1
+
+    def __len__(self) -> int:
+        return min(self._next_seq - 1, self.capacity)
+
+LOG_RING = LogRing(LOG_BUFFER_SIZE)
+
+class StdoutWriter:
+    """Queue + writer thread for stdout: add_log only enqueues the line.
+
+    The thread drains everything queued since its last wake-up and writes it
+    with a single write/flush, so a burst of lines costs one syscall. The
+    queue holds at most LOG_STDOUT_MAX_PENDING lines; if stdout blocks, new
+    lines are dropped and counted (they stay in LOG_RING).
+    """
+
+    _STOP = object()
+
+    def __init__(self, stream=None, max_pending: int = LOG_STDOUT_MAX_PENDING):
+        self.stream = stream
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=max(1, max_pending))
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self.dropped = 0
+
+    def put(self, line: str):
+        if self._thread is None:
+            self.start()
+        try:
+            self._queue.put_nowait(line)
+        except queue.Full:
+            self.dropped += 1
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="leviathan-stdout", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = any(item is self._STOP for item in batch)
+            lines = [item for item in batch if item is not self._STOP]
+            if lines:
+                stream = self.stream or sys.stdout
+                try:
+                    stream.write("\n".join(lines) + "\n")
+                    stream.flush()
+                except Exception:
+                    pass
+            if stop:
+                return
+
+    def stop(self):
+        thread = self._thread
+        if thread is not None:
+            try:
+                self._queue.put(self._STOP, timeout=5)
+            except queue.Full:
+                pass
+            thread.join(timeout=5)
+            self._thread = None
+
+    def stats(self) -> Dict[str, int]:
+        return {"pending": self._queue.qsize(), "dropped": self.dropped}
+
+LOG_STDOUT = StdoutWriter()
 
-def add_log(msg: str):
-    ts = datetime.datetime.now().strftime("%H:%M:%S")
-    line = f"[{ts}] {msg}"
-    action_logs.append(line)
-    if len(action_logs) > 400:
-        action_logs.pop(0)
-    print(line, flush=True)
+_log_wake: Optional[asyncio.Event] = None
+_log_wake_loop: Optional[asyncio.AbstractEventLoop] = None
+
+def _log_notify():
+    # one Event per generation: every waiter holding it wakes, new waiters get a fresh one
+    global _log_wake
+    wake, loop = _log_wake, _log_wake_loop
+    if wake is None or loop is None:
+        return
+    _log_wake = None
+    try:
+        on_loop = asyncio.get_running_loop() is loop
+    except RuntimeError:
+        on_loop = False
+    if on_loop:
+        wake.set()
+    elif not loop.is_closed():
+        loop.call_soon_threadsafe(wake.set)
+
+def log_waiter() -> asyncio.Event:
+    """Event set by the next add_log. Grab it *before* reading logs_since()."""
+    global _log_wake, _log_wake_loop
+    if _log_wake is None:
+        _log_wake = asyncio.Event()
+        _log_wake_loop = asyncio.get_running_loop()
+    return _log_wake
+
+def logs_since(cursor: int, guild_id: Optional[int] = None, subsystem: Optional[str] = None, level: Optional[str] = None) -> Tuple[List[LogEntry], int]:
+    """Filtered entries after cursor, plus the cursor to resume from."""
+    entries, end = LOG_RING.since(cursor)
+    if guild_id is not None:
+        entries = [e for e in entries if e.guild_id == guild_id]
+    if subsystem:
+        entries = [e for e in entries if e.subsystem == subsystem]
+    if level:
+        entries = [e for e in entries if e.level == level]
+    return entries, end
+
+def add_log(msg: str, level: str = "INFO", guild_id: Optional[int] = None, subsystem: Optional[str] = None):
+    entry = LOG_RING.append(time.time(), level, guild_id, subsystem, msg)
+    LOG_STDOUT.put(entry.line)
+    _log_notify()
 
 async def send_modlog(guild: discord.Guild, text: str):
     try:
-        cfg = get_guild_config(guild.id)
+        cfg = await get_guild_config_async(guild.id)
         cid = cfg.get("modlog_channel_id")
         if not cid:
             return
-        ch = guild.get_channel(int(cid))
-        if ch:
-            await ch.send(text)
+        # batched: lines are merged per guild and flushed by MODLOG
+        MODLOG.enqueue(guild.id, int(cid), text)
     except:
         pass
 
@@ -469,79 +1458,332 @@ def parse_duration_to_seconds(s: str) -> Optional[int]:
 # =========================================================
 # AUTOMOD
 # =========================================================
-spam_tracker: Dict[Tuple[int, int], list] = {}
-INVITE_RE = re.compile(r"(discord\.gg/|discord\.com/invite/)", re.IGNORECASE)
-URL_RE = re.compile(r"https?://", re.IGNORECASE)
+TRACKER_MAX_KEYS = int(os.environ.get("TRACKER_MAX_KEYS", 50000))
+
+class SlidingWindowTracker:
+    """Bounded per-key sliding windows of recent (timestamp, value) events.
+
+    Each key owns a ring buffer (deque with maxlen=per_key). Keys are kept
+    in LRU order: going past max_keys evicts the least recently used one,
+    and sweep() drops keys whose newest event is older than ttl seconds.
+    hit() and count() are O(1) amortised, and memory is capped at
+    max_keys * per_key events. With persist=True the windows are
+    checkpointed by HOT_STATE and merged back in by HOT_STATE.restore().
+    """
+
+    def __init__(self, name: str, per_key: int, ttl: float, max_keys: int = TRACKER_MAX_KEYS, persist: bool = False):
+        self.name = name
+        self.per_key = per_key
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self._keys: "OrderedDict[Any, deque]" = OrderedDict()
+        self.evicted = 0
+        self.expired = 0
+        if persist:
+            HOT_STATE.register(f"tracker:{name}", self._dump, self._load)
+        TRACKERS.append(self)
+
+    def _dump(self) -> List[Any]:
+        return [(k, list(dq)) for k, dq in self._keys.items()]
+
+    def _load(self, rows: List[Any]):
+        # restored windows are older than anything recorded since startup:
+        # merge them in front, both in each deque and in LRU order
+        cutoff = time.time() - self.ttl
+        for k, events in reversed(rows[-self.max_keys:]):
+            events = [(ts, v) for ts, v in events if ts >= cutoff]
+            if not events:
+                continue
+            key = tuple(k) if isinstance(k, list) else k
+            live = self._keys.get(key)
+            self._keys[key] = deque(events + list(live or ()), maxlen=self.per_key)
+            if live is None:
+                self._keys.move_to_end(key, last=False)
+        while len(self._keys) > self.max_keys:
+            self._keys.popitem(last=False)
+            self.evicted += 1
+
+    def hit(self, key, now: float, value: Any = None, window: Optional[float] = None) -> deque:
+        """Record one event and return the key's window (trimmed to window seconds)."""
+        dq = self._keys.get(key)
+        if dq is None:
+            dq = deque(maxlen=self.per_key)
+            self._keys[key] = dq
+            if len(self._keys) > self.max_keys:
+                self._keys.popitem(last=False)
+                self.evicted += 1
+        else:
+            self._keys.move_to_end(key)
+        dq.append((now, value))
+        if window is not None:
+            self._trim(dq, now - window)
+        return dq
+
+    def window(self, key, now: float, window: float) -> deque:
+        dq = self._keys.get(key)
+        if dq is None:
+            return deque()
+        self._trim(dq, now - window)
+        return dq
+
+    @staticmethod
+    def _trim(dq: deque, cutoff: float):
+        while dq and dq[0][0] < cutoff:
+            dq.popleft()
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        """Drop keys idle for longer than ttl. Oldest keys come first, so stop at the first live one."""
+        cutoff = (now or time.time()) - self.ttl
+        dropped = 0
+        while self._keys:
+            key, dq = next(iter(self._keys.items()))
+            if dq and dq[-1][0] >= cutoff:
+                break
+            del self._keys[key]
+            dropped += 1
+        self.expired += dropped
+        return dropped
+
+    def __len__(self):
+        return len(self._keys)
+
+    def stats(self) -> Dict[str, Any]:
+        events = sum(len(dq) for dq in self._keys.values())
+        approx = sys.getsizeof(self._keys) + sum(sys.getsizeof(dq) for dq in self._keys.values()) + events * 64
+        return {"keys": len(self._keys), "events": events, "max_keys": self.max_keys, "per_key": self.per_key, "evicted": self.evicted, "expired": self.expired, "approx_bytes": approx}
+
+TRACKERS: List[SlidingWindowTracker] = []
+
+def tracker_stats() -> Dict[str, Any]:
+    return {t.name: t.stats() for t in TRACKERS}
+
+spam_tracker = SlidingWindowTracker("spam", per_key=64, ttl=300, persist=True)
+# literals searched in the lowercased content, see AutomodPipeline
+AUTOMOD_SCAN_LITERALS = {"invite": ("discord.gg/", "discord.com/invite/"), "link": ("http://", "https://")}
+# addon rules: the message is also kept away from leveling and commands
+AUTOMOD_BLOCKING_RULES = {"badword", "mention", "duplicate"}
+
+_ASCII_LETTERS = string.ascii_letters.encode()
+_ASCII_UPPER = string.ascii_uppercase.encode()
 
 def caps_ratio(text: str) -> int:
     if not text:
         return 0
-    letters = [c for c in text if c.isalpha()]
+    if text.isascii():
+        # bytes.translate deletes in C: counting by what is left
+        raw = text.encode()
+        letters = len(raw) - len(raw.translate(None, _ASCII_LETTERS))
+        caps = len(raw) - len(raw.translate(None, _ASCII_UPPER))
+    else:
+        letters = sum(map(str.isalpha, text))
+        caps = sum(map(str.isupper, text))
     if not letters:
         return 0
-    caps = [c for c in letters if c.isupper()]
-    return int((len(caps) / len(letters)) * 100)
+    return int((caps / letters) * 100)
+
+class AutomodContext:
+    """Per-message state shared by the rules: content lowered once, scan hits, bypass flag."""
+
+    __slots__ = ("message", "content", "text", "now", "_bypass", "_found")
+
+    def __init__(self, message: discord.Message, now: float):
+        self.message = message
+        self.content = message.content or ""
+        self.text = self.content.lower()
+        self.now = now
+        self._bypass: Optional[bool] = None
+        self._found: Optional[set] = None
+
+    @property
+    def bypass(self) -> bool:
+        # guild_permissions walks the member's roles: resolve it at most once
+        if self._bypass is None:
+            self._bypass = bool(self.message.author.guild_permissions.manage_messages)
+        return self._bypass
+
+class AutomodPipeline:
+    """One guild's automod rules (guild_config + addon_config) compiled once.
+
+    Enabled rules run cheapest first and the first hit wins: mention count,
+    invite/link (one literal scan of the lowered text), caps, bad words
+    (automaton), then the stateful duplicate and spam windows, which must
+    only record messages no other rule removed.
+    """
 
-async def automod_check(message: discord.Message):
-    if not message.guild or message.author.bot:
-        return
+    def __init__(self, cfg: Dict[str, Any], addon: Dict[str, Any], matcher: Optional["BadwordMatcher"] = None):
+        base = bool(cfg.get("automod_enabled", 1))
+        self.versions: Tuple[Tuple[int, int], Tuple[int, int]] = ((0, 0), (0, 0))
+        self.matcher = matcher
+        self.matcher_options = badword_options(addon)
+        self.caps_threshold = int(cfg.get("caps_threshold", 70))
+        self.spam_interval = float(cfg.get("spam_interval_sec", 2.0))
+        self.spam_burst = int(cfg.get("spam_burst", 5))
+        self.spam_timeout_min = int(cfg.get("spam_timeout_min", 10))
+        self.mention_threshold = int(addon.get("mention_threshold") or 5)
+        scan = [n for n, on in (("invite", base and cfg.get("anti_invite", 1)), ("link", base and cfg.get("anti_link", 0))) if on]
+        self._scan = [(n, AUTOMOD_SCAN_LITERALS[n]) for n in scan]
+        self.rules: List[Tuple[str, Any]] = [(name, fn) for name, fn, on in (
+            ("mention", self._mention, addon.get("anti_mention_spam")),
+            ("invite", self._invite, "invite" in scan),
+            ("link", self._link, "link" in scan),
+            ("caps", self._caps, base and cfg.get("anti_caps", 0)),
+            ("badword", self._badword, matcher is not None),
+            ("duplicate", self._duplicate, addon.get("anti_duplicate")),
+            ("spam", self._spam, base),
+        ) if on]
+
+    def check(self, ctx: AutomodContext) -> Optional[Tuple[str, Any]]:
+        """Return (rule, detail) for the first rule hit, or None."""
+        for name, rule in self.rules:
+            detail = rule(ctx)
+            if detail is not None:
+                return name, detail
+        return None
 
-    cfg = get_guild_config(message.guild.id)
-    if not cfg.get("automod_enabled", 1):
-        return
+    def _scanned(self, ctx: AutomodContext) -> set:
+        # str.__contains__ keeps CPython's fast literal search; an alternation
+        # regex over the same literals scans every position and is slower
+        if ctx._found is None:
+            text = ctx.text
+            found = set()
+            for n, literals in self._scan:
+                for lit in literals:
+                    if lit in text:
+                        found.add(n)
+                        break
+            ctx._found = found
+        return ctx._found
+
+    def _mention(self, ctx: AutomodContext):
+        count = len(ctx.message.mentions) + len(ctx.message.role_mentions)
+        if count >= self.mention_threshold and not ctx.bypass:
+            return count
+        return None
 
-    content = message.content or ""
+    def _invite(self, ctx: AutomodContext):
+        return True if "invite" in self._scanned(ctx) else None
 
-    # anti invite
-    if cfg.get("anti_invite", 1) and INVITE_RE.search(content):
-        try:
-            await message.delete()
-        except:
-            pass
-        await send_modlog(message.guild, f"🚫 Anti-invite: supprimé ({message.author.mention}) dans {message.channel.mention}")
-        return
+    def _link(self, ctx: AutomodContext):
+        return True if "link" in self._scanned(ctx) else None
 
-    # anti link
-    if cfg.get("anti_link", 0) and URL_RE.search(content):
-        try:
-            await message.delete()
-        except:
-            pass
-        await send_modlog(message.guild, f"🔗 Anti-link: supprimé ({message.author.mention}) dans {message.channel.mention}")
-        return
+    def _caps(self, ctx: AutomodContext):
+        if len(ctx.content) < 10:
+            return None
+        ratio = caps_ratio(ctx.content)
+        if ratio >= self.caps_threshold and not ctx.bypass:
+            return ratio
+        return None
 
-    # anti caps
-    if cfg.get("anti_caps", 0):
-        ratio = caps_ratio(content)
-        thr = int(cfg.get("caps_threshold", 70))
-        if ratio >= thr and len(content) >= 10 and not message.author.guild_permissions.manage_messages:
-            try:
-                await message.delete()
-            except:
-                pass
-            await send_modlog(message.guild, f"🔠 Anti-caps: supprimé ({ratio}% caps) {message.author.mention} dans {message.channel.mention}")
-            return
+    def _badword(self, ctx: AutomodContext):
+        hit = self.matcher.find_lowered(ctx.text)
+        if hit and not ctx.bypass:
+            return hit
+        return None
+
+    def _duplicate(self, ctx: AutomodContext):
+        normalized = " ".join(ctx.text.split())
+        key = (ctx.message.guild.id, ctx.message.author.id)
+        dq = RECENT_USER_MESSAGES.hit(key, ctx.now, normalized, window=30)
+        if normalized and sum(1 for _, x in dq if x == normalized) >= 3 and not ctx.bypass:
+            return True
+        return None
 
-    # anti spam burst
-    interval = float(cfg.get("spam_interval_sec", 2.0))
-    burst = int(cfg.get("spam_burst", 5))
-    timeout_min = int(cfg.get("spam_timeout_min", 10))
+    def _spam(self, ctx: AutomodContext):
+        key = (ctx.message.guild.id, ctx.message.author.id)
+        ts = spam_tracker.hit(key, ctx.now, window=self.spam_interval)
+        if len(ts) >= self.spam_burst and not ctx.bypass:
+            return len(ts), self.spam_timeout_min
+        return None
 
-    key = (message.guild.id, message.author.id)
-    now = time.time()
-    ts = spam_tracker.get(key, [])
-    ts = [t for t in ts if now - t <= interval]
-    ts.append(now)
-    spam_tracker[key] = ts
+class AutomodPipelineCache:
+    """Compiled pipeline per guild, rebuilt when a config table or the bad-word list changes."""
 
-    if len(ts) >= burst and not message.author.guild_permissions.manage_messages:
+    def __init__(self):
+        self._pipelines: Dict[int, AutomodPipeline] = {}
+        self.builds = 0
+        self.hits: Dict[str, int] = {}
+
+    def peek(self, guild_id: int) -> Optional[AutomodPipeline]:
+        p = self._pipelines.get(guild_id)
+        if p is None or p.versions != (GUILD_CONFIG_CACHE.version(guild_id), ADDON_CONFIG_CACHE.version(guild_id)):
+            return None
+        if p.matcher is not None and BADWORD_MATCHERS.peek(guild_id, p.matcher_options) is not p.matcher:
+            return None
+        return p
+
+    def build(self, guild_id: int) -> AutomodPipeline:
+        """Load both configs and the bad-word matcher, then compile (DB thread)."""
+        # versions first: a write landing during the build forces another one
+        versions = (GUILD_CONFIG_CACHE.version(guild_id), ADDON_CONFIG_CACHE.version(guild_id))
+        cfg = get_guild_config(guild_id)
+        addon = get_addon_config(guild_id)
+        matcher = None
+        if addon.get("anti_bad_words"):
+            options = badword_options(addon)
+            matcher = BADWORD_MATCHERS.peek(guild_id, options) or BADWORD_MATCHERS.build(guild_id, options)
+        p = AutomodPipeline(cfg, addon, matcher)
+        p.versions = versions
+        self._pipelines[guild_id] = p
+        self.builds += 1
+        return p
+
+    def record(self, rule: str):
+        self.hits[rule] = self.hits.get(rule, 0) + 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {"guilds": len(self._pipelines), "builds": self.builds, "hits": dict(self.hits)}
+
+AUTOMOD_PIPELINES = AutomodPipelineCache()
+
+async def automod_pipeline_async(guild_id: int) -> AutomodPipeline:
+    p = AUTOMOD_PIPELINES.peek(guild_id)
+    if p is None:
+        p = await DB_EXECUTOR.run(AUTOMOD_PIPELINES.build, guild_id)
+    return p
+
+async def automod_act(message: discord.Message, rule: str, detail: Any) -> bool:
+    """Carry out a rule hit; True when the message must not be processed further."""
+    guild = message.guild
+    who = message.author.mention
+    where = message.channel.mention
+    AUTOMOD_PIPELINES.record(rule)
+    if rule == "spam":
+        _, timeout_min = detail
         try:
             duration = datetime.timedelta(minutes=timeout_min)
             await message.author.timeout(duration, reason="Automod: spam")
-            add_infraction(message.guild.id, message.author.id, None, "timeout", "Automod: spam")
-            await send_modlog(message.guild, f"⛔ Automod spam: {message.author.mention} timeout {timeout_min} min.")
+            await add_infraction_async(guild.id, message.author.id, None, "timeout", "Automod: spam")
+            await send_modlog(guild, f"⛔ Automod spam: {who} timeout {timeout_min} min.")
         except Exception as e:
-            await send_modlog(message.guild, f"⚠️ Automod spam erreur: {e}")
+            await send_modlog(guild, f"⚠️ Automod spam erreur: {e}")
+        return False
+    automod_delete(message)
+    if rule == "invite":
+        await send_modlog(guild, f"🚫 Anti-invite: supprimé ({who}) dans {where}")
+    elif rule == "link":
+        await send_modlog(guild, f"🔗 Anti-link: supprimé ({who}) dans {where}")
+    elif rule == "caps":
+        await send_modlog(guild, f"🔠 Anti-caps: supprimé ({detail}% caps) {who} dans {where}")
+    elif rule == "badword":
+        await add_infraction_async(guild.id, message.author.id, None, "badword", detail)
+        await send_modlog(guild, f"🤬 Anti bad-word: mot détecté chez {who} dans {where}")
+    elif rule == "mention":
+        await send_modlog(guild, f"📣 Mention spam: {who} ({detail} mentions) dans {where}")
+    elif rule == "duplicate":
+        await send_modlog(guild, f"♻️ Duplicate spam: {who} dans {where}")
+    return rule in AUTOMOD_BLOCKING_RULES
+
+async def automod_check(message: discord.Message) -> bool:
+    """Run the guild's compiled automod pipeline on one message."""
+    if not message.guild or message.author.bot:
+        return False
+    pipeline = await automod_pipeline_async(message.guild.id)
+    if not pipeline.rules:
+        return False
+    hit = pipeline.check(AutomodContext(message, time.time()))
+    if hit is None:
+        return False
+    return await automod_act(message, *hit)
 
 # =========================================================
 # LEVELING (XP on message)
@@ -549,7 +1791,7 @@ async def automod_check(message: discord.Message):
 async def leveling_on_message(message: discord.Message):
     if not message.guild or message.author.bot:
         return
-    cfg = get_guild_config(message.guild.id)
+    cfg = await get_guild_config_async(message.guild.id)
     if not cfg.get("leveling_enabled", 1):
         return
 
@@ -557,18 +1799,19 @@ async def leveling_on_message(message: discord.Message):
     if len((message.content or "").strip()) < 3:
         return
 
-    row = xp_get(message.guild.id, message.author.id)
     now = int(time.time())
     cooldown = 30  # seconds
-    if now - int(row.get("last_xp_ts", 0)) < cooldown:
+    row = XP_STORE.peek(message.guild.id, message.author.id)
+    if row is not None and now - int(row.get("last_xp_ts", 0)) < cooldown:
         return
+    if row is None:
+        await xp_get_async(message.guild.id, message.author.id)
 
     gain = random.randint(10, 20)
-    new_xp = int(row["xp"]) + gain
-    new_level = xp_level_from_xp(new_xp)
-    old_level = int(row["level"])
-
-    xp_set(message.guild.id, message.author.id, new_xp, new_level, now)
+    levels = XP_STORE.award(message.guild.id, message.author.id, gain, now, cooldown)
+    if levels is None:
+        return
+    old_level, new_level = levels
 
     if new_level > old_level:
         try:
@@ -818,7 +2061,7 @@ PANEL_HTML = """
           </div>
           <div style="min-width:320px">
             <label>Serveur</label>
-            <select id="guild">{GUILD_OPTS}</select>
+            <select id="guild"><option value='0'>Chargement…</option></select>
           </div>
           <div style="min-width:160px; margin-top:22px">
             <button class="btn primary" onclick="loadAll()">Charger</button>
@@ -1150,7 +2393,39 @@ function logBox(id, text){
   document.getElementById(id).innerHTML = text;
 }
 
+// loadAll fetches /api/bootstrap once; for 2s the loaders below read their
+// section from it through api() instead of each making its own request.
+// Any other call (a save, an action) drops it so a reload reads fresh data.
+let BOOT = null;
+const BOOT_ROUTES = {
+  '/api/info': d => d.info,
+  '/api/healthz': d => d.health,
+  '/api/config/get': d => d.config,
+  '/api/addons/get': d => d.addons,
+  '/api/stats/overview': d => d.overview,
+  '/api/tickets/config/get': d => d.tickets,
+  '/api/shop/list': d => d.shop && {items: d.shop},
+  '/api/reactionroles/list': d => d.reaction_roles && {items: d.reaction_roles},
+  '/api/members/list': (d, p) => (!p.q && !p.offset) ? d.members : undefined,
+};
+
+function bootSection(path, payload){
+  const route = BOOT_ROUTES[path];
+  if(!route || !BOOT || Date.now() - BOOT.at > 2000) return undefined;
+  if(BOOT.g !== guildVal() || BOOT.k !== keyVal()) return undefined;
+  return route(BOOT.d, payload || {}) ?? undefined;
+}
+
+async function fetchBootstrap(){
+  const g = guildVal(), k = keyVal();
+  const d = await api('/api/bootstrap', {k:k, g:g});
+  BOOT = d.error && !d.info ? null : {g:g, k:k, at:Date.now(), d:d};
+}
+
 async function api(path, payload){
+  if(!BOOT_ROUTES[path]) BOOT = null;
+  const cached = bootSection(path, payload);
+  if(cached !== undefined) return cached;
   const r = await fetch(path, {
     method:'POST',
     headers:{'Content-Type':'application/json'},
@@ -1159,7 +2434,19 @@ async function api(path, payload){
   return await r.json();
 }
 
+// every dashboard widget reads the overview: share one request per guild for 2s
+let OVERVIEW_MEMO = null;
+function fetchOverview(){
+  const g = guildVal();
+  if(OVERVIEW_MEMO && OVERVIEW_MEMO.g === g && Date.now() - OVERVIEW_MEMO.at < 2000) return OVERVIEW_MEMO.p;
+  const p = api('/api/stats/overview', {k:keyVal(), g:g});
+  OVERVIEW_MEMO = {g:g, at:Date.now(), p:p};
+  p.catch(()=>{ OVERVIEW_MEMO = null; });
+  return p;
+}
+
 async function loadAll(){
+  await fetchBootstrap();
   await fetchInfo();
   await loadCfg();
   await loadShop();
@@ -1180,7 +2467,42 @@ async function fetchInfo(){
 
 async function panelAction(action, val){
   const d = await api('/api/run', {k:keyVal(), g:guildVal(), action:action, val:val});
-  if(d.error) alert(d.error);
+  if(d.error) return alert(d.error);
+  if(d.job) followJob(d.job);
+}
+
+// channel jobs (lockdown / purge): live progress card with a cancel button
+function renderJob(el, j){
+  el.querySelector('.title').innerText = `${j.kind} — ${j.done}/${j.total}`;
+  el.querySelector('.hint').innerText = `${j.state} · ${j.amount} traité(s) · ${j.skipped} inchangé(s) · ${j.failed} échec(s) · ${(j.elapsed_ms/1000).toFixed(1)}s`;
+  const btn = el.querySelector('button');
+  if(j.state !== 'running' && btn){ btn.remove(); setTimeout(()=>el.remove(), 8000); }
+}
+
+async function followJob(job){
+  const el = document.createElement('div');
+  el.className = 'card';
+  el.style.cssText = 'position:fixed;right:18px;bottom:18px;z-index:50;min-width:300px';
+  el.innerHTML = '<div class="title"></div><div class="hint"></div><button class="btn danger" style="margin-top:8px">Annuler</button>';
+  el.querySelector('button').onclick = () => api('/api/channels/jobs/cancel', {k:keyVal(), job:job.id});
+  document.body.appendChild(el);
+  renderJob(el, job);
+  const r = await fetch('/api/channels/jobs/stream', {method:'POST', headers:{'Content-Type':'application/json'}, body: JSON.stringify({k:keyVal(), job:job.id})});
+  if(!r.ok || !r.body) return;
+  const reader = r.body.getReader();
+  const dec = new TextDecoder();
+  let buf = '';
+  while(true){
+    const {value, done} = await reader.read();
+    if(done) break;
+    buf += dec.decode(value, {stream:true});
+    let i;
+    while((i = buf.indexOf('\\n')) >= 0){
+      const line = buf.slice(0, i).trim();
+      buf = buf.slice(i + 1);
+      if(line) renderJob(el, JSON.parse(line));
+    }
+  }
 }
 
 async function panelPunish(action){
@@ -1191,13 +2513,13 @@ async function panelPunish(action){
 }
 
 
-async function loadMembers(){
+async function loadMembers(q){
   const box = document.getElementById('members_status');
   const sel = document.getElementById('target_select');
   if(!sel) return;
   sel.innerHTML = '<option value="">— Chargement… —</option>';
   ALL_MEMBERS = [];
-  const d = await api('/api/members/list', {k:keyVal(), g:guildVal()});
+  const d = await api('/api/members/list', {k:keyVal(), g:guildVal(), q:q||'', limit:200});
   if(d.error){
     sel.innerHTML = '<option value="">— Aucun membre —</option>';
     if(box) box.innerText = 'Erreur: ' + d.error;
@@ -1211,30 +2533,27 @@ async function loadMembers(){
     return;
   }
   ALL_MEMBERS = d.members;
-  renderMembers(ALL_MEMBERS);
-  if(box) box.innerText = `✅ ${d.count || ALL_MEMBERS.length} membre(s) chargé(s) (${d.used||'cache'})`;
+  renderMembers(ALL_MEMBERS, d.has_more);
+  if(box) box.innerText = q ? `🔎 ${ALL_MEMBERS.length}${d.has_more ? '+' : ''} résultat(s) sur ${d.count}` : `✅ ${d.count} membre(s) indexé(s)`;
 }
 
-function renderMembers(list){
+function renderMembers(list, hasMore){
   const sel = document.getElementById('target_select');
   if(!sel) return;
-  const maxShow = 200;
-  const slice = list.slice(0, maxShow);
   sel.innerHTML = '<option value="">— Sélectionner un membre —</option>' +
-    slice.map(m => `<option value="${m.id}">${escapeHtml(m.display)}</option>`).join('');
-  if(list.length > maxShow){
-    sel.innerHTML += `<option value="">— (+${list.length-maxShow} autres, utilise la recherche) —</option>`;
+    list.map(m => `<option value="${m.id}">${escapeHtml(m.display)}</option>`).join('');
+  if(hasMore){
+    sel.innerHTML += '<option value="">— (autres membres, utilise la recherche) —</option>';
   }
 }
 
+let MEMBER_SEARCH_TIMER = null;
 function filterMembers(){
-  const q = (document.getElementById('member_search')?.value || '').trim().toLowerCase();
-  if(!q){
-    renderMembers(ALL_MEMBERS);
-    return;
-  }
-  const filtered = ALL_MEMBERS.filter(m => (m.display||'').toLowerCase().includes(q) || (m.id||'').includes(q));
-  renderMembers(filtered);
+  clearTimeout(MEMBER_SEARCH_TIMER);
+  MEMBER_SEARCH_TIMER = setTimeout(()=>{
+    const q = (document.getElementById('member_search')?.value || '').trim();
+    loadMembers(q);
+  }, 200);
 }
 
 function onMemberSelect(){
@@ -1405,11 +2724,37 @@ async function createGiveaway(){
 async function loadLeaderboard(){
   const d = await api('/api/xp/leaderboard', {k:keyVal(), g:guildVal()});
   if(d.error) return alert(d.error);
-  const lines = (d.items||[]).map((x,i)=> `${i+1}. ${x.user_id} — lvl ${x.level} (${x.xp} xp)`).join('<br/>');
-  logBox('toolBox', lines || 'Aucun.');
+  const lines = (d.items||[]).map((x,i)=> `${x.rank ?? i+1}. ${x.user_id} — lvl ${x.level} (${x.xp} xp)`).join('<br/>');
+  logBox('toolBox', lines ? `${lines}<br/>— ${d.total ?? ''} membre(s) classé(s)` : 'Aucun.');
+}
+
+// Logs: one EventSource pushes new lines only (resumes via Last-Event-ID)
+const LOG_MAX = 400;
+const LOG_LINES = [];
+let logSource = null;
+
+function pushLogLine(line){
+  LOG_LINES.push(line);
+  if(LOG_LINES.length > LOG_MAX) LOG_LINES.shift();
+  const box = document.getElementById('console');
+  if(!box) return;
+  const div = document.createElement('div');
+  div.textContent = line;
+  box.prepend(div);
+  while(box.childElementCount > LOG_MAX) box.lastElementChild.remove();
+}
+
+function startLogStream(){
+  if(logSource || !window.EventSource) return false;
+  const box = document.getElementById('console');
+  if(box) box.innerHTML = '';
+  logSource = new EventSource('/api/logs/stream');
+  logSource.onmessage = (ev)=>{ try{ pushLogLine(JSON.parse(ev.data)); }catch(e){} };
+  return true;
 }
 
 async function loadLogsOnce(){
+  if(window.EventSource){ startLogStream(); return; }
   const d = await fetch('/api/logs');
   const arr = await d.json();
   if(Array.isArray(arr)) {
@@ -1417,15 +2762,22 @@ async function loadLogsOnce(){
   }
 }
 
-setInterval(async ()=>{
+startLogStream();
+
+async function loadGuildOptions(){
+  const sel = document.getElementById('guild');
   try{
-    const r = await fetch('/api/logs');
-    const arr = await r.json();
-    if(Array.isArray(arr)) {
-      document.getElementById('console').innerHTML = arr.slice().reverse().map(x=>`<div>${escapeHtml(x)}</div>`).join('');
-    }
+    const d = await (await fetch('/api/guilds')).json();
+    const list = d.guilds || [];
+    const prev = sel.value;
+    sel.innerHTML = list.length
+      ? list.map(g=>`<option value="${g.id}">${escapeHtml(g.name)}</option>`).join('')
+      : "<option value='0'>Aucun serveur (bot offline / pas prêt)</option>";
+    if(list.some(g=>g.id===prev)) sel.value = prev;
   }catch(e){}
-}, 2500);
+}
+
+loadGuildOptions();
 
 function escapeHtml(s){
   return (s||'').replaceAll('&','&amp;').replaceAll('<','&lt;').replaceAll('>','&gt;');
@@ -1435,15 +2787,109 @@ function escapeHtml(s){
 </html>
 """
 
+# --------- helpers: panel assets ----------
+ASSET_CACHE_IMMUTABLE = "public, max-age=31536000, immutable"
+ASSET_CACHE_REVALIDATE = "no-cache"
+
+def pick_encoding(accept_encoding: str, available) -> str:
+    accepted = set()
+    for part in (accept_encoding or "").lower().split(","):
+        token, _, params = part.strip().partition(";")
+        params = params.replace(" ", "")
+        try:
+            q = float(params[2:]) if params.startswith("q=") else 1.0
+        except ValueError:
+            q = 0.0
+        if token and q > 0:
+            accepted.add(token)
+    for enc in ("br", "gzip"):
+        if enc in available and (enc in accepted or "*" in accepted):
+            return enc
+    return "identity"
+
+class StaticAsset:
+    """One panel file, pre-compressed once, with strong content-hash ETags per encoding."""
+
+    __slots__ = ("content_type", "cache_control", "digest", "bodies")
+
+    def __init__(self, body: bytes, content_type: str, cache_control: str):
+        self.content_type = content_type
+        self.cache_control = cache_control
+        self.digest = hashlib.sha256(body).hexdigest()[:16]
+        self.bodies: Dict[str, bytes] = {"identity": body, "gzip": gzip.compress(body, 9, mtime=0)}
+        if brotli is not None:
+            self.bodies["br"] = brotli.compress(body, quality=11)
+
+    def etag(self, encoding: str) -> str:
+        return f'"{self.digest}"' if encoding == "identity" else f'"{self.digest}-{encoding}"'
+
+    def respond(self, request: Request) -> Response:
+        encoding = pick_encoding(request.headers.get("accept-encoding", ""), self.bodies)
+        etag = self.etag(encoding)
+        headers = {"ETag": etag, "Cache-Control": self.cache_control, "Vary": "Accept-Encoding"}
+        inm = request.headers.get("if-none-match")
+        if inm and (inm.strip() == "*" or etag in [t.strip().removeprefix("W/") for t in inm.split(",")]):
+            return Response(status_code=304, headers=headers)
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        return Response(self.bodies[encoding], media_type=self.content_type, headers=headers)
+
+class PanelAssets:
+    """PANEL_HTML (after every patch) split into an HTML shell plus hashed CSS and JS files.
+
+    The shell is revalidated on each load and answers 304 until the panel
+    changes; the CSS/JS names embed their hash, so they are cached forever.
+    """
+
+    def __init__(self, html: str):
+        css = "\n".join(re.findall(r"<style>(.*?)</style>", html, flags=re.S))
+        js = "\n".join(re.findall(r"<script>(.*?)</script>", html, flags=re.S))
+        self.css = StaticAsset(css.encode(), "text/css; charset=utf-8", ASSET_CACHE_IMMUTABLE)
+        self.js = StaticAsset(js.encode(), "application/javascript; charset=utf-8", ASSET_CACHE_IMMUTABLE)
+        css_name = f"panel.{self.css.digest[:12]}.css"
+        js_name = f"panel.{self.js.digest[:12]}.js"
+        self.files: Dict[str, StaticAsset] = {css_name: self.css, js_name: self.js}
+        shell = self._swap(html, r"<style>.*?</style>", f'<link rel="stylesheet" href="/static/{css_name}" />')
+        shell = self._swap(shell, r"<script>.*?</script>", f'<script src="/static/{js_name}"></script>')
+        self.html = StaticAsset(shell.encode(), "text/html; charset=utf-8", ASSET_CACHE_REVALIDATE)
+
+    @staticmethod
+    def _swap(html: str, pattern: str, tag: str) -> str:
+        # first block becomes the tag, later ones are folded into the same file
+        seen = []
+        def sub(_m):
+            seen.append(1)
+            return tag if len(seen) == 1 else ""
+        return re.sub(pattern, sub, html, flags=re.S)
+
+    def stats(self) -> Dict[str, Any]:
+        return {name: {enc: len(b) for enc, b in a.bodies.items()} for name, a in (("html", self.html), ("css", self.css), ("js", self.js))}
+
+_panel_assets: Optional[PanelAssets] = None
+
+def panel_assets() -> PanelAssets:
+    # built on first request: PANEL_HTML is only final once the addon patches have run
+    global _panel_assets
+    if _panel_assets is None:
+        _panel_assets = PanelAssets(PANEL_HTML)
+    return _panel_assets
+
 @app.get("/leviathan", response_class=HTMLResponse)
-async def panel():
+async def panel(request: Request):
+    return panel_assets().html.respond(request)
+
+@app.get("/static/{name}")
+async def panel_static(name: str, request: Request):
+    asset = panel_assets().files.get(name)
+    if asset is None:
+        return JSONResponse({"error": "Not found"}, status_code=404)
+    return asset.respond(request)
+
+@app.get("/api/guilds")
+async def api_guilds():
     guilds = list(getattr(bot, "guilds", []) or [])
-    if not guilds:
-        guild_opts = "<option value='0'>Aucun serveur (bot offline / pas prêt)</option>"
-    else:
-        guild_opts = "".join([f"<option value='{g.id}'>{g.name}</option>" for g in guilds])
-    html = PANEL_HTML.replace("{GUILD_OPTS}", guild_opts)
-    return HTMLResponse(html)
+    # ids as strings: snowflakes do not fit in a JS number
+    return {"ready": bool(bot.user), "guilds": [{"id": str(g.id), "name": g.name} for g in guilds]}
 
 # =========================================================
 # PANEL API
@@ -1453,11 +2899,7 @@ def auth(data: Dict[str, Any]) -> Optional[str]:
         return "MOT DE PASSE INCORRECT"
     return None
 
-@app.post("/api/info")
-async def api_info(request: Request):
-    data = await request.json()
-    if auth(data):
-        return JSONResponse({"error": auth(data)}, status_code=403)
+def panel_info() -> Dict[str, Any]:
     uptime = int(time.time() - START_TIME)
     return {
         "bot_connected": bool(bot.user),
@@ -1465,9 +2907,46 @@ async def api_info(request: Request):
         "uptime": f"{uptime}s"
     }
 
+@app.post("/api/info")
+async def api_info(request: Request):
+    data = await request.json()
+    if auth(data):
+        return JSONResponse({"error": auth(data)}, status_code=403)
+    return panel_info()
+
 @app.get("/api/logs")
-async def api_logs():
-    return action_logs
+async def api_logs(cursor: Optional[int] = None, guild: Optional[int] = None, subsystem: Optional[str] = None, level: Optional[str] = None):
+    if cursor is None and guild is None and not subsystem and not level:
+        return [e.line for e in LOG_RING.since(0)[0]]
+    items, end = logs_since(cursor or 0, guild, subsystem, level)
+    return {
+        "items": [e.to_dict() for e in items],
+        "cursor": end,
+    }
+
+@app.get("/api/logs/stream")
+async def api_logs_stream(request: Request, cursor: int = 0, guild: Optional[int] = None, subsystem: Optional[str] = None):
+    # EventSource resends the last id it saw on reconnect
+    last_id = request.headers.get("last-event-id", "")
+    pos = int(last_id) if last_id.isdigit() else cursor
+
+    async def events():
+        nonlocal pos
+        yield "retry: 3000\n\n"
+        while not await request.is_disconnected():
+            wake = log_waiter()
+            entries, end = logs_since(pos, guild, subsystem)
+            # the cursor comes from the same locked read: lines appended while
+            # we are suspended on a yield are picked up by the next round
+            pos = end
+            for e in entries:
+                yield f"id: {e.seq}\ndata: {json.dumps(e.line)}\n\n"
+            try:
+                await asyncio.wait_for(wake.wait(), timeout=15)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 @app.post("/api/config/get")
 async def api_cfg_get(request: Request):
@@ -1477,7 +2956,7 @@ async def api_cfg_get(request: Request):
     gid = int(data.get("g") or 0)
     if gid <= 0:
         return JSONResponse({"error": "Guild invalide (bot offline ?)"} , status_code=400)
-    return get_guild_config(gid)
+    return await get_guild_config_async(gid)
 
 def as_int_or_none(v):
     v = (v or "").strip()
@@ -1498,7 +2977,7 @@ async def api_cfg_set(request: Request):
     if gid <= 0:
         return JSONResponse({"error": "Guild invalide"} , status_code=400)
 
-    set_guild_config(
+    await set_guild_config_async(
         gid,
         automod_enabled=1 if data.get("automod_enabled") else 0,
         anti_invite=1 if data.get("anti_invite") else 0,
@@ -1516,7 +2995,7 @@ async def api_cfg_set(request: Request):
         goodbye_message=(data.get("goodbye_message") or "").strip() or None,
         suggestion_channel_id=as_int_or_none(data.get("suggestion_channel_id")),
     )
-    add_log(f"Panel: config saved guild={gid}")
+    add_log(f"Panel: config saved guild={gid}", guild_id=gid, subsystem="panel")
     return {"status": "ok"}
 
 @app.post("/api/config/systems")
@@ -1527,14 +3006,228 @@ async def api_cfg_systems(request: Request):
     gid = int(data.get("g") or 0)
     if gid <= 0:
         return JSONResponse({"error": "Guild invalide"} , status_code=400)
-    set_guild_config(
+    await set_guild_config_async(
         gid,
         leveling_enabled=1 if data.get("leveling_enabled") else 0,
         economy_enabled=1 if data.get("economy_enabled") else 0,
     )
-    add_log(f"Panel: systems saved guild={gid}")
+    add_log(f"Panel: systems saved guild={gid}", guild_id=gid, subsystem="panel")
     return {"status": "ok"}
 
+# --------- helpers: channel jobs ----------
+CHANNEL_OPS_CONCURRENCY = int(os.environ.get("CHANNEL_OPS_CONCURRENCY", 10))
+CHANNEL_JOBS_KEEP = 20
+# how long the gateway cache is distrusted for a channel a job just wrote to
+CHANNEL_JOBS_SETTLE_SEC = float(os.environ.get("CHANNEL_JOBS_SETTLE_SEC", 30))
+
+class ChannelJob:
+    """One operation fanned out over a guild's channels (lockdown, purge).
+
+    At most CHANNEL_OPS_CONCURRENCY channels are in flight. Each channel is
+    its own rate-limit bucket for these routes and discord.py waits out 429s
+    per bucket, so the cap only keeps the bot under the global request rate.
+    op(channel) returns the amount affected, or None when nothing had to change.
+    """
+
+    _ids = itertools.count(1)
+
+    def __init__(self, guild: discord.Guild, kind: str, channels, op, on_finish=None):
+        self.id = next(self._ids)
+        self.guild_id = guild.id
+        self.kind = kind
+        self.channels = list(channels)
+        self.op = op
+        self.on_finish = on_finish
+        self.total = len(self.channels)
+        self.done = 0
+        self.amount = 0
+        self.skipped = 0
+        self.failed = 0
+        self.state = "running"
+        self.started = time.time()
+        self.finished: Optional[float] = None
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> "ChannelJob":
+        self._task = asyncio.create_task(self._run())
+        return self
+
+    def cancel(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+
+    async def stop(self):
+        """Cancel and wait until the in-flight channel calls have unwound."""
+        self.cancel()
+        if self._task is not None:
+            await asyncio.wait({self._task})
+
+    def waiter(self) -> asyncio.Event:
+        return self._wake
+
+    def _notify(self):
+        # one Event per generation, like log_waiter()
+        wake, self._wake = self._wake, asyncio.Event()
+        wake.set()
+
+    async def _one(self, channel, sem: asyncio.Semaphore):
+        async with sem:
+            touched = True
+            try:
+                n = await self.op(channel)
+                if n is None:
+                    touched = False
+                    self.skipped += 1
+                else:
+                    self.amount += n
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.failed += 1
+            finally:
+                # written, failed or cancelled mid-call: the cache may be stale
+                if touched:
+                    CHANNEL_JOBS.touch(channel.id)
+            self.done += 1
+            self._notify()
+
+    async def _run(self):
+        sem = asyncio.Semaphore(max(1, CHANNEL_OPS_CONCURRENCY))
+        try:
+            await asyncio.gather(*(self._one(c, sem) for c in self.channels))
+            self.state = "done"
+        except asyncio.CancelledError:
+            self.state = "cancelled"
+        self.finished = time.time()
+        self._notify()
+        if self.on_finish is not None:
+            try:
+                await self.on_finish(self)
+            except Exception as e:
+                add_log(f"Channel job {self.kind} finish error: {e}", level="ERROR", guild_id=self.guild_id, subsystem="panel")
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "guild_id": str(self.guild_id),
+            "kind": self.kind,
+            "state": self.state,
+            "total": self.total,
+            "done": self.done,
+            "amount": self.amount,
+            "skipped": self.skipped,
+            "failed": self.failed,
+            "elapsed_ms": int(((self.finished or time.time()) - self.started) * 1000),
+        }
+
+class ChannelJobs:
+    """Running and recent channel jobs.
+
+    A new job cancels a running one of the same kind in the guild and waits
+    for it to unwind before starting. Channels a job wrote to are remembered
+    for CHANNEL_JOBS_SETTLE_SEC: until then settled() is False and ops must
+    not trust channel.overwrites_for() to skip them.
+    """
+
+    def __init__(self):
+        self._jobs: "OrderedDict[int, ChannelJob]" = OrderedDict()
+        self._locks: Dict[Tuple[int, str], asyncio.Lock] = {}
+        self._touched: Dict[int, float] = {}
+
+    def touch(self, channel_id: int):
+        now = time.time()
+        if len(self._touched) > 10000:
+            cutoff = now - CHANNEL_JOBS_SETTLE_SEC
+            self._touched = {k: v for k, v in self._touched.items() if v >= cutoff}
+        self._touched[channel_id] = now
+
+    def settled(self, channel_id: int) -> bool:
+        ts = self._touched.get(channel_id)
+        return ts is None or time.time() - ts > CHANNEL_JOBS_SETTLE_SEC
+
+    async def start(self, job: ChannelJob) -> ChannelJob:
+        lock = self._locks.setdefault((job.guild_id, job.kind), asyncio.Lock())
+        async with lock:
+            for other in list(self._jobs.values()):
+                if other.guild_id == job.guild_id and other.kind == job.kind and other.state == "running":
+                    await other.stop()
+            self._jobs[job.id] = job.start()
+        finished = [j.id for j in self._jobs.values() if j.state != "running"]
+        for job_id in finished[:max(0, len(finished) - CHANNEL_JOBS_KEEP)]:
+            del self._jobs[job_id]
+        return job
+
+    def get(self, job_id: int) -> Optional[ChannelJob]:
+        return self._jobs.get(job_id)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"running": sum(1 for j in self._jobs.values() if j.state == "running"), "recent": [j.snapshot() for j in self._jobs.values()][-5:]}
+
+CHANNEL_JOBS = ChannelJobs()
+
+async def lockdown_job(guild: discord.Guild, status: bool, source: str = "panel") -> ChannelJob:
+    role = guild.default_role
+
+    async def op(channel):
+        overwrite = channel.overwrites_for(role)
+        if overwrite.send_messages is (not status) and CHANNEL_JOBS.settled(channel.id):
+            return None
+        overwrite.send_messages = not status
+        await channel.set_permissions(role, overwrite=overwrite, reason=f"Lockdown via {source}")
+        return 1
+
+    async def finish(job: ChannelJob):
+        await send_modlog(guild, f"🔒 LOCKDOWN={status} via {source} ({job.amount} salons, {job.state}, {job.snapshot()['elapsed_ms']} ms)")
+        add_log(f"{source}: lockdown={status} guild={guild.id} count={job.amount} state={job.state}", guild_id=guild.id, subsystem="panel")
+
+    return await CHANNEL_JOBS.start(ChannelJob(guild, "lockdown", guild.text_channels, op, finish))
+
+async def purge_job(guild: discord.Guild, amount: int, source: str = "panel") -> ChannelJob:
+    async def op(channel):
+        deleted = await channel.purge(limit=amount)
+        return len(deleted)
+
+    async def finish(job: ChannelJob):
+        await send_modlog(guild, f"🧹 Purge global via {source}: {job.amount} messages.")
+        add_log(f"{source}: purge_global guild={guild.id} total={job.amount} state={job.state}", guild_id=guild.id, subsystem="panel")
+
+    return await CHANNEL_JOBS.start(ChannelJob(guild, "purge", guild.text_channels, op, finish))
+
+@app.post("/api/channels/jobs/stream")
+async def api_channel_job_stream(request: Request):
+    # NDJSON: one snapshot per progress step until the job ends (POST so the key stays out of URLs)
+    data = await request.json()
+    if auth(data):
+        return JSONResponse({"error": auth(data)}, status_code=403)
+    job = CHANNEL_JOBS.get(int(data.get("job") or 0))
+    if job is None:
+        return JSONResponse({"error": "Job introuvable"}, status_code=404)
+
+    async def progress():
+        while True:
+            wake = job.waiter()
+            yield json.dumps(job.snapshot()) + "\n"
+            if job.state != "running" or await request.is_disconnected():
+                return
+            try:
+                await asyncio.wait_for(wake.wait(), timeout=15)
+            except asyncio.TimeoutError:
+                pass
+
+    return StreamingResponse(progress(), media_type="application/x-ndjson", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.post("/api/channels/jobs/cancel")
+async def api_channel_job_cancel(request: Request):
+    data = await request.json()
+    if auth(data):
+        return JSONResponse({"error": auth(data)}, status_code=403)
+    job = CHANNEL_JOBS.get(int(data.get("job") or 0))
+    if job is None:
+        return JSONResponse({"error": "Job introuvable"}, status_code=404)
+    job.cancel()
+    return {"ok": True, "job": job.snapshot()}
+
 @app.post("/api/run")
 async def api_run(request: Request):
     data = await request.json()
@@ -1548,33 +3241,21 @@ async def api_run(request: Request):
         return {"error": "Serveur introuvable (bot offline ou pas dans ce serveur)."}
     try:
         if action == "lockdown":
-            status = bool(data.get("val"))
-            role = guild.default_role
-            count = 0
-            for channel in guild.text_channels:
-                try:
-                    overwrite = channel.overwrites_for(role)
-                    overwrite.send_messages = not status
-                    await channel.set_permissions(role, overwrite=overwrite)
-                    count += 1
-                except:
-                    continue
-            await send_modlog(guild, f"🔒 LOCKDOWN={status} via panel ({count} salons)")
-            add_log(f"Panel: lockdown={status} guild={gid} count={count}")
-            return {"details": f"OK: {count} salons modifiés."}
+            job = await lockdown_job(guild, bool(data.get("val")))
+            return {"details": f"Lockdown lancé sur {job.total} salons.", "job": job.snapshot()}
 
         if action == "purge_global":
-            amount = int(data.get("val") or 20)
-            total = 0
-            for channel in guild.text_channels:
-                try:
-                    deleted = await channel.purge(limit=amount)
-                    total += len(deleted)
-                except:
-                    continue
-            await send_modlog(guild, f"🧹 Purge global via panel: {total} messages.")
-            add_log(f"Panel: purge_global guild={gid} total={total}")
-            return {"details": f"{total} messages supprimés."}
+            job = await purge_job(guild, int(data.get("val") or 20))
+            return {"details": f"Purge lancée sur {job.total} salons.", "job": job.snapshot()}
+
+        if action == "raid_setup":
+            job = await raid_quarantine_setup(guild)
+            return {"details": f"Quarantaine appliquée sur {job.total} salons.", "job": job.snapshot()}
+
+        if action == "raid_end":
+            if not await RAID_SHIELD.end(gid, "panel"):
+                return {"error": "Aucun raid en cours."}
+            return {"details": "Mode raid terminé."}
 
         if action in ("kick", "ban", "unban", "warn", "timeout", "untimeout"):
             target = str(data.get("target") or "").strip()
@@ -1590,7 +3271,7 @@ async def api_run(request: Request):
                 try:
                     user = await bot.fetch_user(uid)
                     await guild.unban(user, reason=reason)
-                    add_infraction(gid, uid, None, "unban", reason)
+                    await add_infraction_async(gid, uid, None, "unban", reason)
                     await send_modlog(guild, f"✅ Unban: <@{uid}> | {reason}")
                     return {"details": "Unban OK."}
                 except Exception as e:
@@ -1604,18 +3285,18 @@ async def api_run(request: Request):
 
             if action == "kick":
                 await member.kick(reason=reason)
-                add_infraction(gid, uid, None, "kick", reason)
+                await add_infraction_async(gid, uid, None, "kick", reason)
                 await send_modlog(guild, f"👢 Kick: {member.mention} | {reason}")
                 return {"details": "Kick OK."}
 
             if action == "ban":
                 await member.ban(reason=reason)
-                add_infraction(gid, uid, None, "ban", reason)
+                await add_infraction_async(gid, uid, None, "ban", reason)
                 await send_modlog(guild, f"🔨 Ban: {member.mention} | {reason}")
                 return {"details": "Ban OK."}
 
             if action == "warn":
-                add_infraction(gid, uid, None, "warn", reason)
+                await add_infraction_async(gid, uid, None, "warn", reason)
                 try:
                     await member.send(f"⚠️ Avertissement sur **{guild.name}**\nRaison: {reason}")
                 except Exception:
@@ -1633,19 +3314,19 @@ async def api_run(request: Request):
                 if secs > max_secs:
                     return {"error": "Durée trop grande (max ~28j sur Discord)."}
                 await member.timeout(datetime.timedelta(seconds=secs), reason=reason)
-                add_infraction(gid, uid, None, "timeout", f"{duration} | {reason}")
+                await add_infraction_async(gid, uid, None, "timeout", f"{duration} | {reason}")
                 await send_modlog(guild, f"🤐 Timeout {duration}: {member.mention} | {reason}")
                 return {"details": f"Timeout OK ({duration})."}
 
             if action == "untimeout":
                 await member.timeout(None, reason=reason)
-                add_infraction(gid, uid, None, "untimeout", reason)
+                await add_infraction_async(gid, uid, None, "untimeout", reason)
                 await send_modlog(guild, f"🔈 Un-timeout: {member.mention} | {reason}")
                 return {"details": "Un-timeout OK."}
 
         return {"error": "Action inconnue."}
     except Exception as e:
-        add_log(f"Panel run error: {e}")
+        add_log(f"Panel run error: {e}", level="ERROR", guild_id=gid, subsystem="panel")
         return {"error": f"Erreur: {e}"}
 
 @app.post("/api/members/list")
@@ -1658,35 +3339,20 @@ async def api_members_list(request: Request):
     guild = bot.get_guild(gid) if gid else None
     if not guild:
         return {"error": "Serveur introuvable (bot offline ou pas dans ce serveur)."}
+    offset = max(0, int(data.get("offset") or 0))
+    limit = max(1, min(int(data.get("limit") or 200), 500))
+    return await members_page(guild, str(data.get("q") or ""), offset, limit, prefix=bool(data.get("prefix")))
 
-    # Fill cache if possible
-    try:
-        await guild.chunk(cache=True)
-    except Exception:
-        pass
-
-    members = []
-    used = "cache"
-    try:
-        for mbr in guild.members:
-            if getattr(mbr, "bot", False):
-                continue
-            members.append({"id": str(mbr.id), "display": f"{mbr.display_name} (@{mbr.name})"})
-    except Exception:
-        members = []
-
-    if len(members) == 0:
-        used = "fetch"
+async def members_page(guild: discord.Guild, query: str = "", offset: int = 0, limit: int = 200, prefix: bool = False) -> Dict[str, Any]:
+    if guild.id not in MEMBER_INDEX and not guild.chunked:
         try:
-            async for mbr in guild.fetch_members(limit=2000):
-                if getattr(mbr, "bot", False):
-                    continue
-                members.append({"id": str(mbr.id), "display": f"{mbr.display_name} (@{mbr.name})"})
+            await guild.chunk(cache=True)
         except Exception as e:
             return {"error": "Impossible de récupérer les membres (Members Intent + redeploy).", "detail": str(e)}
 
-    members.sort(key=lambda x: x["display"].lower())
-    return {"ok": True, "used": used, "count": len(members), "members": members[:2000]}
+    index = member_index(guild)
+    members, has_more = index.search(query, offset, limit, prefix=prefix)
+    return {"ok": True, "used": "index", "count": len(index), "offset": offset, "has_more": has_more, "members": members}
 
 @app.post("/api/infractions")
 async def api_infractions(request: Request):
@@ -1698,7 +3364,7 @@ async def api_infractions(request: Request):
     if gid <= 0 or uid <= 0:
         return JSONResponse({"error": "guild/user invalide"}, status_code=400)
     limit = int(data.get("limit") or 20)
-    return list_infractions(gid, uid, limit=limit)
+    return await list_infractions_async(gid, uid, limit=limit)
 
 @app.post("/api/shop/seed")
 async def api_shop_seed(request: Request):
@@ -1708,7 +3374,7 @@ async def api_shop_seed(request: Request):
     gid = int(data.get("g") or 0)
     if gid <= 0:
         return JSONResponse({"error": "Guild invalide"}, status_code=400)
-    shop_seed_if_empty(gid)
+    await shop_seed_if_empty_async(gid)
     return {"status": "ok"}
 
 @app.post("/api/shop/list")
@@ -1719,7 +3385,7 @@ async def api_shop_list(request: Request):
     gid = int(data.get("g") or 0)
     if gid <= 0:
         return JSONResponse({"error": "Guild invalide"}, status_code=400)
-    return {"items": shop_list(gid)}
+    return {"items": await shop_list_async(gid)}
 
 @app.post("/api/xp/leaderboard")
 async def api_xp_lb(request: Request):
@@ -1729,8 +3395,10 @@ async def api_xp_lb(request: Request):
     gid = int(data.get("g") or 0)
     if gid <= 0:
         return JSONResponse({"error": "Guild invalide"}, status_code=400)
-    items = xp_leaderboard(gid, limit=10)
-    return {"items": items}
+    offset = max(0, int(data.get("offset") or 0))
+    limit = max(1, min(int(data.get("limit") or 10), 100))
+    board = await leaderboard_async(gid)
+    return {"items": board.page(offset, limit), "total": len(board), "offset": offset}
 
 @app.post("/api/embed/send")
 async def api_embed_send(request: Request):
@@ -1791,7 +3459,7 @@ async def api_embed_send(request: Request):
 
     try:
         await ch.send(embed=embed)
-        add_log(f"Panel: embed sent guild={gid} channel={channel_id}")
+        add_log(f"Panel: embed sent guild={gid} channel={channel_id}", guild_id=gid, subsystem="panel")
         return {"details": "Embed envoyé."}
     except Exception as e:
         return {"error": str(e)}
@@ -1843,36 +3511,205 @@ async def api_giveaway_create(request: Request):
         await msg.add_reaction("🎉")
         emoji = "🎉"
 
-    giveaway_create(gid, ch.id, msg.id, end_ts, winners, prize, emoji)
-    add_log(f"Giveaway created guild={gid} channel={ch.id} msg={msg.id} end={end_ts}")
+    await giveaway_open(gid, ch.id, msg.id, end_ts, winners, prize, emoji)
+    add_log(f"Giveaway created guild={gid} channel={ch.id} msg={msg.id} end={end_ts}", guild_id=gid, subsystem="giveaway")
     return {"details": f"Giveaway créé (message {msg.id})."}
 
+# =========================================================
+# GUILD INDEXES (members, counters)
+# =========================================================
+class GuildMemberIndex:
+    """Sorted, searchable list of one guild's human members.
+
+    Kept current from member events, so the panel never walks guild.members.
+    Search runs str.find over a lowercase haystack snapshot where every field
+    starts with \x00: a substring query is a plain find, a prefix query finds
+    "\x00" + query. Members changed since the snapshot are matched from a
+    small overlay and merged in; the snapshot is rebuilt once that overlay
+    grows past a few percent of the guild.
+    """
+
+    def __init__(self, members=()):
+        self._docs: Dict[int, Tuple[str, str, str]] = {}  # id -> (sort key, display, search doc)
+        for m in members:
+            if not m.bot:
+                self._docs[m.id] = self._entry(m)
+        self._order: List[Tuple[str, int]] = sorted((d[0], mid) for mid, d in self._docs.items())
+        self._haystack: Optional[str] = None
+        self._snapshot: List[Tuple[str, int]] = []
+        self._offsets: List[int] = []
+        self._changed: set = set()
+
+    @staticmethod
+    def _entry(member) -> Tuple[str, str, str]:
+        display = f"{member.display_name} (@{member.name})"
+        doc = f"\x00{member.display_name.lower()}\x00{member.name.lower()}\x00{member.id}"
+        return display.lower(), display, doc
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+    def upsert(self, member):
+        if member.bot:
+            return
+        entry = self._entry(member)
+        old = self._docs.get(member.id)
+        if old == entry:
+            return
+        if old is not None:
+            self._drop(old[0], member.id)
+        self._docs[member.id] = entry
+        bisect.insort(self._order, (entry[0], member.id))
+        self._changed.add(member.id)
+
+    def remove(self, member_id: int):
+        old = self._docs.pop(member_id, None)
+        if old is not None:
+            self._drop(old[0], member_id)
+            self._changed.add(member_id)
+
+    def _drop(self, key: str, member_id: int):
+        i = bisect.bisect_left(self._order, (key, member_id))
+        if i < len(self._order) and self._order[i] == (key, member_id):
+            del self._order[i]
+
+    def _build(self):
+        docs = self._docs
+        self._snapshot = list(self._order)
+        parts = [docs[mid][2] for _, mid in self._snapshot]
+        self._offsets = [0, *itertools.accumulate(map(len, parts))][:-1]
+        self._haystack = "".join(parts)
+        self._changed = set()
+
+    def _snapshot_matches(self, needle: str):
+        hay, offsets, snap, changed = self._haystack, self._offsets, self._snapshot, self._changed
+        pos = hay.find(needle)
+        while pos != -1:
+            i = bisect.bisect_right(offsets, pos) - 1
+            if snap[i][1] not in changed:
+                yield snap[i]
+            pos = hay.find(needle, offsets[i + 1] if i + 1 < len(offsets) else len(hay))
+
+    def search(self, query: str, offset: int = 0, limit: int = 50, prefix: bool = False) -> Tuple[List[Dict[str, str]], bool]:
+        """Return (page, has_more), in display-name order."""
+        query = query.replace("\x00", "").strip().lower()
+        want = offset + limit + 1
+        if not query:
+            ids = [mid for _, mid in self._order[offset:want]]
+        else:
+            if self._haystack is None or len(self._changed) > max(256, len(self._docs) // 20):
+                self._build()
+            needle = "\x00" + query if prefix else query
+            overlay = sorted(
+                (self._docs[mid][0], mid) for mid in self._changed
+                if mid in self._docs and needle in self._docs[mid][2]
+            )
+            merged = heapq.merge(self._snapshot_matches(needle), overlay)
+            ids = [mid for _, mid in itertools.islice(merged, want)][offset:]
+        page = [{"id": str(mid), "display": self._docs[mid][1]} for mid in ids[:limit]]
+        return page, len(ids) > limit
+
+MEMBER_INDEX: Dict[int, GuildMemberIndex] = {}
+
+def member_index(guild: discord.Guild) -> GuildMemberIndex:
+    index = MEMBER_INDEX.get(guild.id)
+    if index is None:
+        index = MEMBER_INDEX[guild.id] = GuildMemberIndex(guild.members)
+    return index
+
+class GuildCounters:
+    """Humans / bots / channels / roles for one guild: seeded by one scan, then event-driven."""
+
+    __slots__ = ("humans", "bots", "text_channels", "voice_channels", "roles")
+
+    def __init__(self, guild: discord.Guild):
+        self.bots = sum(1 for m in guild.members if m.bot)
+        self.humans = len(guild.members) - self.bots
+        self.text_channels = sum(1 for c in guild.channels if isinstance(c, discord.TextChannel))
+        self.voice_channels = sum(1 for c in guild.channels if isinstance(c, discord.VoiceChannel))
+        self.roles = len(guild.roles)
+
+    def member(self, member: discord.Member, delta: int):
+        if member.bot:
+            self.bots = max(0, self.bots + delta)
+        else:
+            self.humans = max(0, self.humans + delta)
+
+    def channel(self, channel, delta: int):
+        if isinstance(channel, discord.TextChannel):
+            self.text_channels = max(0, self.text_channels + delta)
+        elif isinstance(channel, discord.VoiceChannel):
+            self.voice_channels = max(0, self.voice_channels + delta)
+
+GUILD_COUNTERS: Dict[int, GuildCounters] = {}
+
+def guild_counters(guild: discord.Guild) -> GuildCounters:
+    counters = GUILD_COUNTERS.get(guild.id)
+    if counters is None:
+        counters = GUILD_COUNTERS[guild.id] = GuildCounters(guild)
+    return counters
+
+def guild_indexes_reset(guild_id: Optional[int] = None):
+    # after a full reconnect discord.py rebuilds guild state; rebuild ours lazily
+    if guild_id is None:
+        MEMBER_INDEX.clear()
+        GUILD_COUNTERS.clear()
+    else:
+        MEMBER_INDEX.pop(guild_id, None)
+        GUILD_COUNTERS.pop(guild_id, None)
+
+def member_index_update(member: discord.Member, removed: bool = False):
+    index = MEMBER_INDEX.get(member.guild.id)
+    if index is None:
+        return
+    if removed:
+        index.remove(member.id)
+    else:
+        index.upsert(member)
+
+def guild_member_moved(member: discord.Member, delta: int):
+    """Join (+1) or leave (-1): keep counters and the member index in step."""
+    counters = GUILD_COUNTERS.get(member.guild.id)
+    if counters is not None:
+        counters.member(member, delta)
+    member_index_update(member, removed=delta < 0)
+
 # =========================================================
 # EVENTS
 # =========================================================
 @bot.event
 async def on_ready():
-    add_log(f"Bot connecté: {bot.user} | guilds={len(bot.guilds)}")
+    add_log(f"Bot connecté: {bot.user} | guilds={len(bot.guilds)}", subsystem="bot")
+    guild_indexes_reset()
     try:
         await bot.tree.sync()
-        add_log("Slash sync ✅")
+        add_log("Slash sync ✅", subsystem="bot")
     except Exception as e:
-        add_log(f"Slash sync error: {e}")
-
-    if not reminder_loop.is_running():
-        reminder_loop.start()
-    if not giveaway_loop.is_running():
-        giveaway_loop.start()
+        add_log(f"Slash sync error: {e}", level="ERROR", subsystem="bot")
+
+    await reminders_start()
+    await giveaways_start()
+    if not xp_flush_loop.is_running():
+        xp_flush_loop.start()
+    if not econ_ledger_compact_loop.is_running():
+        econ_ledger_compact_loop.start()
+    if not hot_state_checkpoint_loop.is_running():
+        hot_state_checkpoint_loop.start()
+    HOT_STATE.start_restore()
 
 @bot.event
 async def on_message(message: discord.Message):
-    await automod_check(message)
+    if await automod_check(message):
+        return
     await leveling_on_message(message)
+    if await triggers_on_message(message):
+        return
     await bot.process_commands(message)
 
 @bot.event
 async def on_member_join(member: discord.Member):
-    cfg = get_guild_config(member.guild.id)
+    guild_member_moved(member, +1)
+    cfg = await get_guild_config_async(member.guild.id)
     ch_id = cfg.get("welcome_channel_id")
     if ch_id:
         ch = member.guild.get_channel(int(ch_id))
@@ -1886,7 +3723,8 @@ async def on_member_join(member: discord.Member):
 
 @bot.event
 async def on_member_remove(member: discord.Member):
-    cfg = get_guild_config(member.guild.id)
+    guild_member_moved(member, -1)
+    cfg = await get_guild_config_async(member.guild.id)
     ch_id = cfg.get("goodbye_channel_id")
     if ch_id:
         ch = member.guild.get_channel(int(ch_id))
@@ -1899,12 +3737,55 @@ async def on_member_remove(member: discord.Member):
                 pass
     await send_modlog(member.guild, f"👋 Départ: {member} ({member.id})")
 
+@bot.event
+async def on_member_update(before: discord.Member, after: discord.Member):
+    if before.display_name != after.display_name or before.name != after.name:
+        member_index_update(after)
+
+@bot.event
+async def on_user_update(before: discord.User, after: discord.User):
+    if before.name == after.name and before.display_name == after.display_name:
+        return
+    for guild in after.mutual_guilds:
+        member = guild.get_member(after.id)
+        if member:
+            member_index_update(member)
+
+@bot.event
+async def on_guild_remove(guild: discord.Guild):
+    guild_indexes_reset(guild.id)
+
+@bot.event
+async def on_guild_channel_create(channel: discord.abc.GuildChannel):
+    counters = GUILD_COUNTERS.get(channel.guild.id)
+    if counters is not None:
+        counters.channel(channel, +1)
+
+@bot.event
+async def on_guild_channel_delete(channel: discord.abc.GuildChannel):
+    counters = GUILD_COUNTERS.get(channel.guild.id)
+    if counters is not None:
+        counters.channel(channel, -1)
+
+@bot.event
+async def on_guild_role_create(role: discord.Role):
+    counters = GUILD_COUNTERS.get(role.guild.id)
+    if counters is not None:
+        counters.roles += 1
+
+@bot.event
+async def on_guild_role_delete(role: discord.Role):
+    counters = GUILD_COUNTERS.get(role.guild.id)
+    if counters is not None:
+        counters.roles = max(0, counters.roles - 1)
+
 @bot.event
 async def on_raw_reaction_add(payload: discord.RawReactionActionEvent):
     if payload.guild_id is None or payload.member is None or payload.member.bot:
         return
+    await giveaway_on_reaction(payload, added=True)
 
-    role_id = rr_get(payload.guild_id, payload.message_id, str(payload.emoji))
+    role_id = RR_INDEX.get(payload.guild_id, payload.message_id, str(payload.emoji))
     if not role_id:
         return
     guild = bot.get_guild(payload.guild_id)
@@ -1921,7 +3802,8 @@ async def on_raw_reaction_add(payload: discord.RawReactionActionEvent):
 async def on_raw_reaction_remove(payload: discord.RawReactionActionEvent):
     if payload.guild_id is None:
         return
-    role_id = rr_get(payload.guild_id, payload.message_id, str(payload.emoji))
+    await giveaway_on_reaction(payload, added=False)
+    role_id = RR_INDEX.get(payload.guild_id, payload.message_id, str(payload.emoji))
     if not role_id:
         return
     guild = bot.get_guild(payload.guild_id)
@@ -1940,11 +3822,69 @@ async def on_raw_reaction_remove(payload: discord.RawReactionActionEvent):
 # =========================================================
 # LOOPS
 # =========================================================
-@tasks.loop(seconds=10)
-async def reminder_loop():
-    now_ts = int(time.time())
-    due = reminder_due(now_ts, limit=20)
-    for r in due:
+REMINDER_CONCURRENCY = int(os.environ.get("REMINDER_CONCURRENCY", 10))
+
+class DeadlineScheduler:
+    """Min-heap of (due_ts, item) that sleeps exactly until the next deadline.
+
+    Everything due at wake-up is handed to `handler` as one batch; add() only
+    wakes the runner when the new deadline is earlier than the current head.
+    """
+
+    def __init__(self, name: str, handler):
+        self.name = name
+        self.handler = handler
+        self._heap: List[Tuple[float, int, Any]] = []
+        self._seq = itertools.count()
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.fired = 0
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def add(self, due_ts: float, item: Any):
+        head = self._heap[0][0] if self._heap else None
+        heapq.heappush(self._heap, (float(due_ts), next(self._seq), item))
+        if head is None or due_ts < head:
+            self._wake.set()
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            self._wake.clear()
+            if not self._heap:
+                await self._wake.wait()
+                continue
+            delay = self._heap[0][0] - time.time()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            now = time.time()
+            batch = []
+            while self._heap and self._heap[0][0] <= now:
+                batch.append(heapq.heappop(self._heap)[2])
+            self.fired += len(batch)
+            try:
+                await self.handler(batch)
+            except Exception as e:
+                add_log(f"{self.name} scheduler error: {e}", level="ERROR", subsystem=self.name)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": len(self._heap),
+            "next_due_in_sec": round(self._heap[0][0] - time.time(), 3) if self._heap else None,
+            "fired": self.fired,
+        }
+
+async def _deliver_reminder(r: Dict[str, Any], sem: asyncio.Semaphore):
+    async with sem:
         user = bot.get_user(int(r["user_id"]))
         if user:
             try:
@@ -1952,58 +3892,428 @@ async def reminder_loop():
                 await user.send(f"⏰ Rappel ({when}): {r['content']}")
             except:
                 pass
-        reminder_delete(int(r["id"]))
 
-@tasks.loop(seconds=15)
-async def giveaway_loop():
-    now_ts = int(time.time())
-    due = giveaway_due(now_ts, limit=10)
-    for gw in due:
-        try:
-            guild = bot.get_guild(int(gw["guild_id"]))
-            if not guild:
-                giveaway_mark_ended(int(gw["id"]))
-                continue
-            channel = guild.get_channel(int(gw["channel_id"]))
-            if not channel:
-                giveaway_mark_ended(int(gw["id"]))
-                continue
-            msg = await channel.fetch_message(int(gw["message_id"]))
-            emoji = str(gw.get("emoji") or "🎉")
-            winners = int(gw.get("winners") or 1)
-            prize = str(gw.get("prize") or "Prize")
-
-            # find reaction
-            target_reaction = None
-            for r in msg.reactions:
-                if str(r.emoji) == emoji:
-                    target_reaction = r
-                    break
-            if not target_reaction:
-                await channel.send(f"🎁 Giveaway terminé: aucun participant. (Prix: {prize})")
-                giveaway_mark_ended(int(gw["id"]))
-                continue
+async def deliver_reminders(batch: List[Dict[str, Any]]):
+    sem = asyncio.Semaphore(max(1, REMINDER_CONCURRENCY))
+    await asyncio.gather(*(_deliver_reminder(r, sem) for r in batch))
+    await reminder_delete_many_async([int(r["id"]) for r in batch])
+
+REMINDERS = DeadlineScheduler("reminders", deliver_reminders)
+_reminders_loaded = False
+
+async def reminders_start():
+    # loaded once: on_ready fires again after every reconnect
+    global _reminders_loaded
+    if not _reminders_loaded:
+        _reminders_loaded = True
+        for r in await reminder_all_async():
+            REMINDERS.add(int(r["remind_at_ts"]), r)
+        add_log(f"Reminders chargés: {len(REMINDERS)}", subsystem="reminders")
+    REMINDERS.start()
+
+MODLOG_FLUSH_SEC = float(os.environ.get("MODLOG_FLUSH_SEC", 1.5))
+MODLOG_MAX_PENDING = int(os.environ.get("MODLOG_MAX_PENDING", 500))
+MODLOG_MAX_RETRIES = int(os.environ.get("MODLOG_MAX_RETRIES", 4))
+MODLOG_MESSAGES_PER_FLUSH = int(os.environ.get("MODLOG_MESSAGES_PER_FLUSH", 5))
+DISCORD_MESSAGE_LIMIT = 2000
+
+def pack_lines(lines: List[str], limit: int = DISCORD_MESSAGE_LIMIT) -> List[str]:
+    """Greedily join lines with newlines into messages of at most `limit` chars."""
+    chunks: List[str] = []
+    cur: List[str] = []
+    size = 0
+    for line in lines:
+        if len(line) > limit:
+            line = line[:limit - 1] + "…"
+        extra = len(line) + (1 if cur else 0)
+        if cur and size + extra > limit:
+            chunks.append("\n".join(cur))
+            cur, size, extra = [], 0, len(line)
+        cur.append(line)
+        size += extra
+    if cur:
+        chunks.append("\n".join(cur))
+    return chunks
+
+class ModlogDispatcher:
+    """Per-guild modlog queues flushed as merged messages every MODLOG_FLUSH_SEC.
+
+    A flush sends at most MODLOG_MESSAGES_PER_FLUSH messages and re-arms itself
+    while lines remain; each guild flushes in its own task so one slow channel
+    (backoff, rate limit) never holds the others. When a queue is full the
+    oldest line is dropped.
+    """
+
+    def __init__(self):
+        self._queues: Dict[int, deque] = {}
+        self._channels: Dict[int, int] = {}
+        self._armed: set = set()
+        self._flushing: set = set()
+        self._tasks: set = set()
+        self._timer = DeadlineScheduler("modlog", self._due)
+        self.sent_messages = 0
+        self.sent_lines = 0
+        self.retries = 0
+        self.dropped = 0
+
+    def enqueue(self, guild_id: int, channel_id: int, text: str):
+        q = self._queues.get(guild_id)
+        if q is None:
+            q = self._queues[guild_id] = deque()
+        if len(q) >= MODLOG_MAX_PENDING:
+            q.popleft()
+            self.dropped += 1
+        q.append(str(text))
+        self._channels[guild_id] = channel_id
+        self._arm(guild_id)
+
+    def _arm(self, guild_id: int):
+        if guild_id in self._armed or guild_id in self._flushing:
+            return
+        self._armed.add(guild_id)
+        self._timer.add(time.time() + MODLOG_FLUSH_SEC, guild_id)
+        self._timer.start()
+
+    async def _due(self, guild_ids: List[int]):
+        for gid in guild_ids:
+            self._armed.discard(gid)
+            self._flushing.add(gid)
+            # the loop only holds tasks weakly: a collected flush would leave gid in _flushing
+            task = asyncio.create_task(self._flush(gid))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _flush(self, guild_id: int):
+        try:
+            q = self._queues.get(guild_id)
+            guild = bot.get_guild(guild_id)
+            ch = guild.get_channel(self._channels.get(guild_id, 0)) if guild else None
+            if not q:
+                return
+            if ch is None:
+                self.dropped += len(q)
+                q.clear()
+                return
+            lines = [q.popleft() for _ in range(len(q))]
+            chunks = pack_lines(lines)
+            for chunk in chunks[MODLOG_MESSAGES_PER_FLUSH:][::-1]:
+                q.extendleft(reversed(chunk.split("\n")))
+            for chunk in chunks[:MODLOG_MESSAGES_PER_FLUSH]:
+                await self._send(ch, chunk)
+        finally:
+            self._flushing.discard(guild_id)
+            q = self._queues.get(guild_id)
+            if q:
+                self._arm(guild_id)
+            elif q is not None:
+                del self._queues[guild_id]
+
+    async def _send(self, ch, chunk: str):
+        n = chunk.count("\n") + 1
+        for attempt in range(MODLOG_MAX_RETRIES + 1):
+            try:
+                await ch.send(chunk)
+                self.sent_messages += 1
+                self.sent_lines += n
+                return
+            except (discord.Forbidden, discord.NotFound):
+                break
+            except Exception as e:
+                if attempt == MODLOG_MAX_RETRIES:
+                    add_log(f"Modlog: envoi abandonné ({e})", level="ERROR", guild_id=ch.guild.id, subsystem="modlog")
+                    break
+                self.retries += 1
+                await asyncio.sleep(min(30.0, 0.5 * 2 ** attempt))
+        self.dropped += n
+
+    def depth(self, guild_id: Optional[int] = None) -> int:
+        if guild_id is not None:
+            return len(self._queues.get(guild_id) or ())
+        return sum(len(q) for q in self._queues.values())
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": self.depth(),
+            "guilds": len(self._queues),
+            "flushing": len(self._flushing),
+            "sent_messages": self.sent_messages,
+            "sent_lines": self.sent_lines,
+            "retries": self.retries,
+            "dropped": self.dropped,
+        }
+
+MODLOG = ModlogDispatcher()
+
+AUTOMOD_DELETE_WINDOW_SEC = float(os.environ.get("AUTOMOD_DELETE_WINDOW_SEC", 0.5))
+BULK_DELETE_MAX = 100
+BULK_DELETE_MAX_AGE_SEC = 14 * 86400 - 60  # Discord refuses bulk deletes of older messages
+
+class DeleteQueue:
+    """Per-channel batches of message ids to delete, flushed every window.
+
+    Flagged messages are collected for AUTOMOD_DELETE_WINDOW_SEC, then removed
+    with delete_messages() in chunks of 100. Messages too old for bulk delete,
+    lone messages and channels without bulk delete go through single deletes.
+    """
+
+    def __init__(self):
+        self._pending: Dict[int, Dict[int, None]] = {}
+        self._channels: Dict[int, Any] = {}
+        self._tasks: set = set()
+        self._timer = DeadlineScheduler("automod-delete", self._due)
+        self.queued = 0
+        self.bulk_calls = 0
+        self.single_calls = 0
+        self.deleted = 0
+        self.failed = 0
+
+    def add(self, message: discord.Message):
+        cid = message.channel.id
+        ids = self._pending.get(cid)
+        if ids is None:
+            ids = self._pending[cid] = {}
+            self._channels[cid] = message.channel
+            self._timer.add(time.time() + AUTOMOD_DELETE_WINDOW_SEC, cid)
+            self._timer.start()
+        if message.id not in ids:
+            ids[message.id] = None
+            self.queued += 1
+
+    async def _due(self, channel_ids: List[int]):
+        for cid in channel_ids:
+            ids = list(self._pending.pop(cid, {}))
+            ch = self._channels.pop(cid, None)
+            if ids and ch is not None:
+                task = asyncio.create_task(self._flush(ch, ids))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+
+    async def _flush(self, ch, ids: List[int]):
+        cutoff = time.time() - BULK_DELETE_MAX_AGE_SEC
+        fresh = [i for i in ids if discord.utils.snowflake_time(i).timestamp() > cutoff]
+        old = [i for i in ids if discord.utils.snowflake_time(i).timestamp() <= cutoff]
+        if len(fresh) < 2 or not hasattr(ch, "delete_messages"):
+            old, fresh = old + fresh, []
+        for start in range(0, len(fresh), BULK_DELETE_MAX):
+            chunk = fresh[start:start + BULK_DELETE_MAX]
+            if len(chunk) < 2:
+                old.extend(chunk)
+                continue
+            try:
+                self.bulk_calls += 1
+                await ch.delete_messages([discord.Object(id=i) for i in chunk], reason="Automod")
+                self.deleted += len(chunk)
+            except discord.HTTPException:
+                old.extend(chunk)
+        for i in old:
+            try:
+                self.single_calls += 1
+                await ch.get_partial_message(i).delete()
+                self.deleted += 1
+            except discord.NotFound:
+                pass
+            except Exception:
+                self.failed += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": sum(len(v) for v in self._pending.values()),
+            "queued": self.queued,
+            "deleted": self.deleted,
+            "bulk_calls": self.bulk_calls,
+            "single_calls": self.single_calls,
+            "failed": self.failed,
+        }
+
+AUTOMOD_DELETES = DeleteQueue()
+
+def automod_delete(message: discord.Message):
+    AUTOMOD_DELETES.add(message)
+
+class EntrantSet:
+    """User ids with O(1) add/discard and O(k) random draws (list + position index)."""
+
+    __slots__ = ("_items", "_pos")
+
+    def __init__(self, user_ids=()):
+        self._items: List[int] = []
+        self._pos: Dict[int, int] = {}
+        for uid in user_ids:
+            self.add(uid)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def add(self, user_id: int) -> bool:
+        if user_id in self._pos:
+            return False
+        self._pos[user_id] = len(self._items)
+        self._items.append(user_id)
+        return True
+
+    def discard(self, user_id: int) -> bool:
+        i = self._pos.pop(user_id, None)
+        if i is None:
+            return False
+        last = self._items.pop()
+        if last != user_id:
+            self._items[i] = last
+            self._pos[last] = i
+        return True
+
+    def sample(self, k: int) -> List[int]:
+        return random.sample(self._items, min(k, len(self._items)))
+
+    def items(self) -> List[int]:
+        return list(self._items)
+
+# active giveaways by message id, and their entrants by giveaway id
+GIVEAWAYS_BY_MESSAGE: Dict[int, Dict[str, Any]] = {}
+GIVEAWAY_ENTRANTS: Dict[int, EntrantSet] = {}
+
+def giveaway_register(gw: Dict[str, Any], entrants=()):
+    GIVEAWAYS_BY_MESSAGE[int(gw["message_id"])] = gw
+    GIVEAWAY_ENTRANTS[int(gw["id"])] = EntrantSet(entrants)
+    GIVEAWAYS.add(int(gw["end_ts"]), gw)
+
+def giveaway_forget(gw: Dict[str, Any]):
+    GIVEAWAYS_BY_MESSAGE.pop(int(gw["message_id"]), None)
+    GIVEAWAY_ENTRANTS.pop(int(gw["id"]), None)
+
+async def giveaway_open(guild_id: int, channel_id: int, message_id: int, end_ts: int, winners: int, prize: str, emoji: str = "🎉"):
+    gw_id = await giveaway_create_async(guild_id, channel_id, message_id, end_ts, winners, prize, emoji)
+    gw = {
+        "id": gw_id, "guild_id": guild_id, "channel_id": channel_id, "message_id": message_id,
+        "end_ts": end_ts, "winners": winners, "prize": prize, "emoji": emoji,
+        "ended": 0, "entries_synced": 1,
+    }
+    giveaway_register(gw)
+    # reactions added between send() and the registration above never reached giveaway_on_reaction
+    await giveaway_reconcile(gw)
+    return gw_id
+
+async def giveaway_on_reaction(payload: discord.RawReactionActionEvent, added: bool):
+    gw = GIVEAWAYS_BY_MESSAGE.get(payload.message_id)
+    if not gw or str(payload.emoji) != str(gw.get("emoji") or "🎉"):
+        return
+    entrants = GIVEAWAY_ENTRANTS.get(int(gw["id"]))
+    if entrants is None:
+        return
+    if added:
+        if entrants.add(payload.user_id):
+            await giveaway_entry_add_async(int(gw["id"]), payload.user_id)
+    elif entrants.discard(payload.user_id):
+        await giveaway_entry_remove_async(int(gw["id"]), payload.user_id)
+
+async def giveaway_reaction_entrants(channel, message_id: int, emoji: str) -> List[int]:
+    # legacy giveaways draw from this; recorded ones use it to reconcile
+    msg = await channel.fetch_message(message_id)
+    for r in msg.reactions:
+        if str(r.emoji) == emoji:
+            return [u.id async for u in r.users() if not u.bot]
+    return []
+
+async def giveaway_reconcile(gw: Dict[str, Any]):
+    """Bring the recorded entrants in line with the message reactions.
+
+    Catches reactions missed while the giveaway was not registered or the bot
+    was offline. Only users present before the fetch can be removed, so a
+    reaction event handled during it is not undone.
+    """
+    entrants = GIVEAWAY_ENTRANTS.get(int(gw["id"]))
+    guild = bot.get_guild(int(gw["guild_id"]))
+    channel = guild.get_channel(int(gw["channel_id"])) if guild else None
+    if entrants is None or not channel:
+        return
+    before = set(entrants.items())
+    try:
+        users = set(await giveaway_reaction_entrants(channel, int(gw["message_id"]), str(gw.get("emoji") or "🎉")))
+    except Exception as e:
+        add_log(f"Giveaway reconcile error id={gw['id']}: {e}", level="ERROR", guild_id=int(gw["guild_id"]), subsystem="giveaway")
+        return
+    added = [uid for uid in users if entrants.add(uid)]
+    removed = [uid for uid in before - users if entrants.discard(uid)]
+    if added or removed:
+        await giveaway_entries_apply_async(int(gw["id"]), added, removed)
+
+async def end_giveaway(gw: Dict[str, Any]):
+    try:
+        guild = bot.get_guild(int(gw["guild_id"]))
+        channel = guild.get_channel(int(gw["channel_id"])) if guild else None
+        if not channel:
+            return
+        emoji = str(gw.get("emoji") or "🎉")
+        winners = int(gw.get("winners") or 1)
+        prize = str(gw.get("prize") or "Prize")
 
-            users = []
-            async for u in target_reaction.users():
-                if not u.bot:
-                    users.append(u)
+        if gw.get("entries_synced"):
+            entrants = GIVEAWAY_ENTRANTS.get(int(gw["id"]))
+            chosen = entrants.sample(winners) if entrants else []
+        else:
+            users = await giveaway_reaction_entrants(channel, int(gw["message_id"]), emoji)
+            chosen = random.sample(users, min(winners, len(users)))
 
-            if not users:
-                await channel.send(f"🎁 Giveaway terminé: aucun participant. (Prix: {prize})")
-                giveaway_mark_ended(int(gw["id"]))
-                continue
+        if not chosen:
+            await channel.send(f"🎁 Giveaway terminé: aucun participant. (Prix: {prize})")
+            return
 
-            winners = min(winners, len(users))
-            chosen = random.sample(users, winners)
-            mentions = ", ".join([u.mention for u in chosen])
+        mentions = ", ".join([f"<@{uid}>" for uid in chosen])
+        await channel.send(f"🎉 **Giveaway terminé !** Prix: **{prize}**\nGagnant(s): {mentions}")
+        add_log(f"Giveaway ended id={gw['id']} winners={len(chosen)}", guild_id=int(gw["guild_id"]), subsystem="giveaway")
+    except Exception as e:
+        add_log(f"Giveaway end error: {e}", level="ERROR", guild_id=int(gw["guild_id"]), subsystem="giveaway")
+    finally:
+        giveaway_forget(gw)
+        await giveaway_mark_ended_async(int(gw["id"]))
+
+async def end_giveaways(batch: List[Dict[str, Any]]):
+    await asyncio.gather(*(end_giveaway(gw) for gw in batch))
+
+GIVEAWAYS = DeadlineScheduler("giveaways", end_giveaways)
+_giveaways_loaded = False
+
+async def giveaways_start():
+    global _giveaways_loaded
+    if not _giveaways_loaded:
+        _giveaways_loaded = True
+        entries: Dict[int, List[int]] = {}
+        for gw_id, uid in await giveaway_entries_active_async():
+            entries.setdefault(gw_id, []).append(uid)
+        for gw in await giveaway_active_async():
+            giveaway_register(gw, entries.get(int(gw["id"]), ()))
+        add_log(f"Giveaways actifs chargés: {len(GIVEAWAYS)}", subsystem="giveaway")
+    # reactions added while disconnected never produced events: resync before any draw
+    sem = asyncio.Semaphore(CHANNEL_OPS_CONCURRENCY)
+
+    async def reconcile(gw):
+        async with sem:
+            await giveaway_reconcile(gw)
+
+    await asyncio.gather(*(reconcile(gw) for gw in list(GIVEAWAYS_BY_MESSAGE.values()) if gw.get("entries_synced")))
+    GIVEAWAYS.start()
+
+@tasks.loop(seconds=XP_FLUSH_INTERVAL_SEC)
+async def xp_flush_loop():
+    try:
+        await xp_flush_async()
+    except Exception as e:
+        add_log(f"XP flush error: {e}", level="ERROR", subsystem="leveling")
 
-            await channel.send(f"🎉 **Giveaway terminé !** Prix: **{prize}**\nGagnant(s): {mentions}")
-            giveaway_mark_ended(int(gw["id"]))
-            add_log(f"Giveaway ended id={gw['id']} winners={winners}")
-        except Exception as e:
-            add_log(f"Giveaway loop error: {e}")
-            giveaway_mark_ended(int(gw["id"]))
+@tasks.loop(hours=6)
+async def econ_ledger_compact_loop():
+    try:
+        removed = await econ_ledger_compact_async()
+        if removed:
+            add_log(f"Ledger économie compacté: {removed} lignes", subsystem="economy")
+    except Exception as e:
+        add_log(f"Ledger compact error: {e}", level="ERROR", subsystem="economy")
+
+@tasks.loop(seconds=HOT_STATE_INTERVAL_SEC)
+async def hot_state_checkpoint_loop():
+    try:
+        await hot_state_checkpoint_async()
+    except Exception as e:
+        add_log(f"Hot state checkpoint error: {e}", level="ERROR", subsystem="hot_state")
 
 # =========================================================
 # COMMANDS (PREFIX !)
@@ -2083,14 +4393,14 @@ async def nick(ctx, member: discord.Member, *, nickname: str):
 @commands.has_permissions(kick_members=True)
 async def kick(ctx, member: discord.Member, *, reason: str = "Aucune raison"):
     await member.kick(reason=reason)
-    add_infraction(ctx.guild.id, member.id, ctx.author.id, "kick", reason)
+    await add_infraction_async(ctx.guild.id, member.id, ctx.author.id, "kick", reason)
     await send_modlog(ctx.guild, f"👢 Kick: {member.mention} | {reason} | par {ctx.author.mention}")
 
 @bot.command()
 @commands.has_permissions(ban_members=True)
 async def ban(ctx, member: discord.Member, *, reason: str = "Aucune raison"):
     await member.ban(reason=reason)
-    add_infraction(ctx.guild.id, member.id, ctx.author.id, "ban", reason)
+    await add_infraction_async(ctx.guild.id, member.id, ctx.author.id, "ban", reason)
     await send_modlog(ctx.guild, f"🔨 Ban: {member.mention} | {reason} | par {ctx.author.mention}")
 
 @bot.command()
@@ -2105,27 +4415,27 @@ async def unban(ctx, user_id: int):
 async def mute(ctx, member: discord.Member, duration: str = "10m", *, reason: str = "Aucune raison"):
     sec = parse_duration_to_seconds(duration) or 600
     await member.timeout(datetime.timedelta(seconds=sec), reason=reason)
-    add_infraction(ctx.guild.id, member.id, ctx.author.id, "timeout", f"{duration} | {reason}")
+    await add_infraction_async(ctx.guild.id, member.id, ctx.author.id, "timeout", f"{duration} | {reason}")
     await send_modlog(ctx.guild, f"🤐 Timeout: {member.mention} {duration} | {reason} | par {ctx.author.mention}")
 
 @bot.command()
 @commands.has_permissions(moderate_members=True)
 async def unmute(ctx, member: discord.Member, *, reason: str = "Aucune raison"):
     await member.timeout(None, reason=reason)
-    add_infraction(ctx.guild.id, member.id, ctx.author.id, "untimeout", reason)
+    await add_infraction_async(ctx.guild.id, member.id, ctx.author.id, "untimeout", reason)
     await send_modlog(ctx.guild, f"🔈 Un-timeout: {member.mention} | {reason} | par {ctx.author.mention}")
 
 @bot.command()
 @commands.has_permissions(moderate_members=True)
 async def warn(ctx, member: discord.Member, *, reason: str = "Aucune raison"):
-    add_infraction(ctx.guild.id, member.id, ctx.author.id, "warn", reason)
+    await add_infraction_async(ctx.guild.id, member.id, ctx.author.id, "warn", reason)
     await send_modlog(ctx.guild, f"⚠️ Warn: {member.mention} | {reason} | par {ctx.author.mention}")
     await ctx.send(f"⚠️ {member.mention} averti. ({reason})")
 
 @bot.command()
 @commands.has_permissions(moderate_members=True)
 async def infractions(ctx, member: discord.Member):
-    rows = list_infractions(ctx.guild.id, member.id, limit=15)
+    rows = await list_infractions_async(ctx.guild.id, member.id, limit=15)
     if not rows:
         return await ctx.send("Aucune infraction.")
     lines = [f"#{r['id']} • {r['type']} • {r['created_at'][:19].replace('T',' ')} • {r.get('reason') or ''}" for r in rows]
@@ -2134,7 +4444,7 @@ async def infractions(ctx, member: discord.Member):
 @bot.command()
 @commands.has_permissions(moderate_members=True)
 async def clearwarns(ctx, member: discord.Member):
-    clear_warns(ctx.guild.id, member.id)
+    await clear_warns_async(ctx.guild.id, member.id)
     await send_modlog(ctx.guild, f"🧽 Clear warns: {member.mention} par {ctx.author.mention}")
     await ctx.send("✅ Warns supprimés.")
 
@@ -2156,13 +4466,14 @@ async def remind(ctx, duration: str, *, content: str):
     if not sec:
         return await ctx.send("Format durée: `10m`, `2h`, `3d`")
     remind_at = int(time.time()) + sec
-    reminder_add(ctx.author.id, remind_at, content)
+    rid = await reminder_add_async(ctx.author.id, remind_at, content)
+    REMINDERS.add(remind_at, {"id": rid, "user_id": ctx.author.id, "remind_at_ts": remind_at, "content": content})
     await ctx.send(f"⏰ OK. Je te rappellerai dans {duration}.")
 
 # Tickets
 @bot.command()
 async def ticket(ctx, *, subject: str = "Support"):
-    cfg = get_guild_config(ctx.guild.id)
+    cfg = await get_guild_config_async(ctx.guild.id)
     category = None
     if cfg.get("ticket_category_id"):
         category = ctx.guild.get_channel(int(cfg["ticket_category_id"]))
@@ -2195,10 +4506,10 @@ async def rr(ctx, sub: str, message_id: int, emoji: str, role: Optional[discord.
     if sub == "add":
         if role is None:
             return await ctx.send("Usage: `!rr add <message_id> <emoji> <@role>`")
-        rr_add(ctx.guild.id, message_id, emoji, role.id)
+        await rr_add_async(ctx.guild.id, message_id, emoji, role.id)
         await ctx.send("✅ Reaction role ajouté.")
     elif sub == "remove":
-        rr_remove(ctx.guild.id, message_id, emoji)
+        await rr_remove_async(ctx.guild.id, message_id, emoji)
         await ctx.send("✅ Reaction role supprimé.")
     else:
         await ctx.send("Sous-commandes: add/remove")
@@ -2206,7 +4517,7 @@ async def rr(ctx, sub: str, message_id: int, emoji: str, role: Optional[discord.
 # Suggestions
 @bot.command()
 async def suggest(ctx, *, text: str):
-    cfg = get_guild_config(ctx.guild.id)
+    cfg = await get_guild_config_async(ctx.guild.id)
     ch_id = cfg.get("suggestion_channel_id")
     if not ch_id:
         return await ctx.send("❌ suggestion_channel_id n’est pas configuré dans le panel.")
@@ -2224,75 +4535,78 @@ async def suggest(ctx, *, text: str):
     await ctx.send("✅ Suggestion envoyée.")
 
 # Leveling commands
+async def rank_suffix(guild_id: int, user_id: int) -> str:
+    board = await leaderboard_async(guild_id)
+    pos = board.rank(user_id)
+    return f" | rang **#{pos}** / {len(board)}" if pos else ""
+
 @bot.command()
 async def rank(ctx, member: Optional[discord.Member] = None):
     m = member or ctx.author
-    row = xp_get(ctx.guild.id, m.id)
+    row = await xp_get_async(ctx.guild.id, m.id)
     xp = int(row["xp"])
     lvl = int(row["level"])
     next_need = xp_needed_for_level(lvl + 1)
-    await ctx.send(f"📈 {m.mention} — niveau **{lvl}** | XP **{xp}** | prochain niveau à **{next_need}** XP")
+    await ctx.send(f"📈 {m.mention} — niveau **{lvl}** | XP **{xp}** | prochain niveau à **{next_need}** XP{await rank_suffix(ctx.guild.id, m.id)}")
 
 @bot.command()
-async def leaderboard(ctx):
-    items = xp_leaderboard(ctx.guild.id, limit=10)
+async def leaderboard(ctx, page: int = 1):
+    page = max(1, page)
+    board = await leaderboard_async(ctx.guild.id)
+    items = board.page((page - 1) * 10, 10)
     if not items:
         return await ctx.send("Aucun XP.")
     lines = []
-    for i, it in enumerate(items, start=1):
-        lines.append(f"{i}. <@{it['user_id']}> — lvl {it['level']} ({it['xp']} xp)")
-    await ctx.send("🏆 **Leaderboard XP**\n" + "\n".join(lines))
+    for it in items:
+        lines.append(f"{it['rank']}. <@{it['user_id']}> — lvl {it['level']} ({it['xp']} xp)")
+    pages = (len(board) + 9) // 10
+    await ctx.send(f"🏆 **Leaderboard XP** (page {page}/{pages})\n" + "\n".join(lines))
 
 # Economy commands
 @bot.command()
 async def balance(ctx, member: Optional[discord.Member] = None):
-    cfg = get_guild_config(ctx.guild.id)
+    cfg = await get_guild_config_async(ctx.guild.id)
     if not cfg.get("economy_enabled", 1):
         return await ctx.send("Économie désactivée.")
     m = member or ctx.author
-    row = econ_get(ctx.guild.id, m.id)
+    row = await econ_get_async(ctx.guild.id, m.id)
     await ctx.send(f"💰 {m.mention} — **{row['balance']}** coins")
 
 @bot.command()
 async def daily(ctx):
-    cfg = get_guild_config(ctx.guild.id)
+    cfg = await get_guild_config_async(ctx.guild.id)
     if not cfg.get("economy_enabled", 1):
         return await ctx.send("Économie désactivée.")
-    row = econ_get(ctx.guild.id, ctx.author.id)
     now = int(time.time())
     cooldown = 24 * 3600
-    if now - int(row["last_daily_ts"]) < cooldown:
-        remain = cooldown - (now - int(row["last_daily_ts"]))
+    gain = random.randint(100, 200)
+    ok, last_ts = await econ_claim_async(ctx.guild.id, ctx.author.id, gain, now, cooldown)
+    if not ok:
+        remain = cooldown - (now - last_ts)
         hrs = int(remain // 3600)
         mins = int((remain % 3600) // 60)
         return await ctx.send(f"⏳ Reviens dans {hrs}h{mins}m pour ton daily.")
-    gain = random.randint(100, 200)
-    econ_set(ctx.guild.id, ctx.author.id, int(row["balance"]) + gain, now)
     await ctx.send(f"🎁 Daily: +{gain} coins !")
 
 @bot.command()
 async def pay(ctx, member: discord.Member, amount: int):
-    cfg = get_guild_config(ctx.guild.id)
+    cfg = await get_guild_config_async(ctx.guild.id)
     if not cfg.get("economy_enabled", 1):
         return await ctx.send("Économie désactivée.")
     if amount <= 0:
         return await ctx.send("Montant invalide.")
     if member.bot:
         return await ctx.send("Impossible.")
-    me = econ_get(ctx.guild.id, ctx.author.id)
-    if int(me["balance"]) < amount:
+    if not await econ_transfer_async(ctx.guild.id, [(ctx.author.id, member.id, amount)], "pay"):
         return await ctx.send("Solde insuffisant.")
-    you = econ_get(ctx.guild.id, member.id)
-    econ_set(ctx.guild.id, ctx.author.id, int(me["balance"]) - amount, int(me["last_daily_ts"]))
-    econ_set(ctx.guild.id, member.id, int(you["balance"]) + amount, int(you["last_daily_ts"]))
     await ctx.send(f"✅ {ctx.author.mention} a payé {member.mention} **{amount}** coins.")
 
 @bot.command()
 async def shop(ctx):
-    cfg = get_guild_config(ctx.guild.id)
+    cfg = await get_guild_config_async(ctx.guild.id)
     if not cfg.get("economy_enabled", 1):
         return await ctx.send("Économie désactivée.")
-    items = shop_list(ctx.guild.id)
+    items = await shop_list_async(ctx.guild.id)
     if not items:
         return await ctx.send("Shop vide (utilise le panel > Shop > créer par défaut).")
     lines = [f"• `{i['item_key']}` — **{i['price']}** coins — {i['name']}" for i in items]
@@ -2300,20 +4614,17 @@ async def shop(ctx):
 
 @bot.command()
 async def buy(ctx, item_key: str):
-    cfg = get_guild_config(ctx.guild.id)
+    cfg = await get_guild_config_async(ctx.guild.id)
     if not cfg.get("economy_enabled", 1):
         return await ctx.send("Économie désactivée.")
     item_key = (item_key or "").strip()
-    items = {i["item_key"]: i for i in shop_list(ctx.guild.id)}
+    items = {i["item_key"]: i for i in await shop_list_async(ctx.guild.id)}
     if item_key not in items:
         return await ctx.send("Item introuvable.")
     item = items[item_key]
-    row = econ_get(ctx.guild.id, ctx.author.id)
-    bal = int(row["balance"])
     price = int(item["price"])
-    if bal < price:
+    if await econ_debit_async(ctx.guild.id, ctx.author.id, price, "buy", item_key) is None:
         return await ctx.send("Solde insuffisant.")
-    econ_set(ctx.guild.id, ctx.author.id, bal - price, int(row["last_daily_ts"]))
     await ctx.send(f"✅ Achat: **{item['name']}** pour {price} coins. (symbolique, à gérer côté staff)")
 
 # Giveaway command
@@ -2334,7 +4645,7 @@ async def giveaway(ctx, duration: str, winners: int, *, prize: str):
     )
     msg = await ctx.send(embed=embed)
     await msg.add_reaction(emoji)
-    giveaway_create(ctx.guild.id, ctx.channel.id, msg.id, end_ts, winners, prize, emoji)
+    await giveaway_open(ctx.guild.id, ctx.channel.id, msg.id, end_ts, winners, prize, emoji)
     await ctx.send("✅ Giveaway créé.")
 
 # =========================================================
@@ -2349,28 +4660,28 @@ async def slash_rank(interaction: discord.Interaction, user: Optional[discord.Me
     m = user or interaction.user
     if not interaction.guild_id:
         return await interaction.response.send_message("Pas de serveur.", ephemeral=True)
-    row = xp_get(interaction.guild_id, m.id)
+    row = await xp_get_async(interaction.guild_id, m.id)
     xp = int(row["xp"])
     lvl = int(row["level"])
     next_need = xp_needed_for_level(lvl + 1)
-    await interaction.response.send_message(f"📈 {m.mention} — niveau **{lvl}** | XP **{xp}** | prochain niveau à **{next_need}** XP", ephemeral=True)
+    await interaction.response.send_message(f"📈 {m.mention} — niveau **{lvl}** | XP **{xp}** | prochain niveau à **{next_need}** XP{await rank_suffix(interaction.guild_id, m.id)}", ephemeral=True)
 
 @bot.tree.command(name="balance", description="Voir ton solde")
 async def slash_balance(interaction: discord.Interaction, user: Optional[discord.Member] = None):
     if not interaction.guild_id:
         return await interaction.response.send_message("Pas de serveur.", ephemeral=True)
-    cfg = get_guild_config(interaction.guild_id)
+    cfg = await get_guild_config_async(interaction.guild_id)
     if not cfg.get("economy_enabled", 1):
         return await interaction.response.send_message("Économie désactivée.", ephemeral=True)
     m = user or interaction.user
-    row = econ_get(interaction.guild_id, m.id)
+    row = await econ_get_async(interaction.guild_id, m.id)
     await interaction.response.send_message(f"💰 {m.mention} — **{row['balance']}** coins", ephemeral=True)
 
 @bot.tree.command(name="ticket", description="Créer un ticket support")
 async def slash_ticket(interaction: discord.Interaction, subject: str = "Support"):
     if not interaction.guild:
         return await interaction.response.send_message("Pas de serveur.", ephemeral=True)
-    cfg = get_guild_config(interaction.guild.id)
+    cfg = await get_guild_config_async(interaction.guild.id)
     category = None
     if cfg.get("ticket_category_id"):
         category = interaction.guild.get_channel(int(cfg["ticket_category_id"]))
@@ -2390,12 +4701,12 @@ async def slash_ticket(interaction: discord.Interaction, subject: str = "Support
 # =========================================================
 async def start_bot_safely():
     if not DISCORD_TOKEN:
-        add_log("❌ DISCORD_TOKEN manquant: bot offline, panel OK.")
+        add_log("❌ DISCORD_TOKEN manquant: bot offline, panel OK.", level="ERROR", subsystem="bot")
         return
     try:
         await bot.start(DISCORD_TOKEN)
     except Exception as e:
-        add_log(f"❌ Bot crash: {e} (panel reste accessible)")
+        add_log(f"❌ Bot crash: {e} (panel reste accessible)", level="ERROR", subsystem="bot")
 
 async def main():
     db_init()
@@ -2412,11 +4723,13 @@ async def main():
 # =========================================================
 from collections import defaultdict, deque
 
-RECENT_USER_MESSAGES: Dict[Tuple[int, int], deque] = defaultdict(lambda: deque(maxlen=8))
-AFK_USERS: Dict[Tuple[int, int], str] = {}
-LAST_DELETED: Dict[Tuple[int, int], Dict[str, Any]] = {}
-JOIN_TRACKER: Dict[int, deque] = defaultdict(lambda: deque(maxlen=20))
-STARBOARD_CACHE: set = set()
+RECENT_USER_MESSAGES = SlidingWindowTracker("recent_messages", per_key=8, ttl=120, persist=True)
+AFK_USERS: Dict[Tuple[int, int], str] = PersistentDict("afk_users")
+LAST_DELETED: Dict[Tuple[int, int], Dict[str, Any]] = PersistentDict("last_deleted")
+STARBOARD_DEBOUNCE_SEC = float(os.environ.get('STARBOARD_DEBOUNCE_SEC', 3))
+STARBOARD_MAX_ENTRIES = int(os.environ.get('STARBOARD_MAX_ENTRIES', 5000))
+# message_id -> starboard entry (see starboard_entry), LRU-bounded
+STARBOARD_ENTRIES: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
 
 
 def db_init_plus():
@@ -2457,38 +4770,34 @@ def db_init_plus():
         PRIMARY KEY (guild_id, word)
     )
     """)
+    ensure_columns(cur, "addon_config", {
+        "badwords_whole_word": "INTEGER DEFAULT 0",
+        "badwords_normalize": "INTEGER DEFAULT 0",
+        "raid_quarantine_role_id": "INTEGER",
+        "raid_cluster_quarantine": "INTEGER DEFAULT 0",
+    })
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS starboard (
+        message_id INTEGER PRIMARY KEY,
+        guild_id INTEGER NOT NULL,
+        channel_id INTEGER NOT NULL,
+        stars INTEGER NOT NULL DEFAULT 0,
+        post_channel_id INTEGER,
+        post_message_id INTEGER
+    )
+    """)
     con.commit()
-    con.close()
+
+
+ADDON_CONFIG_CACHE = ConfigCache("addon_config")
 
 
 def get_addon_config(guild_id: int) -> Dict[str, Any]:
-    con = db_connect()
-    cur = con.cursor()
-    cur.execute("SELECT * FROM addon_config WHERE guild_id=?", (guild_id,))
-    row = cur.fetchone()
-    if not row:
-        cur.execute("INSERT OR IGNORE INTO addon_config(guild_id) VALUES (?)", (guild_id,))
-        con.commit()
-        cur.execute("SELECT * FROM addon_config WHERE guild_id=?", (guild_id,))
-        row = cur.fetchone()
-    con.close()
-    return dict(row)
+    return ADDON_CONFIG_CACHE.get(guild_id)
 
 
 def set_addon_config(guild_id: int, **kwargs):
-    if not kwargs:
-        return
-    con = db_connect()
-    cur = con.cursor()
-    keys = []
-    vals = []
-    for k, v in kwargs.items():
-        keys.append(f"{k}=?")
-        vals.append(v)
-    vals.append(guild_id)
-    cur.execute(f"UPDATE addon_config SET {', '.join(keys)} WHERE guild_id=?", tuple(vals))
-    con.commit()
-    con.close()
+    ADDON_CONFIG_CACHE.set(guild_id, **kwargs)
 
 
 def badwords_list(guild_id: int) -> List[str]:
@@ -2496,19 +4805,20 @@ def badwords_list(guild_id: int) -> List[str]:
     cur = con.cursor()
     cur.execute("SELECT word FROM bad_words WHERE guild_id=? ORDER BY word ASC", (guild_id,))
     rows = [r['word'] for r in cur.fetchall()]
-    con.close()
     return rows
 
 
-def badword_add(guild_id: int, word: str):
+def badword_add(guild_id: int, word: str) -> bool:
+    """Store a word; False when it is empty or a wildcard with no literal character (e.g. '*')."""
     word = (word or '').strip().lower()
-    if not word:
-        return
+    if not word.replace('*', '').strip():
+        return False
     con = db_connect()
     cur = con.cursor()
     cur.execute("INSERT OR IGNORE INTO bad_words(guild_id, word) VALUES (?,?)", (guild_id, word))
     con.commit()
-    con.close()
+    BADWORD_MATCHERS.invalidate(guild_id)
+    return True
 
 
 def badword_remove(guild_id: int, word: str):
@@ -2517,7 +4827,189 @@ def badword_remove(guild_id: int, word: str):
     cur = con.cursor()
     cur.execute("DELETE FROM bad_words WHERE guild_id=? AND word=?", (guild_id, word))
     con.commit()
-    con.close()
+    BADWORD_MATCHERS.invalidate(guild_id)
+
+
+def starboard_get(message_id: int) -> Optional[Dict[str, Any]]:
+    con = db_connect()
+    cur = con.cursor()
+    cur.execute("SELECT * FROM starboard WHERE message_id=?", (message_id,))
+    row = cur.fetchone()
+    return dict(row) if row else None
+
+
+def starboard_save(entry: Dict[str, Any]):
+    con = db_connect()
+    cur = con.cursor()
+    cur.execute("""
+        INSERT INTO starboard(message_id,guild_id,channel_id,stars,post_channel_id,post_message_id)
+        VALUES (?,?,?,?,?,?)
+        ON CONFLICT(message_id) DO UPDATE SET
+            stars=excluded.stars,
+            post_channel_id=excluded.post_channel_id,
+            post_message_id=excluded.post_message_id
+    """, (entry['message_id'], entry['guild_id'], entry['channel_id'], entry['stars'],
+          entry.get('post_channel_id'), entry.get('post_message_id')))
+    con.commit()
+
+
+class AhoCorasick:
+    """Multi-pattern substring automaton: one pass over the text, whatever the pattern count."""
+
+    def __init__(self, patterns):
+        goto: List[Dict[str, int]] = [{}]
+        out: List[Tuple[str, ...]] = [()]
+        for p in patterns:
+            if not p:
+                continue
+            node = 0
+            for ch in p:
+                nxt = goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[node][ch] = nxt
+                    goto.append({})
+                    out.append(())
+                node = nxt
+            if p not in out[node]:
+                out[node] = out[node] + (p,)
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in goto[node].items():
+                queue.append(nxt)
+                f = fail[node]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f].get(ch, 0)
+                out[nxt] = out[nxt] + out[fail[nxt]]
+        self._goto = goto
+        self._fail = fail
+        self._out = out
+
+    def __len__(self):
+        return len(self._goto) - 1
+
+    def iter_matches(self, text: str):
+        """Yield (start, pattern) for every occurrence, in end-position order."""
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if out[node]:
+                for p in out[node]:
+                    yield i - len(p) + 1, p
+
+
+LEET_MAP = str.maketrans({"0": "o", "1": "i", "3": "e", "4": "a", "5": "s", "7": "t", "@": "a", "$": "s"})
+
+
+def normalize_for_match(text: str, fold: bool = False) -> str:
+    """Lowercase; with fold, also strip diacritics and undo common leetspeak."""
+    text = (text or '').lower()
+    return fold_for_match(text) if fold else text
+
+
+def fold_for_match(text: str) -> str:
+    """Fold step of normalize_for_match, for text that is already lowercase."""
+    text = unicodedata.normalize("NFKD", text)
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return text.translate(LEET_MAP)
+
+
+def _is_word_char(c: str) -> bool:
+    return c.isalnum() or c == '_'
+
+
+class BadwordMatcher:
+    """Compiled bad-word list for one guild.
+
+    Plain words and the longest literal segment of every wildcard ('*' = any
+    run of word characters) share one Aho-Corasick automaton, so a message is
+    scanned once whatever the list size. A wildcard's own regex only runs
+    when its anchor segment shows up, at most once per message. whole_word
+    only accepts hits on word boundaries, fold applies
+    normalize_for_match(fold=True) to words and messages.
+    """
+
+    def __init__(self, words: List[str], whole_word: bool = False, fold: bool = False):
+        self.whole_word = whole_word
+        self.fold = fold
+        self.size = len(words)
+        self._original: Dict[str, str] = {}
+        self._wild_words: List[str] = []
+        self._wild_res: List["re.Pattern"] = []
+        self._anchors: Dict[str, List[int]] = {}
+        for w in words:
+            key = normalize_for_match(w, fold).strip()
+            if not key.replace('*', '').strip():
+                continue
+            if '*' not in key:
+                self._original.setdefault(key, w)
+                continue
+            segments = key.split('*')
+            body = r'\w*'.join(re.escape(seg) for seg in segments)
+            if whole_word:
+                body = rf'(?<!\w){body}(?!\w)'
+            self._anchors.setdefault(max(segments, key=lambda seg: len(seg.strip())), []).append(len(self._wild_words))
+            self._wild_words.append(w)
+            self._wild_res.append(re.compile(body))
+        self._automaton = AhoCorasick(set(self._original) | set(self._anchors))
+
+    def find(self, text: str) -> Optional[str]:
+        """Return the first bad word present in text, or None."""
+        return self.find_lowered((text or '').lower())
+
+    def find_lowered(self, t: str) -> Optional[str]:
+        """find() for text the caller has already lowercased."""
+        if self.fold:
+            t = fold_for_match(t)
+        tried = None
+        for start, key in self._automaton.iter_matches(t):
+            word = self._original.get(key)
+            if word is not None:
+                end = start + len(key)
+                if not (self.whole_word and ((start > 0 and _is_word_char(t[start - 1])) or (end < len(t) and _is_word_char(t[end])))):
+                    return word
+            for i in self._anchors.get(key, ()):
+                if tried is None:
+                    tried = set()
+                elif i in tried:
+                    continue
+                tried.add(i)
+                if self._wild_res[i].search(t):
+                    return self._wild_words[i]
+        return None
+
+
+class BadwordMatcherCache:
+    """One compiled BadwordMatcher per guild, rebuilt only when the list or options change."""
+
+    def __init__(self):
+        self._matchers: Dict[int, Tuple[Tuple[bool, bool], BadwordMatcher]] = {}
+        self.builds = 0
+
+    def peek(self, guild_id: int, options: Tuple[bool, bool]) -> Optional[BadwordMatcher]:
+        entry = self._matchers.get(guild_id)
+        if entry is None or entry[0] != options:
+            return None
+        return entry[1]
+
+    def build(self, guild_id: int, options: Tuple[bool, bool]) -> BadwordMatcher:
+        """Load the list and compile it (DB thread)."""
+        matcher = BadwordMatcher(badwords_list(guild_id), whole_word=options[0], fold=options[1])
+        self._matchers[guild_id] = (options, matcher)
+        self.builds += 1
+        return matcher
+
+    def invalidate(self, guild_id: int):
+        self._matchers.pop(guild_id, None)
+
+
+BADWORD_MATCHERS = BadwordMatcherCache()
 
 
 def _bool(v):
@@ -2525,7 +5017,10 @@ def _bool(v):
 
 
 def economy_cfg(guild_id: int) -> Dict[str, int]:
-    cfg = get_addon_config(guild_id)
+    return _economy_cfg_from(get_addon_config(guild_id))
+
+
+def _economy_cfg_from(cfg: Dict[str, Any]) -> Dict[str, int]:
     return {
         'econ_daily_min': int(cfg.get('econ_daily_min') or 100),
         'econ_daily_max': int(cfg.get('econ_daily_max') or 200),
@@ -2534,6 +5029,29 @@ def economy_cfg(guild_id: int) -> Dict[str, int]:
     }
 
 
+async def get_addon_config_async(guild_id: int) -> Dict[str, Any]:
+    cfg = ADDON_CONFIG_CACHE.peek(guild_id)
+    if cfg is not None:
+        return cfg
+    return await DB_EXECUTOR.run(get_addon_config, guild_id)
+
+
+set_addon_config_async = db_async(set_addon_config)
+badwords_list_async = db_async(badwords_list)
+badword_add_async = db_async(badword_add)
+badword_remove_async = db_async(badword_remove)
+starboard_get_async = db_async(starboard_get)
+starboard_save_async = db_async(starboard_save)
+
+
+async def economy_cfg_async(guild_id: int) -> Dict[str, int]:
+    return _economy_cfg_from(await get_addon_config_async(guild_id))
+
+
+def badword_options(addon: Dict[str, Any]) -> Tuple[bool, bool]:
+    return (bool(addon.get('badwords_whole_word')), bool(addon.get('badwords_normalize')))
+
+
 def parse_ids_from_content(text: str) -> List[int]:
     ids = re.findall(r'<@!?(\d+)>', text or '')
     return [int(x) for x in ids]
@@ -2545,6 +5063,7 @@ _orig_on_member_join = on_member_join
 _orig_on_member_remove = on_member_remove
 _orig_on_raw_reaction_add = on_raw_reaction_add
 _orig_on_raw_reaction_remove = on_raw_reaction_remove
+_orig_on_guild_channel_create = on_guild_channel_create
 
 
 class TicketOpenView(discord.ui.View):
@@ -2555,7 +5074,7 @@ class TicketOpenView(discord.ui.View):
     async def open_ticket(self, interaction: discord.Interaction, button: discord.ui.Button):
         if not interaction.guild:
             return await interaction.response.send_message('Pas de serveur.', ephemeral=True)
-        cfg = get_guild_config(interaction.guild.id)
+        cfg = await get_guild_config_async(interaction.guild.id)
         category = None
         if cfg.get('ticket_category_id'):
             category = interaction.guild.get_channel(int(cfg['ticket_category_id']))
@@ -2571,6 +5090,153 @@ class TicketOpenView(discord.ui.View):
         await send_modlog(interaction.guild, f"🎫 Ticket via panel: {channel.mention} par {interaction.user.mention}")
 
 
+def starboard_embed(msg: discord.Message) -> discord.Embed:
+    emb = discord.Embed(description=msg.content or '(sans texte)', color=0xFFD166)
+    emb.set_author(name=str(msg.author), icon_url=getattr(msg.author.display_avatar, 'url', None))
+    emb.add_field(name='Origine', value=msg.jump_url, inline=False)
+    if msg.attachments:
+        emb.set_image(url=msg.attachments[0].url)
+    return emb
+
+
+async def _starboard_fetch(guild: discord.Guild, channel_id: int, message_id: int) -> Optional[discord.Message]:
+    channel = guild.get_channel_or_thread(channel_id)
+    if not channel:
+        return None
+    return await channel.fetch_message(message_id)
+
+
+def _starboard_stars(msg: discord.Message) -> int:
+    return next((r.count for r in msg.reactions if str(r.emoji) == '⭐'), 0)
+
+
+async def _starboard_load(guild: discord.Guild, channel_id: int, message_id: int, fetch: bool):
+    row = await starboard_get_async(message_id)
+    if row:
+        row['embed'] = None
+        row['posted_stars'] = None
+        # stars added or removed while the bot was offline never produced events:
+        # refresh the stored count once, on the first event seen by this process
+        try:
+            msg = await _starboard_fetch(guild, int(row['channel_id']), message_id)
+        except discord.HTTPException:
+            msg = None
+        if not msg:
+            return row, False
+        row['stars'] = _starboard_stars(msg)
+        row['embed'] = starboard_embed(msg)
+        return row, True
+    if not fetch:
+        return None, False
+    msg = await _starboard_fetch(guild, channel_id, message_id)
+    if not msg:
+        return None, False
+    stars = _starboard_stars(msg)
+    entry = {
+        'message_id': message_id, 'guild_id': guild.id, 'channel_id': channel_id, 'stars': stars,
+        'post_channel_id': None, 'post_message_id': None, 'embed': starboard_embed(msg), 'posted_stars': None,
+    }
+    return entry, True
+
+
+_starboard_loading: Dict[int, asyncio.Task] = {}
+
+
+async def starboard_entry(guild: discord.Guild, channel_id: int, message_id: int, fetch: bool):
+    """Return (entry, fresh). fresh=True means the star count was just read from Discord
+    and already includes the reaction being handled.
+
+    Memory first, then the starboard table (refreshed from the message), then
+    one fetch_message (only when fetch=True). Concurrent events for the same
+    message share one load; only the event that started it gets fresh=True,
+    the others still apply their own delta.
+    """
+    entry = STARBOARD_ENTRIES.get(message_id)
+    if entry is not None:
+        STARBOARD_ENTRIES.move_to_end(message_id)
+        return entry, False
+    task = _starboard_loading.get(message_id)
+    owner = task is None
+    if owner:
+        task = asyncio.create_task(_starboard_load(guild, channel_id, message_id, fetch))
+        _starboard_loading[message_id] = task
+        task.add_done_callback(lambda _t: _starboard_loading.pop(message_id, None))
+    entry, fresh = await task
+    fresh = fresh and owner
+    if entry is not None and message_id not in STARBOARD_ENTRIES:
+        STARBOARD_ENTRIES[message_id] = entry
+        while len(STARBOARD_ENTRIES) > STARBOARD_MAX_ENTRIES:
+            STARBOARD_ENTRIES.popitem(last=False)
+    return STARBOARD_ENTRIES.get(message_id, entry), fresh
+
+
+_starboard_dirty: set = set()
+
+
+async def starboard_on_reaction(payload: discord.RawReactionActionEvent, guild: discord.Guild, delta: int):
+    if str(payload.emoji) != '⭐':
+        return
+    addon = await get_addon_config_async(guild.id)
+    if not addon.get('starboard_enabled') or not addon.get('starboard_channel_id'):
+        return
+    entry, fresh = await starboard_entry(guild, payload.channel_id, payload.message_id, fetch=delta > 0)
+    if entry is None:
+        return
+    if not fresh:
+        entry['stars'] = max(0, int(entry['stars']) + delta)
+    if entry['message_id'] not in _starboard_dirty:
+        _starboard_dirty.add(entry['message_id'])
+        STARBOARD_UPDATES.add(time.time() + STARBOARD_DEBOUNCE_SEC, entry)
+
+
+async def starboard_publish(entry: Dict[str, Any]):
+    guild = bot.get_guild(int(entry['guild_id']))
+    if not guild:
+        return
+    addon = await get_addon_config_async(guild.id)
+    stars = int(entry['stars'])
+    content = f"⭐ **{stars}** dans <#{entry['channel_id']}>"
+    if entry.get('post_message_id'):
+        if stars != entry.get('posted_stars'):
+            post_ch = guild.get_channel(int(entry['post_channel_id']))
+            if post_ch:
+                await post_ch.get_partial_message(int(entry['post_message_id'])).edit(content=content)
+            entry['posted_stars'] = stars
+    elif stars >= int(addon.get('starboard_threshold') or 3) and addon.get('starboard_channel_id'):
+        star_ch = guild.get_channel(int(addon['starboard_channel_id']))
+        if not star_ch:
+            return
+        emb = entry.get('embed')
+        if emb is None:
+            # entry came from the table after a restart: fetch once to build the embed
+            msg = await _starboard_fetch(guild, int(entry['channel_id']), int(entry['message_id']))
+            if not msg:
+                return
+            emb = starboard_embed(msg)
+        post = await star_ch.send(content=content, embed=emb)
+        entry.update(post_channel_id=star_ch.id, post_message_id=post.id, posted_stars=stars, embed=None)
+    await starboard_save_async(entry)
+
+
+async def starboard_flush(batch: List[Dict[str, Any]]):
+    for entry in batch:
+        _starboard_dirty.discard(entry['message_id'])
+        try:
+            await starboard_publish(entry)
+        except Exception as e:
+            add_log(f"starboard error: {e}", level="ERROR", guild_id=int(entry["guild_id"]), subsystem="starboard")
+
+
+STARBOARD_UPDATES = DeadlineScheduler("starboard", starboard_flush)
+
+
+@tasks.loop(seconds=60)
+async def tracker_sweep_loop():
+    now = time.time()
+    for tracker in TRACKERS:
+        tracker.sweep(now)
+
+
 @bot.event
 async def on_ready():
     await _orig_on_ready()
@@ -2578,49 +5244,9 @@ async def on_ready():
         bot.add_view(TicketOpenView())
     except Exception:
         pass
-
-
-async def extra_automod(message: discord.Message):
-    if not message.guild or message.author.bot:
-        return False
-    addon = get_addon_config(message.guild.id)
-    content = message.content or ''
-    if addon.get('anti_bad_words'):
-        lowered = content.lower()
-        words = badwords_list(message.guild.id)
-        hit = next((w for w in words if w and w in lowered), None)
-        if hit and not message.author.guild_permissions.manage_messages:
-            try:
-                await message.delete()
-            except Exception:
-                pass
-            add_infraction(message.guild.id, message.author.id, None, 'badword', hit)
-            await send_modlog(message.guild, f"🤬 Anti bad-word: mot détecté chez {message.author.mention} dans {message.channel.mention}")
-            return True
-    if addon.get('anti_mention_spam'):
-        threshold = int(addon.get('mention_threshold') or 5)
-        mention_count = len(message.mentions) + len(message.role_mentions)
-        if mention_count >= threshold and not message.author.guild_permissions.manage_messages:
-            try:
-                await message.delete()
-            except Exception:
-                pass
-            await send_modlog(message.guild, f"📣 Mention spam: {message.author.mention} ({mention_count} mentions) dans {message.channel.mention}")
-            return True
-    if addon.get('anti_duplicate'):
-        key = (message.guild.id, message.author.id)
-        dq = RECENT_USER_MESSAGES[key]
-        normalized = re.sub(r'\s+', ' ', content.strip().lower())
-        dq.append((time.time(), normalized))
-        recent_same = [x for t, x in dq if time.time() - t <= 30 and x and x == normalized]
-        if len(recent_same) >= 3 and not message.author.guild_permissions.manage_messages:
-            try:
-                await message.delete()
-            except Exception:
-                pass
-            await send_modlog(message.guild, f"♻️ Duplicate spam: {message.author.mention} dans {message.channel.mention}")
-            return True
-    return False
+    if not tracker_sweep_loop.is_running():
+        tracker_sweep_loop.start()
+    STARBOARD_UPDATES.start()
 
 
 @bot.event
@@ -2639,9 +5265,6 @@ async def on_message(message: discord.Message):
                     await message.channel.send(f"💤 {u.mention} est AFK: {reason}", delete_after=10)
                 except Exception:
                     pass
-    blocked = await extra_automod(message)
-    if blocked:
-        return
     await _orig_on_message(message)
 
 
@@ -2649,7 +5272,7 @@ async def on_message(message: discord.Message):
 async def on_message_delete(message: discord.Message):
     if not message.guild or message.author.bot:
         return
-    addon = get_addon_config(message.guild.id)
+    addon = await get_addon_config_async(message.guild.id)
     if addon.get('snipe_enabled', 1):
         LAST_DELETED[(message.guild.id, message.channel.id)] = {
             'author': str(message.author),
@@ -2666,19 +5289,356 @@ async def on_message_edit(before: discord.Message, after: discord.Message):
     await send_modlog(before.guild, f"✏️ Edit: {before.author.mention} dans {before.channel.mention}\nAvant: {before.content[:300]}\nAprès: {after.content[:300]}")
 
 
+# --------- helpers: raid shield ----------
+RAID_COOLDOWN_SEC = float(os.environ.get('RAID_COOLDOWN_SEC', 300))
+RAID_CLUSTER_WINDOW_SEC = float(os.environ.get('RAID_CLUSTER_WINDOW_SEC', 600))
+RAID_CLUSTER_BUCKET_SEC = int(os.environ.get('RAID_CLUSTER_BUCKET_SEC', 3600))
+RAID_CLUSTER_MIN = int(os.environ.get('RAID_CLUSTER_MIN', 3))
+RAID_CLUSTER_MAX_EVENTS = 5000
+RAID_QUARANTINE_ROLE_NAME = os.environ.get('RAID_QUARANTINE_ROLE_NAME', 'Quarantaine')
+RAID_QUARANTINE_DENY = {'send_messages': False, 'send_messages_in_threads': False, 'create_public_threads': False, 'add_reactions': False, 'connect': False}
+RAID_LATENCY_SAMPLES = 256
+
+
+class LatencyWindow:
+    """The last RAID_LATENCY_SAMPLES durations in ms, reported as count/avg/p95/max."""
+
+    def __init__(self, size: int = RAID_LATENCY_SAMPLES):
+        self._samples: deque = deque(maxlen=size)
+        self.count = 0
+        self.max_ms = 0.0
+
+    def add(self, ms: float):
+        self._samples.append(ms)
+        self.count += 1
+        if ms > self.max_ms:
+            self.max_ms = ms
+
+    def stats(self) -> Dict[str, Any]:
+        s = sorted(self._samples)
+        if not s:
+            return {'count': 0, 'avg_ms': None, 'p95_ms': None, 'max_ms': None}
+        return {
+            'count': self.count,
+            'avg_ms': round(sum(s) / len(s), 3),
+            'p95_ms': round(s[min(len(s) - 1, int(len(s) * 0.95))], 3),
+            'max_ms': round(self.max_ms, 3),
+        }
+
+
+class GuildRaidState:
+    """Join-rate ring and account-creation clusters of one guild.
+
+    The ring keeps the last `threshold` joins, so "threshold joins within the
+    window" is one comparison against the oldest slot. Clusters count joins per
+    created_at bucket over RAID_CLUSTER_WINDOW_SEC; every join is pushed and
+    expired exactly once, so both checks are O(1) amortised per join.
+    dump()/merge() carry the state across restarts through HOT_STATE.
+    """
+
+    def __init__(self, threshold: int):
+        self.ring: List[Tuple[float, int]] = [(0.0, 0)] * threshold
+        self.pos = 0
+        self.clusters: Dict[int, int] = {}
+        self.cluster_events: deque = deque()
+        self.raid_started: Optional[float] = None
+        self.raid_until = 0.0
+        self.raid_joins = 0
+        self.raid_held = 0
+        self.held: set = set()
+
+    def resize(self, threshold: int):
+        recent = (self.ring[self.pos:] + self.ring[:self.pos])[-threshold:]
+        self.ring = [(0.0, 0)] * (threshold - len(recent)) + recent
+        self.pos = 0
+
+    def join(self, now: float, member_id: int, window: float) -> bool:
+        """Record a join; True when it completes `threshold` joins within window seconds."""
+        self.ring[self.pos] = (now, member_id)
+        self.pos = (self.pos + 1) % len(self.ring)
+        return now - self.ring[self.pos][0] <= window
+
+    def burst(self, now: float, window: float) -> List[Tuple[int, float]]:
+        return [(mid, ts) for ts, mid in self.ring if mid and now - ts <= window]
+
+    def cluster(self, now: float, bucket: int, member_id: int) -> int:
+        """Record a join in its creation bucket; return the bucket's count in the window."""
+        events = self.cluster_events
+        cutoff = now - RAID_CLUSTER_WINDOW_SEC
+        while events and (events[0][0] < cutoff or len(events) >= RAID_CLUSTER_MAX_EVENTS):
+            _, old, _ = events.popleft()
+            n = self.clusters[old] - 1
+            if n:
+                self.clusters[old] = n
+            else:
+                del self.clusters[old]
+        events.append((now, bucket, member_id))
+        n = self.clusters.get(bucket, 0) + 1
+        self.clusters[bucket] = n
+        return n
+
+    def cluster_members(self, bucket: int) -> List[Tuple[int, float]]:
+        return [(mid, ts) for ts, b, mid in self.cluster_events if b == bucket]
+
+    def dump(self) -> Dict[str, Any]:
+        return {
+            'ring': [e for e in self.ring if e[1]],
+            'threshold': len(self.ring),
+            'events': list(self.cluster_events),
+            'raid_started': self.raid_started,
+            'raid_until': self.raid_until,
+            'raid_joins': self.raid_joins,
+            'raid_held': self.raid_held,
+        }
+
+    def merge(self, saved: Dict[str, Any], now: float) -> bool:
+        """Put saved joins behind the live ones; True when a saved raid is still running."""
+        n = len(self.ring)
+        ring = sorted([tuple(e) for e in saved.get('ring') or ()] + [e for e in self.ring if e[1]])[-n:]
+        self.ring = [(0.0, 0)] * (n - len(ring)) + ring
+        self.pos = 0
+        cutoff = now - RAID_CLUSTER_WINDOW_SEC
+        events = sorted([tuple(e) for e in saved.get('events') or () if e[0] >= cutoff] + list(self.cluster_events))
+        self.cluster_events = deque(events[-RAID_CLUSTER_MAX_EVENTS:])
+        self.clusters = {}
+        for _, bucket, _ in self.cluster_events:
+            self.clusters[bucket] = self.clusters.get(bucket, 0) + 1
+        if self.raid_started is not None or not saved.get('raid_started') or saved.get('raid_until', 0) <= now:
+            return False
+        self.raid_started = saved['raid_started']
+        self.raid_until = saved['raid_until']
+        self.raid_joins = saved.get('raid_joins', 0)
+        self.raid_held = saved.get('raid_held', 0)
+        return True
+
+
+class RaidShield:
+    """Per-guild raid state machine: normal -> raid -> normal.
+
+    Raid mode starts when raid_join_threshold joins land within
+    raid_join_window_sec and ends once RAID_COOLDOWN_SEC pass without another
+    burst (or on `!raid end`). While it lasts every joiner gets the quarantine
+    role, one add_roles call each, and welcome, autorole and DM welcome are
+    skipped. Accounts created in the same RAID_CLUSTER_BUCKET_SEC bucket that
+    join together are flagged in the modlog; outside a raid they are only
+    quarantined when raid_cluster_quarantine is on. Ring, clusters and the
+    raid itself survive a restart through HOT_STATE.
+    """
+
+    def __init__(self):
+        self._guilds: Dict[int, GuildRaidState] = {}
+        self._timer = DeadlineScheduler("raid", self._due)
+        self.raids = 0
+        self.flagged = 0
+        self.quarantined = 0
+        self.unprotected = 0
+        self.failed = 0
+        self.detect = LatencyWindow()
+        self.mitigation = LatencyWindow()
+        HOT_STATE.register("raid_shield", self._dump, self._load)
+
+    def _dump(self) -> List[Any]:
+        return [(gid, st.dump()) for gid, st in self._guilds.items()]
+
+    def _load(self, rows: List[Any]):
+        now = time.time()
+        for gid, saved in rows:
+            st = self._guilds.get(gid)
+            if st is None:
+                st = self._guilds[gid] = GuildRaidState(max(1, int(saved.get('threshold') or 1)))
+            if st.merge(saved, now):
+                self._timer.add(st.raid_until, gid)
+                self._timer.start()
+
+    def raiding(self, guild_id: int) -> bool:
+        st = self._guilds.get(guild_id)
+        return st is not None and st.raid_started is not None
+
+    async def on_join(self, member: discord.Member, addon: Dict[str, Any]) -> bool:
+        """Track one join; True when the member is held back (raid mode or flagged account)."""
+        now = time.time()
+        t0 = time.perf_counter()
+        guild = member.guild
+        threshold = max(1, int(addon.get('raid_join_threshold') or 5))
+        window = float(addon.get('raid_join_window_sec') or 15)
+        st = self._guilds.get(guild.id)
+        if st is None:
+            st = self._guilds[guild.id] = GuildRaidState(threshold)
+        elif len(st.ring) != threshold:
+            st.resize(threshold)
+        burst = st.join(now, member.id, window)
+        bucket = int(member.created_at.timestamp()) // RAID_CLUSTER_BUCKET_SEC
+        clustered = st.cluster(now, bucket, member.id)
+        started = burst and st.raid_started is None
+        if burst:
+            st.raid_until = now + RAID_COOLDOWN_SEC
+        if started:
+            st.raid_started = now
+            st.raid_held = 0
+            self.raids += 1
+            self._timer.add(st.raid_until, guild.id)
+            self._timer.start()
+        targets: List[Tuple[int, float]] = []
+        if started:
+            targets = st.burst(now, window)
+            st.raid_joins = len(targets)
+        elif st.raid_started is not None:
+            targets = [(member.id, now)]
+            st.raid_joins += 1
+        quarantine_clusters = bool(addon.get('raid_cluster_quarantine'))
+        if quarantine_clusters and clustered == RAID_CLUSTER_MIN:
+            targets += st.cluster_members(bucket)
+        elif quarantine_clusters and clustered > RAID_CLUSTER_MIN:
+            targets.append((member.id, now))
+        self.detect.add((time.perf_counter() - t0) * 1000)
+
+        role = guild.get_role(int(addon.get('raid_quarantine_role_id') or 0))
+        if started:
+            span = now - min(ts for _, ts in targets)
+            shield = role.mention if role else "indisponible (`!raid setup`)"
+            await send_modlog(guild, f"🚨 Mode raid activé: {threshold} arrivées en {span:.1f}s. Quarantaine: {shield}. Bienvenue et autorole en pause.")
+            add_log(f"Raid mode on guild={guild.id} joins={threshold} span={span:.1f}s", guild_id=guild.id, subsystem="raid")
+        if clustered >= RAID_CLUSTER_MIN:
+            flagged = st.cluster_members(bucket) if clustered == RAID_CLUSTER_MIN else [(member.id, now)]
+            self.flagged += len(flagged)
+            day = time.strftime('%Y-%m-%d %H:00', time.gmtime(bucket * RAID_CLUSTER_BUCKET_SEC))
+            action = " et mis en quarantaine" if quarantine_clusters else ""
+            await send_modlog(guild, f"🧬 Comptes groupés ({clustered} créés vers {day} UTC, arrivés en {int(RAID_CLUSTER_WINDOW_SEC // 60)} min), signalés{action}: {' '.join(f'<@{mid}>' for mid, _ in flagged)}")
+
+        if st.raid_started is None and len(st.held) > RAID_CLUSTER_MAX_EVENTS:
+            st.held.clear()
+        pending = []
+        for mid, ts in targets:
+            if mid in st.held:
+                continue
+            st.held.add(mid)
+            if st.raid_started is not None:
+                st.raid_held += 1
+            target = member if mid == member.id else guild.get_member(mid)
+            if target is not None:
+                pending.append(self._quarantine(target, role, ts))
+        if pending:
+            await asyncio.gather(*pending)
+        return st.raid_started is not None or (quarantine_clusters and clustered >= RAID_CLUSTER_MIN)
+
+    async def _quarantine(self, member: discord.Member, role: Optional[discord.Role], joined: float):
+        if role is None:
+            self.unprotected += 1
+            return
+        try:
+            await member.add_roles(role, reason='Quarantaine raid')
+        except Exception as e:
+            self.failed += 1
+            add_log(f"Raid: quarantaine impossible pour {member.id} ({e})", level="ERROR", guild_id=member.guild.id, subsystem="raid")
+            return
+        self.quarantined += 1
+        self.mitigation.add((time.time() - joined) * 1000)
+
+    async def _due(self, guild_ids: List[int]):
+        now = time.time()
+        for gid in guild_ids:
+            st = self._guilds.get(gid)
+            if st is None or st.raid_started is None:
+                continue
+            if st.raid_until > now:
+                self._timer.add(st.raid_until, gid)
+                continue
+            await self._end(gid, st, "accalmie")
+
+    async def end(self, guild_id: int, source: str) -> bool:
+        st = self._guilds.get(guild_id)
+        if st is None or st.raid_started is None:
+            return False
+        await self._end(guild_id, st, source)
+        return True
+
+    async def _end(self, guild_id: int, st: GuildRaidState, source: str):
+        duration = int(time.time() - st.raid_started)
+        st.raid_started = None
+        st.held.clear()
+        mit = self.mitigation.stats()
+        guild = bot.get_guild(guild_id)
+        if guild:
+            await send_modlog(guild, f"✅ Fin du mode raid ({source}) après {duration}s: {st.raid_joins} arrivées, {st.raid_held} en quarantaine, mitigation p95 {mit['p95_ms']} ms.")
+        add_log(f"Raid mode off guild={guild_id} source={source} joins={st.raid_joins} held={st.raid_held}", guild_id=guild_id, subsystem="raid")
+
+    def status(self, guild_id: int) -> Dict[str, Any]:
+        st = self._guilds.get(guild_id)
+        raiding = st is not None and st.raid_started is not None
+        return {
+            'state': 'raid' if raiding else 'normal',
+            'since_sec': int(time.time() - st.raid_started) if raiding else None,
+            'ends_in_sec': max(0, int(st.raid_until - time.time())) if raiding else None,
+            'joins': st.raid_joins if raiding else 0,
+            'held': st.raid_held if raiding else 0,
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'guilds': len(self._guilds),
+            'raiding': sum(1 for st in self._guilds.values() if st.raid_started is not None),
+            'raids': self.raids,
+            'flagged': self.flagged,
+            'quarantined': self.quarantined,
+            'unprotected': self.unprotected,
+            'failed': self.failed,
+            'detect': self.detect.stats(),
+            'mitigation': self.mitigation.stats(),
+        }
+
+
+RAID_SHIELD = RaidShield()
+
+
+async def raid_quarantine_setup(guild: discord.Guild, source: str = "panel") -> ChannelJob:
+    """Create the quarantine role if missing and deny it on every channel, ahead of any raid."""
+    addon = await get_addon_config_async(guild.id)
+    role = guild.get_role(int(addon.get('raid_quarantine_role_id') or 0))
+    if role is None:
+        role = await guild.create_role(name=RAID_QUARANTINE_ROLE_NAME, permissions=discord.Permissions.none(), reason=f"Quarantaine raid via {source}")
+        await set_addon_config_async(guild.id, raid_quarantine_role_id=role.id)
+
+    async def op(channel):
+        return await raid_quarantine_apply(channel, role, source)
+
+    async def finish(job: ChannelJob):
+        await send_modlog(guild, f"🛡️ Quarantaine prête via {source}: {role.mention} ({job.amount} salons, {job.state}).")
+        add_log(f"{source}: raid quarantine setup guild={guild.id} role={role.id} count={job.amount} state={job.state}", guild_id=guild.id, subsystem="raid")
+
+    return await CHANNEL_JOBS.start(ChannelJob(guild, "quarantine", guild.channels, op, finish))
+
+
+async def raid_quarantine_apply(channel, role: discord.Role, source: str) -> Optional[int]:
+    """Deny the quarantine role on one channel; None when it already was."""
+    overwrite = channel.overwrites_for(role)
+    if CHANNEL_JOBS.settled(channel.id) and all(getattr(overwrite, k) is v for k, v in RAID_QUARANTINE_DENY.items()):
+        return None
+    overwrite.update(**RAID_QUARANTINE_DENY)
+    await channel.set_permissions(role, overwrite=overwrite, reason=f"Quarantaine raid via {source}")
+    return 1
+
+
+@bot.event
+async def on_guild_channel_create(channel: discord.abc.GuildChannel):
+    await _orig_on_guild_channel_create(channel)
+    addon = await get_addon_config_async(channel.guild.id)
+    role = channel.guild.get_role(int(addon.get('raid_quarantine_role_id') or 0))
+    if role is None:
+        return
+    try:
+        await raid_quarantine_apply(channel, role, "nouveau salon")
+    except Exception as e:
+        add_log(f"Raid: quarantaine non appliquée sur {channel.id} ({e})", level="ERROR", guild_id=channel.guild.id, subsystem="raid")
+
+
 @bot.event
 async def on_member_join(member: discord.Member):
+    addon = await get_addon_config_async(member.guild.id)
+    if addon.get('raid_join_enabled') and await RAID_SHIELD.on_join(member, addon):
+        # held back: still counted, but no welcome message, autorole or DM
+        guild_member_moved(member, +1)
+        return
     await _orig_on_member_join(member)
-    addon = get_addon_config(member.guild.id)
-    now = time.time()
-    dq = JOIN_TRACKER[member.guild.id]
-    dq.append(now)
-    if addon.get('raid_join_enabled'):
-        window = int(addon.get('raid_join_window_sec') or 15)
-        threshold = int(addon.get('raid_join_threshold') or 5)
-        recent = [t for t in dq if now - t <= window]
-        if len(recent) >= threshold:
-            await send_modlog(member.guild, f"🚨 Alerte raid: {len(recent)} arrivées en {window}s sur **{member.guild.name}**")
     if addon.get('autorole_enabled') and addon.get('autorole_id'):
         role = member.guild.get_role(int(addon.get('autorole_id')))
         if role:
@@ -2706,41 +5666,24 @@ async def on_raw_reaction_add(payload: discord.RawReactionActionEvent):
     guild = bot.get_guild(payload.guild_id)
     if not guild:
         return
-    addon = get_addon_config(payload.guild_id)
-    if addon.get('starboard_enabled') and str(payload.emoji) == '⭐':
-        try:
-            channel = guild.get_channel(payload.channel_id)
-            star_ch_id = addon.get('starboard_channel_id')
-            if not channel or not star_ch_id:
-                return
-            star_ch = guild.get_channel(int(star_ch_id))
-            if not star_ch:
-                return
-            msg = await channel.fetch_message(payload.message_id)
-            star_reaction = None
-            for r in msg.reactions:
-                if str(r.emoji) == '⭐':
-                    star_reaction = r
-                    break
-            if not star_reaction:
-                return
-            threshold = int(addon.get('starboard_threshold') or 3)
-            key = (payload.guild_id, payload.message_id)
-            if star_reaction.count >= threshold and key not in STARBOARD_CACHE:
-                emb = discord.Embed(description=msg.content or '(sans texte)', color=0xFFD166)
-                emb.set_author(name=str(msg.author), icon_url=getattr(msg.author.display_avatar, 'url', None))
-                emb.add_field(name='Origine', value=msg.jump_url, inline=False)
-                if msg.attachments:
-                    emb.set_image(url=msg.attachments[0].url)
-                await star_ch.send(content=f"⭐ **{star_reaction.count}** dans {msg.channel.mention}", embed=emb)
-                STARBOARD_CACHE.add(key)
-        except Exception as e:
-            add_log(f"starboard error: {e}")
+    try:
+        await starboard_on_reaction(payload, guild, +1)
+    except Exception as e:
+        add_log(f"starboard error: {e}", level="ERROR", guild_id=payload.guild_id, subsystem="starboard")
 
 
 @bot.event
 async def on_raw_reaction_remove(payload: discord.RawReactionActionEvent):
     await _orig_on_raw_reaction_remove(payload)
+    if payload.guild_id is None or bot.user is None or payload.user_id == bot.user.id:
+        return
+    guild = bot.get_guild(payload.guild_id)
+    if not guild:
+        return
+    try:
+        await starboard_on_reaction(payload, guild, -1)
+    except Exception as e:
+        add_log(f"starboard error: {e}", level="ERROR", guild_id=payload.guild_id, subsystem="starboard")
 
 
 @bot.command()
@@ -2767,13 +5710,12 @@ async def afk(ctx, *, reason: str = 'AFK'):
 async def work(ctx):
     if not ctx.guild:
         return await ctx.send('Serveur uniquement.')
-    cfg = get_guild_config(ctx.guild.id)
+    cfg = await get_guild_config_async(ctx.guild.id)
     if not cfg.get('economy_enabled', 1):
         return await ctx.send('Économie désactivée.')
-    eco = economy_cfg(ctx.guild.id)
+    eco = await economy_cfg_async(ctx.guild.id)
     gain = random.randint(eco['econ_work_min'], eco['econ_work_max'])
-    row = econ_get(ctx.guild.id, ctx.author.id)
-    econ_set(ctx.guild.id, ctx.author.id, int(row['balance']) + gain, int(row['last_daily_ts']))
+    await econ_credit_async(ctx.guild.id, ctx.author.id, gain, 'work')
     await ctx.send(f"🛠️ Travail terminé: +{gain} coins.")
 
 
@@ -2792,27 +5734,60 @@ async def gstart(ctx, duration: str, winners: int, *, prize: str):
 @commands.has_permissions(manage_guild=True)
 async def greroll(ctx, message_id: int):
     try:
-        msg = await ctx.channel.fetch_message(message_id)
-        users = []
-        for r in msg.reactions:
-            if str(r.emoji) == '🎉':
-                async for u in r.users():
-                    if not u.bot:
-                        users.append(u)
-                break
+        gw = await giveaway_get_by_message_async(message_id)
+        if gw and gw.get("entries_synced"):
+            entrants = GIVEAWAY_ENTRANTS.get(int(gw["id"]))
+            users = entrants.items() if entrants else await giveaway_entries_async(int(gw["id"]))
+        else:
+            emoji = str(gw.get("emoji") or "🎉") if gw else '🎉'
+            users = await giveaway_reaction_entrants(ctx.channel, message_id, emoji)
         if not users:
             return await ctx.send('Aucun participant.')
         winner = random.choice(users)
-        await ctx.send(f"🎉 Nouveau gagnant: {winner.mention}")
+        await ctx.send(f"🎉 Nouveau gagnant: <@{winner}>")
     except Exception as e:
         await ctx.send(f"Erreur reroll: {e}")
 
 
+@bot.command()
+@commands.has_permissions(manage_guild=True)
+async def raid(ctx, sub: str = 'status'):
+    sub = sub.lower()
+    if sub == 'setup':
+        job = await raid_quarantine_setup(ctx.guild, source=f"!raid par {ctx.author}")
+        await ctx.send(f"🛡️ Quarantaine en cours de préparation sur {job.total} salons.")
+    elif sub == 'end':
+        ended = await RAID_SHIELD.end(ctx.guild.id, f"!raid par {ctx.author}")
+        await ctx.send('✅ Mode raid terminé.' if ended else 'Aucun raid en cours.')
+    elif sub == 'release':
+        addon = await get_addon_config_async(ctx.guild.id)
+        role = ctx.guild.get_role(int(addon.get('raid_quarantine_role_id') or 0))
+        if role is None:
+            return await ctx.send('Aucun rôle de quarantaine (`!raid setup`).')
+        released = 0
+        for member in list(role.members):
+            try:
+                await member.remove_roles(role, reason=f"Libéré par {ctx.author}")
+                released += 1
+            except Exception:
+                pass
+        await ctx.send(f"🔓 {released} membre(s) libéré(s) de la quarantaine.")
+    elif sub == 'status':
+        st = RAID_SHIELD.status(ctx.guild.id)
+        mit = RAID_SHIELD.stats()['mitigation']
+        if st['state'] == 'raid':
+            await ctx.send(f"🚨 Raid en cours depuis {st['since_sec']}s (fin dans {st['ends_in_sec']}s sans nouvelle vague): {st['joins']} arrivées, {st['held']} en quarantaine. Mitigation p95 {mit['p95_ms']} ms.")
+        else:
+            await ctx.send(f"✅ Aucun raid en cours. Mitigation p95 {mit['p95_ms']} ms sur {mit['count']} quarantaine(s).")
+    else:
+        await ctx.send('Sous-commandes: status/setup/end/release')
+
+
 @bot.command()
 async def closeticket(ctx):
     if not ctx.channel.name.startswith('ticket-'):
         return await ctx.send('Ce salon n’est pas un ticket.')
-    addon = get_addon_config(ctx.guild.id)
+    addon = await get_addon_config_async(ctx.guild.id)
     transcript_channel = None
     if addon.get('transcript_channel_id'):
         transcript_channel = ctx.guild.get_channel(int(addon['transcript_channel_id']))
@@ -2826,7 +5801,7 @@ async def closeticket(ctx):
             file = discord.File(io.BytesIO(payload), filename=f"transcript-{ctx.channel.name}.txt")
             await transcript_channel.send(f"📁 Transcript de {ctx.channel.name}", file=file)
         except Exception as e:
-            add_log(f"transcript error: {e}")
+            add_log(f"transcript error: {e}", level="ERROR", guild_id=ctx.guild.id, subsystem="tickets")
     await ctx.send('Fermeture du ticket dans 3s…')
     await asyncio.sleep(3)
     await ctx.channel.delete()
@@ -2837,7 +5812,7 @@ async def closeticket(ctx):
 async def ticketpanel(ctx):
     view = TicketOpenView()
     msg = await ctx.send('🎫 Clique sur le bouton pour ouvrir un ticket.', view=view)
-    set_addon_config(ctx.guild.id, ticket_panel_channel_id=ctx.channel.id, ticket_panel_message_id=msg.id)
+    await set_addon_config_async(ctx.guild.id, ticket_panel_channel_id=ctx.channel.id, ticket_panel_message_id=msg.id)
     await ctx.send('✅ Panel ticket envoyé.')
 
 
@@ -2845,13 +5820,12 @@ async def ticketpanel(ctx):
 async def slash_workplus(interaction: discord.Interaction):
     if not interaction.guild_id:
         return await interaction.response.send_message('Serveur uniquement.', ephemeral=True)
-    cfg = get_guild_config(interaction.guild_id)
+    cfg = await get_guild_config_async(interaction.guild_id)
     if not cfg.get('economy_enabled', 1):
         return await interaction.response.send_message('Économie désactivée.', ephemeral=True)
-    eco = economy_cfg(interaction.guild_id)
+    eco = await economy_cfg_async(interaction.guild_id)
     gain = random.randint(eco['econ_work_min'], eco['econ_work_max'])
-    row = econ_get(interaction.guild_id, interaction.user.id)
-    econ_set(interaction.guild_id, interaction.user.id, int(row['balance']) + gain, int(row['last_daily_ts']))
+    await econ_credit_async(interaction.guild_id, interaction.user.id, gain, 'work')
     await interaction.response.send_message(f'🛠️ +{gain} coins', ephemeral=True)
 
 
@@ -2881,9 +5855,13 @@ async def slash_serverstatsplus(interaction: discord.Interaction):
     await interaction.response.send_message(f"📊 **{g.name}**\nMembres: {g.member_count}\nSalons: {len(g.channels)}\nRôles: {len(g.roles)}", ephemeral=True)
 
 
+def health_snapshot() -> Dict[str, Any]:
+    return {'ok': True, 'bot_connected': bool(bot.user), 'latency_ms': round(bot.latency * 1000) if bot.user else None, 'guilds': len(getattr(bot, 'guilds', []) or []), 'uptime_sec': int(time.time() - START_TIME), 'db': DB_EXECUTOR.stats(), 'log_stdout': LOG_STDOUT.stats(), 'config_cache': {'guild': GUILD_CONFIG_CACHE.stats(), 'addon': ADDON_CONFIG_CACHE.stats()}, 'xp_store': XP_STORE.stats(), 'leaderboards': LEADERBOARDS.stats(), 'trackers': tracker_stats(), 'reminders': REMINDERS.stats(), 'giveaways': GIVEAWAYS.stats(), 'modlog': MODLOG.stats(), 'automod': AUTOMOD_PIPELINES.stats(), 'automod_deletes': AUTOMOD_DELETES.stats(), 'hot_state': HOT_STATE.stats(), 'triggers': TRIGGERS.stats(), 'channel_jobs': CHANNEL_JOBS.stats(), 'raid': RAID_SHIELD.stats()}
+
+
 @app.get('/api/healthz')
 async def api_healthz():
-    return {'ok': True, 'bot_connected': bool(bot.user), 'latency_ms': round(bot.latency * 1000) if bot.user else None, 'guilds': len(getattr(bot, 'guilds', []) or []), 'uptime_sec': int(time.time() - START_TIME)}
+    return health_snapshot()
 
 
 @app.post('/api/addons/get')
@@ -2894,8 +5872,12 @@ async def api_addons_get(request: Request):
     gid = int(data.get('g') or 0)
     if gid <= 0:
         return JSONResponse({'error': 'Guild invalide'}, status_code=400)
-    cfg = get_addon_config(gid)
-    cfg['bad_words'] = badwords_list(gid)
+    return await addons_data(gid)
+
+
+async def addons_data(gid: int) -> Dict[str, Any]:
+    cfg = await get_addon_config_async(gid)
+    cfg['bad_words'] = await badwords_list_async(gid)
     return cfg
 
 
@@ -2907,8 +5889,8 @@ async def api_addons_set(request: Request):
     gid = int(data.get('g') or 0)
     if gid <= 0:
         return JSONResponse({'error': 'Guild invalide'}, status_code=400)
-    set_addon_config(gid, anti_mention_spam=_bool(data.get('anti_mention_spam')), mention_threshold=int(as_int_or_none(data.get('mention_threshold')) or 5), anti_bad_words=_bool(data.get('anti_bad_words')), anti_duplicate=_bool(data.get('anti_duplicate')), anti_ghost_ping=_bool(data.get('anti_ghost_ping')), starboard_enabled=_bool(data.get('starboard_enabled')), starboard_channel_id=as_int_or_none(data.get('starboard_channel_id')), starboard_threshold=int(as_int_or_none(data.get('starboard_threshold')) or 3), snipe_enabled=_bool(data.get('snipe_enabled')), dm_welcome_enabled=_bool(data.get('dm_welcome_enabled')), autorole_enabled=_bool(data.get('autorole_enabled')), autorole_id=as_int_or_none(data.get('autorole_id')), suggest_autoreact=_bool(data.get('suggest_autoreact')), raid_join_enabled=_bool(data.get('raid_join_enabled')), raid_join_threshold=int(as_int_or_none(data.get('raid_join_threshold')) or 5), raid_join_window_sec=int(as_int_or_none(data.get('raid_join_window_sec')) or 15), econ_daily_min=int(as_int_or_none(data.get('econ_daily_min')) or 100), econ_daily_max=int(as_int_or_none(data.get('econ_daily_max')) or 200), econ_work_min=int(as_int_or_none(data.get('econ_work_min')) or 50), econ_work_max=int(as_int_or_none(data.get('econ_work_max')) or 120), transcript_channel_id=as_int_or_none(data.get('transcript_channel_id')))
-    add_log(f'Panel: addons saved guild={gid}')
+    await set_addon_config_async(gid, anti_mention_spam=_bool(data.get('anti_mention_spam')), mention_threshold=int(as_int_or_none(data.get('mention_threshold')) or 5), anti_bad_words=_bool(data.get('anti_bad_words')), badwords_whole_word=_bool(data.get('badwords_whole_word')), badwords_normalize=_bool(data.get('badwords_normalize')), anti_duplicate=_bool(data.get('anti_duplicate')), anti_ghost_ping=_bool(data.get('anti_ghost_ping')), starboard_enabled=_bool(data.get('starboard_enabled')), starboard_channel_id=as_int_or_none(data.get('starboard_channel_id')), starboard_threshold=int(as_int_or_none(data.get('starboard_threshold')) or 3), snipe_enabled=_bool(data.get('snipe_enabled')), dm_welcome_enabled=_bool(data.get('dm_welcome_enabled')), autorole_enabled=_bool(data.get('autorole_enabled')), autorole_id=as_int_or_none(data.get('autorole_id')), suggest_autoreact=_bool(data.get('suggest_autoreact')), raid_join_enabled=_bool(data.get('raid_join_enabled')), raid_join_threshold=int(as_int_or_none(data.get('raid_join_threshold')) or 5), raid_join_window_sec=int(as_int_or_none(data.get('raid_join_window_sec')) or 15), raid_quarantine_role_id=as_int_or_none(data.get('raid_quarantine_role_id')), raid_cluster_quarantine=_bool(data.get('raid_cluster_quarantine')), econ_daily_min=int(as_int_or_none(data.get('econ_daily_min')) or 100), econ_daily_max=int(as_int_or_none(data.get('econ_daily_max')) or 200), econ_work_min=int(as_int_or_none(data.get('econ_work_min')) or 50), econ_work_max=int(as_int_or_none(data.get('econ_work_max')) or 120), transcript_channel_id=as_int_or_none(data.get('transcript_channel_id')))
+    add_log(f'Panel: addons saved guild={gid}', guild_id=gid, subsystem='panel')
     return {'ok': True}
 
 
@@ -2921,8 +5903,9 @@ async def api_badwords_add(request: Request):
     word = (data.get('word') or '').strip()
     if gid <= 0 or not word:
         return JSONResponse({'error': 'Paramètres invalides'}, status_code=400)
-    badword_add(gid, word)
-    return {'ok': True, 'items': badwords_list(gid)}
+    if not await badword_add_async(gid, word):
+        return JSONResponse({'error': 'Un joker doit contenir au moins une lettre (ex: spam*)'}, status_code=400)
+    return {'ok': True, 'items': await badwords_list_async(gid)}
 
 
 @app.post('/api/badwords/remove')
@@ -2934,8 +5917,8 @@ async def api_badwords_remove(request: Request):
     word = (data.get('word') or '').strip()
     if gid <= 0 or not word:
         return JSONResponse({'error': 'Paramètres invalides'}, status_code=400)
-    badword_remove(gid, word)
-    return {'ok': True, 'items': badwords_list(gid)}
+    await badword_remove_async(gid, word)
+    return {'ok': True, 'items': await badwords_list_async(gid)}
 
 
 @app.post('/api/stats/overview')
@@ -2947,9 +5930,12 @@ async def api_stats_overview(request: Request):
     guild = bot.get_guild(gid) if gid else None
     if not guild:
         return JSONResponse({'error': 'Serveur introuvable'}, status_code=404)
-    humans = len([m for m in guild.members if not m.bot])
-    bots = len([m for m in guild.members if m.bot])
-    return {'name': guild.name, 'members': guild.member_count, 'humans': humans, 'bots': bots, 'roles': len(guild.roles), 'text_channels': len(guild.text_channels), 'voice_channels': len(guild.voice_channels), 'xp_top': xp_leaderboard(gid, limit=5), 'shop_items': len(shop_list(gid))}
+    return await overview_data(guild)
+
+
+async def overview_data(guild: discord.Guild) -> Dict[str, Any]:
+    c = guild_counters(guild)
+    return {'name': guild.name, 'members': guild.member_count, 'humans': c.humans, 'bots': c.bots, 'roles': c.roles, 'text_channels': c.text_channels, 'voice_channels': c.voice_channels, 'xp_top': await xp_top_async(guild.id, limit=5), 'shop_items': await shop_count_async(guild.id)}
 
 
 @app.post('/api/economy/config/get')
@@ -2960,7 +5946,7 @@ async def api_economy_config_get(request: Request):
     gid = int(data.get('g') or 0)
     if gid <= 0:
         return JSONResponse({'error': 'Guild invalide'}, status_code=400)
-    return economy_cfg(gid)
+    return await economy_cfg_async(gid)
 
 
 @app.post('/api/economy/config/set')
@@ -2971,7 +5957,7 @@ async def api_economy_config_set(request: Request):
     gid = int(data.get('g') or 0)
     if gid <= 0:
         return JSONResponse({'error': 'Guild invalide'}, status_code=400)
-    set_addon_config(gid, econ_daily_min=int(as_int_or_none(data.get('econ_daily_min')) or 100), econ_daily_max=int(as_int_or_none(data.get('econ_daily_max')) or 200), econ_work_min=int(as_int_or_none(data.get('econ_work_min')) or 50), econ_work_max=int(as_int_or_none(data.get('econ_work_max')) or 120))
+    await set_addon_config_async(gid, econ_daily_min=int(as_int_or_none(data.get('econ_daily_min')) or 100), econ_daily_max=int(as_int_or_none(data.get('econ_daily_max')) or 200), econ_work_min=int(as_int_or_none(data.get('econ_work_min')) or 50), econ_work_max=int(as_int_or_none(data.get('econ_work_max')) or 120))
     return {'ok': True}
 
 
@@ -2984,7 +5970,7 @@ async def api_economy_user_get(request: Request):
     uid = int(data.get('u') or 0)
     if gid <= 0 or uid <= 0:
         return JSONResponse({'error': 'Paramètres invalides'}, status_code=400)
-    return econ_get(gid, uid)
+    return await econ_get_async(gid, uid)
 
 
 @app.post('/api/economy/user/set')
@@ -2997,8 +5983,7 @@ async def api_economy_user_set(request: Request):
     balance = int(data.get('balance') or 0)
     if gid <= 0 or uid <= 0:
         return JSONResponse({'error': 'Paramètres invalides'}, status_code=400)
-    row = econ_get(gid, uid)
-    econ_set(gid, uid, balance, int(row['last_daily_ts']))
+    await econ_set_balance_async(gid, uid, balance, 'panel')
     return {'ok': True, 'balance': balance}
 
 
@@ -3010,8 +5995,7 @@ async def api_rr_list(request: Request):
     gid = int(data.get('g') or 0)
     if gid <= 0:
         return JSONResponse({'error': 'Guild invalide'}, status_code=400)
-    con = db_connect(); cur = con.cursor(); cur.execute('SELECT * FROM reaction_roles WHERE guild_id=? ORDER BY message_id ASC', (gid,)); items = [dict(r) for r in cur.fetchall()]; con.close()
-    return {'items': items}
+    return {'items': await rr_list_async(gid)}
 
 
 @app.post('/api/reactionroles/add')
@@ -3022,7 +6006,7 @@ async def api_rr_add(request: Request):
     gid = int(data.get('g') or 0); message_id = int(data.get('message_id') or 0); emoji = str(data.get('emoji') or '').strip(); role_id = int(data.get('role_id') or 0)
     if gid <= 0 or message_id <= 0 or role_id <= 0 or not emoji:
         return JSONResponse({'error': 'Paramètres invalides'}, status_code=400)
-    rr_add(gid, message_id, emoji, role_id)
+    await rr_add_async(gid, message_id, emoji, role_id)
     return {'ok': True}
 
 
@@ -3034,7 +6018,7 @@ async def api_rr_remove(request: Request):
     gid = int(data.get('g') or 0); message_id = int(data.get('message_id') or 0); emoji = str(data.get('emoji') or '').strip()
     if gid <= 0 or message_id <= 0 or not emoji:
         return JSONResponse({'error': 'Paramètres invalides'}, status_code=400)
-    rr_remove(gid, message_id, emoji)
+    await rr_remove_async(gid, message_id, emoji)
     return {'ok': True}
 
 
@@ -3046,10 +6030,42 @@ async def api_tickets_config_get(request: Request):
     gid = int(data.get('g') or 0)
     if gid <= 0:
         return JSONResponse({'error': 'Guild invalide'}, status_code=400)
-    base = get_guild_config(gid); addon = get_addon_config(gid)
+    return await tickets_config_data(gid)
+
+
+async def tickets_config_data(gid: int) -> Dict[str, Any]:
+    base = await get_guild_config_async(gid); addon = await get_addon_config_async(gid)
     return {'ticket_category_id': base.get('ticket_category_id'), 'ticket_panel_channel_id': addon.get('ticket_panel_channel_id'), 'ticket_panel_message_id': addon.get('ticket_panel_message_id'), 'transcript_channel_id': addon.get('transcript_channel_id')}
 
 
+@app.post('/api/bootstrap')
+async def api_bootstrap(request: Request):
+    # one round trip for the whole dashboard: auth once, sections gathered concurrently
+    data = await request.json()
+    if auth(data):
+        return JSONResponse({'error': auth(data)}, status_code=403)
+    out = {'info': panel_info(), 'health': health_snapshot(), 'logs': [e.line for e in LOG_RING.since(0)[0]]}
+    gid = int(data.get('g') or 0)
+    if gid <= 0:
+        out['error'] = 'Guild invalide'
+        return out
+    parts = {
+        'config': get_guild_config_async(gid),
+        'addons': addons_data(gid),
+        'tickets': tickets_config_data(gid),
+        'shop': shop_list_async(gid),
+        'reaction_roles': rr_list_async(gid),
+    }
+    guild = bot.get_guild(gid)
+    if guild:
+        parts['overview'] = overview_data(guild)
+        parts['members'] = members_page(guild)
+    results = await asyncio.gather(*parts.values(), return_exceptions=True)
+    for key, res in zip(parts, results):
+        out[key] = {'error': str(res)} if isinstance(res, Exception) else res
+    return out
+
+
 @app.post('/api/tickets/config/set')
 async def api_tickets_config_set(request: Request):
     data = await request.json()
@@ -3058,8 +6074,8 @@ async def api_tickets_config_set(request: Request):
     gid = int(data.get('g') or 0)
     if gid <= 0:
         return JSONResponse({'error': 'Guild invalide'}, status_code=400)
-    set_guild_config(gid, ticket_category_id=as_int_or_none(data.get('ticket_category_id')))
-    set_addon_config(gid, transcript_channel_id=as_int_or_none(data.get('transcript_channel_id')))
+    await set_guild_config_async(gid, ticket_category_id=as_int_or_none(data.get('ticket_category_id')))
+    await set_addon_config_async(gid, transcript_channel_id=as_int_or_none(data.get('transcript_channel_id')))
     return {'ok': True}
 
 
@@ -3076,7 +6092,7 @@ async def api_tickets_panel_send(request: Request):
     if not ch:
         return JSONResponse({'error': 'Salon introuvable'}, status_code=404)
     msg = await ch.send('🎫 Clique sur le bouton pour ouvrir un ticket.', view=TicketOpenView())
-    set_addon_config(gid, ticket_panel_channel_id=channel_id, ticket_panel_message_id=msg.id)
+    await set_addon_config_async(gid, ticket_panel_channel_id=channel_id, ticket_panel_message_id=msg.id)
     return {'ok': True, 'message_id': msg.id}
 
 
@@ -3086,7 +6102,7 @@ def patch_panel_html():
         return
     PANEL_HTML = PANEL_HTML.replace('<button data-tab="tab-logs">Logs</button>', '<button data-tab="tab-logs">Logs</button>\n      <button data-tab="tab-addonsplus">Addons+</button>\n      <button data-tab="tab-economyplus">Économie+</button>\n      <button data-tab="tab-reactionroles">Reaction Roles</button>\n      <button data-tab="tab-ticketsplus">Tickets+</button>\n      <button data-tab="tab-analytics">Analytics</button>')
     extra_sections = """
-    <section id="tab-addonsplus" class="tab"><div class="grid"><div class="card"><div class="title">Automod+</div><label><input type="checkbox" id="anti_mention_spam"/> Anti mention spam</label><label>Seuil mentions</label><input id="mention_threshold" placeholder="5"/><label><input type="checkbox" id="anti_bad_words"/> Anti mots interdits</label><label><input type="checkbox" id="anti_duplicate"/> Anti messages dupliqués</label><label><input type="checkbox" id="anti_ghost_ping"/> Anti ghost ping</label><label><input type="checkbox" id="snipe_enabled"/> Snipe activé</label><label><input type="checkbox" id="raid_join_enabled"/> Détection raid joins</label><label>Seuil joins</label><input id="raid_join_threshold" placeholder="5"/><label>Fenêtre joins (sec)</label><input id="raid_join_window_sec" placeholder="15"/><div class="row" style="margin-top:12px"><button class="btn primary" onclick="saveAddons()">Sauvegarder</button></div></div><div class="card"><div class="title">Starboard / Autorole / Welcome DM</div><label><input type="checkbox" id="starboard_enabled"/> Starboard activé</label><label>Salon starboard ID</label><input id="starboard_channel_id" placeholder="ID salon"/><label>Seuil étoiles</label><input id="starboard_threshold" placeholder="3"/><label><input type="checkbox" id="autorole_enabled"/> Autorole activé</label><label>Autorole ID</label><input id="autorole_id" placeholder="ID rôle"/><label><input type="checkbox" id="dm_welcome_enabled"/> DM de bienvenue</label><label><input type="checkbox" id="suggest_autoreact"/> Suggestions auto-réactions</label><div class="hint" id="addonsMsg">—</div></div></div><div class="grid" style="margin-top:14px"><div class="card"><div class="title">Mots interdits</div><div class="row"><input id="badword_input" placeholder="mot interdit"/><button class="btn" onclick="addBadword()">Ajouter</button><button class="btn danger" onclick="removeBadword()">Supprimer</button></div><div class="console" id="badwordBox">—</div></div><div class="card"><div class="title">Commandes ajoutées</div><div class="hint">!snipe • !afk • !work • !give • !gstart • !greroll • !ticketpanel • !closeticket</div></div></div></section>
+    <section id="tab-addonsplus" class="tab"><div class="grid"><div class="card"><div class="title">Automod+</div><label><input type="checkbox" id="anti_mention_spam"/> Anti mention spam</label><label>Seuil mentions</label><input id="mention_threshold" placeholder="5"/><label><input type="checkbox" id="anti_bad_words"/> Anti mots interdits</label><label><input type="checkbox" id="badwords_whole_word"/> Mots entiers uniquement</label><label><input type="checkbox" id="badwords_normalize"/> Normaliser accents / leetspeak</label><label><input type="checkbox" id="anti_duplicate"/> Anti messages dupliqués</label><label><input type="checkbox" id="anti_ghost_ping"/> Anti ghost ping</label><label><input type="checkbox" id="snipe_enabled"/> Snipe activé</label><label><input type="checkbox" id="raid_join_enabled"/> Détection raid joins</label><label>Seuil joins</label><input id="raid_join_threshold" placeholder="5"/><label>Fenêtre joins (sec)</label><input id="raid_join_window_sec" placeholder="15"/><label>Rôle quarantaine ID</label><input id="raid_quarantine_role_id" placeholder="ID rôle (Préparer la quarantaine le crée)"/><label><input type="checkbox" id="raid_cluster_quarantine"/> Quarantaine des comptes groupés hors raid</label><div class="row" style="margin-top:12px"><button class="btn primary" onclick="saveAddons()">Sauvegarder</button><button class="btn" onclick="panelAction('raid_setup', 0)">Préparer la quarantaine</button><button class="btn danger" onclick="panelAction('raid_end', 0)">Fin du raid</button></div></div><div class="card"><div class="title">Starboard / Autorole / Welcome DM</div><label><input type="checkbox" id="starboard_enabled"/> Starboard activé</label><label>Salon starboard ID</label><input id="starboard_channel_id" placeholder="ID salon"/><label>Seuil étoiles</label><input id="starboard_threshold" placeholder="3"/><label><input type="checkbox" id="autorole_enabled"/> Autorole activé</label><label>Autorole ID</label><input id="autorole_id" placeholder="ID rôle"/><label><input type="checkbox" id="dm_welcome_enabled"/> DM de bienvenue</label><label><input type="checkbox" id="suggest_autoreact"/> Suggestions auto-réactions</label><div class="hint" id="addonsMsg">—</div></div></div><div class="grid" style="margin-top:14px"><div class="card"><div class="title">Mots interdits</div><div class="hint">Joker: * (ex: spam*)</div><div class="row"><input id="badword_input" placeholder="mot interdit"/><button class="btn" onclick="addBadword()">Ajouter</button><button class="btn danger" onclick="removeBadword()">Supprimer</button></div><div class="console" id="badwordBox">—</div></div><div class="card"><div class="title">Commandes ajoutées</div><div class="hint">!snipe • !afk • !work • !give • !gstart • !greroll • !ticketpanel • !closeticket • !raid</div></div></div></section>
     <section id="tab-economyplus" class="tab"><div class="grid"><div class="card"><div class="title">Réglages économie</div><label>Daily min</label><input id="econ_daily_min" placeholder="100"/><label>Daily max</label><input id="econ_daily_max" placeholder="200"/><label>Work min</label><input id="econ_work_min" placeholder="50"/><label>Work max</label><input id="econ_work_max" placeholder="120"/><div class="row" style="margin-top:12px"><button class="btn primary" onclick="saveEconomyConfig()">Sauvegarder</button></div></div><div class="card"><div class="title">Gérer une balance</div><label>ID utilisateur</label><input id="eco_user_id" placeholder="123456"/><div class="row"><button class="btn" onclick="loadEcoUser()">Charger</button></div><label>Balance</label><input id="eco_balance" placeholder="0"/><div class="row" style="margin-top:12px"><button class="btn primary" onclick="saveEcoUser()">Enregistrer</button></div><div class="hint" id="ecoUserMsg">—</div></div></div></section>
     <section id="tab-reactionroles" class="tab"><div class="grid"><div class="card"><div class="title">Ajouter / supprimer</div><label>Message ID</label><input id="rr_message_id" placeholder="ID message"/><label>Emoji</label><input id="rr_emoji" placeholder="⭐"/><label>Role ID</label><input id="rr_role_id" placeholder="ID rôle"/><div class="row" style="margin-top:12px"><button class="btn" onclick="rrAddPanel()">Ajouter</button><button class="btn danger" onclick="rrRemovePanel()">Supprimer</button><button class="btn" onclick="rrListPanel()">Actualiser</button></div></div><div class="card"><div class="title">Liste</div><div class="console" id="rrBox">—</div></div></div></section>
     <section id="tab-ticketsplus" class="tab"><div class="grid"><div class="card"><div class="title">Configuration tickets</div><label>Catégorie ticket ID</label><input id="ticket_category_id_plus" placeholder="ID catégorie"/><label>Salon transcripts ID</label><input id="transcript_channel_id" placeholder="ID salon transcript"/><div class="row" style="margin-top:12px"><button class="btn primary" onclick="saveTicketsCfg()">Sauvegarder</button></div></div><div class="card"><div class="title">Envoyer le panel ticket</div><label>Salon cible ID</label><input id="ticket_panel_channel_id_send" placeholder="ID salon"/><div class="row" style="margin-top:12px"><button class="btn" onclick="sendTicketPanel()">Envoyer</button><button class="btn" onclick="loadTicketsCfg()">Actualiser</button></div><div class="hint" id="ticketsMsg">—</div></div></div></section>
@@ -3094,12 +6110,12 @@ def patch_panel_html():
     """
     PANEL_HTML = PANEL_HTML.replace('</main>', extra_sections + '\n  </main>')
     extra_js = """
-async function loadAddons(){ const d = await api('/api/addons/get', {k:keyVal(), g:guildVal()}); if(d.error) return; const ids=['anti_mention_spam','anti_bad_words','anti_duplicate','anti_ghost_ping','starboard_enabled','snipe_enabled','dm_welcome_enabled','autorole_enabled','suggest_autoreact','raid_join_enabled']; ids.forEach(id=>{const el=document.getElementById(id); if(el) el.checked=!!d[id];}); ['mention_threshold','starboard_channel_id','starboard_threshold','autorole_id','raid_join_threshold','raid_join_window_sec','econ_daily_min','econ_daily_max','econ_work_min','econ_work_max','transcript_channel_id'].forEach(id=>{const el=document.getElementById(id); if(el) el.value=d[id]??'';}); logBox('badwordBox',(d.bad_words||[]).map(x=>`• ${escapeHtml(x)}`).join('<br/>')||'Aucun mot.'); }
-async function saveAddons(){ const payload={k:keyVal(),g:guildVal(),anti_mention_spam:document.getElementById('anti_mention_spam').checked,mention_threshold:document.getElementById('mention_threshold').value,anti_bad_words:document.getElementById('anti_bad_words').checked,anti_duplicate:document.getElementById('anti_duplicate').checked,anti_ghost_ping:document.getElementById('anti_ghost_ping').checked,starboard_enabled:document.getElementById('starboard_enabled').checked,starboard_channel_id:document.getElementById('starboard_channel_id').value,starboard_threshold:document.getElementById('starboard_threshold').value,snipe_enabled:document.getElementById('snipe_enabled').checked,dm_welcome_enabled:document.getElementById('dm_welcome_enabled').checked,autorole_enabled:document.getElementById('autorole_enabled').checked,autorole_id:document.getElementById('autorole_id').value,suggest_autoreact:document.getElementById('suggest_autoreact').checked,raid_join_enabled:document.getElementById('raid_join_enabled').checked,raid_join_threshold:document.getElementById('raid_join_threshold').value,raid_join_window_sec:document.getElementById('raid_join_window_sec').value,econ_daily_min:document.getElementById('econ_daily_min').value,econ_daily_max:document.getElementById('econ_daily_max').value,econ_work_min:document.getElementById('econ_work_min').value,econ_work_max:document.getElementById('econ_work_max').value,transcript_channel_id:document.getElementById('transcript_channel_id').value}; const d=await api('/api/addons/set', payload); document.getElementById('addonsMsg').innerText=d.error?('Erreur: '+d.error):'Addons sauvegardés.'; }
+async function loadAddons(){ const d = await api('/api/addons/get', {k:keyVal(), g:guildVal()}); if(d.error) return; const ids=['anti_mention_spam','anti_bad_words','badwords_whole_word','badwords_normalize','anti_duplicate','anti_ghost_ping','starboard_enabled','snipe_enabled','dm_welcome_enabled','autorole_enabled','suggest_autoreact','raid_join_enabled','raid_cluster_quarantine']; ids.forEach(id=>{const el=document.getElementById(id); if(el) el.checked=!!d[id];}); ['mention_threshold','starboard_channel_id','starboard_threshold','autorole_id','raid_join_threshold','raid_join_window_sec','raid_quarantine_role_id','econ_daily_min','econ_daily_max','econ_work_min','econ_work_max','transcript_channel_id'].forEach(id=>{const el=document.getElementById(id); if(el) el.value=d[id]??'';}); logBox('badwordBox',(d.bad_words||[]).map(x=>`• ${escapeHtml(x)}`).join('<br/>')||'Aucun mot.'); }
+async function saveAddons(){ const payload={k:keyVal(),g:guildVal(),anti_mention_spam:document.getElementById('anti_mention_spam').checked,mention_threshold:document.getElementById('mention_threshold').value,anti_bad_words:document.getElementById('anti_bad_words').checked,badwords_whole_word:document.getElementById('badwords_whole_word').checked,badwords_normalize:document.getElementById('badwords_normalize').checked,anti_duplicate:document.getElementById('anti_duplicate').checked,anti_ghost_ping:document.getElementById('anti_ghost_ping').checked,starboard_enabled:document.getElementById('starboard_enabled').checked,starboard_channel_id:document.getElementById('starboard_channel_id').value,starboard_threshold:document.getElementById('starboard_threshold').value,snipe_enabled:document.getElementById('snipe_enabled').checked,dm_welcome_enabled:document.getElementById('dm_welcome_enabled').checked,autorole_enabled:document.getElementById('autorole_enabled').checked,autorole_id:document.getElementById('autorole_id').value,suggest_autoreact:document.getElementById('suggest_autoreact').checked,raid_join_enabled:document.getElementById('raid_join_enabled').checked,raid_join_threshold:document.getElementById('raid_join_threshold').value,raid_join_window_sec:document.getElementById('raid_join_window_sec').value,raid_quarantine_role_id:document.getElementById('raid_quarantine_role_id').value,raid_cluster_quarantine:document.getElementById('raid_cluster_quarantine').checked,econ_daily_min:document.getElementById('econ_daily_min').value,econ_daily_max:document.getElementById('econ_daily_max').value,econ_work_min:document.getElementById('econ_work_min').value,econ_work_max:document.getElementById('econ_work_max').value,transcript_channel_id:document.getElementById('transcript_channel_id').value}; const d=await api('/api/addons/set', payload); document.getElementById('addonsMsg').innerText=d.error?('Erreur: '+d.error):'Addons sauvegardés.'; }
 async function addBadword(){ const word=document.getElementById('badword_input').value.trim(); const d=await api('/api/badwords/add',{k:keyVal(),g:guildVal(),word}); if(d.error) return alert(d.error); logBox('badwordBox',(d.items||[]).map(x=>`• ${escapeHtml(x)}`).join('<br/>')||'Aucun mot.'); }
 async function removeBadword(){ const word=document.getElementById('badword_input').value.trim(); const d=await api('/api/badwords/remove',{k:keyVal(),g:guildVal(),word}); if(d.error) return alert(d.error); logBox('badwordBox',(d.items||[]).map(x=>`• ${escapeHtml(x)}`).join('<br/>')||'Aucun mot.'); }
-async function loadOverview(){ const d=await api('/api/stats/overview',{k:keyVal(),g:guildVal()}); if(d.error) return alert(d.error); let lines=[]; lines.push(`Serveur: ${d.name}`); lines.push(`Membres: ${d.members} (humains ${d.humans} / bots ${d.bots})`); lines.push(`Salons texte: ${d.text_channels} | vocaux: ${d.voice_channels}`); lines.push(`Rôles: ${d.roles} | Shop: ${d.shop_items}`); if(Array.isArray(d.xp_top)){ lines.push('--- XP Top ---'); d.xp_top.forEach((x,i)=>lines.push(`${i+1}. ${x.user_id} — lvl ${x.level} (${x.xp} xp)`)); } logBox('overviewBox', lines.map(escapeHtml).join('<br/>')); }
-async function loadHealthApi(){ const r=await fetch('/api/healthz'); const d=await r.json(); let lines=Object.keys(d).map(k=>`${k}: ${d[k]}`); logBox('healthApiBox', lines.map(escapeHtml).join('<br/>')); }
+async function loadOverview(){ const d=await fetchOverview(); if(d.error) return alert(d.error); let lines=[]; lines.push(`Serveur: ${d.name}`); lines.push(`Membres: ${d.members} (humains ${d.humans} / bots ${d.bots})`); lines.push(`Salons texte: ${d.text_channels} | vocaux: ${d.voice_channels}`); lines.push(`Rôles: ${d.roles} | Shop: ${d.shop_items}`); if(Array.isArray(d.xp_top)){ lines.push('--- XP Top ---'); d.xp_top.forEach((x,i)=>lines.push(`${i+1}. ${x.user_id} — lvl ${x.level} (${x.xp} xp)`)); } logBox('overviewBox', lines.map(escapeHtml).join('<br/>')); }
+async function loadHealthApi(){ const d=bootSection('/api/healthz') || await (await fetch('/api/healthz')).json(); let lines=Object.keys(d).map(k=>`${k}: ${d[k]}`); logBox('healthApiBox', lines.map(escapeHtml).join('<br/>')); }
 async function saveEconomyConfig(){ const payload={k:keyVal(),g:guildVal(),econ_daily_min:document.getElementById('econ_daily_min').value,econ_daily_max:document.getElementById('econ_daily_max').value,econ_work_min:document.getElementById('econ_work_min').value,econ_work_max:document.getElementById('econ_work_max').value}; const d=await api('/api/economy/config/set', payload); if(d.error) return alert(d.error); alert('Réglages économie sauvegardés.'); }
 async function loadEcoUser(){ const uid=document.getElementById('eco_user_id').value.trim(); const d=await api('/api/economy/user/get',{k:keyVal(),g:guildVal(),u:uid}); if(d.error) return alert(d.error); document.getElementById('eco_balance').value=d.balance??0; document.getElementById('ecoUserMsg').innerText='Utilisateur chargé.'; }
 async function saveEcoUser(){ const uid=document.getElementById('eco_user_id').value.trim(); const balance=document.getElementById('eco_balance').value.trim(); const d=await api('/api/economy/user/set',{k:keyVal(),g:guildVal(),u:uid,balance}); document.getElementById('ecoUserMsg').innerText=d.error?('Erreur: '+d.error):('Balance enregistrée: '+d.balance); }
@@ -3118,13 +6134,18 @@ patch_panel_html()
 async def main():
     db_init()
     db_init_plus()
+    RR_INDEX.load()
     asyncio.create_task(start_bot_safely())
     config = uvicorn.Config(app, host='0.0.0.0', port=PORT, log_level='info')
     server = uvicorn.Server(config)
-    await server.serve()
-
-if __name__ == '__main__':
-    asyncio.run(main())
+    try:
+        await server.serve()
+    finally:
+        DB_EXECUTOR.shutdown()
+        XP_STORE.flush()
+        HOT_STATE.checkpoint()
+        DB_POOL.close_all()
+        LOG_STDOUT.stop()
 
 
 # =========================================================
@@ -3300,7 +6321,7 @@ def ultra_panel_patch():
     PANEL_HTML = PANEL_HTML.replace('</script>', """
 async function loadOverview(){
   try{
-    const d = await api('/api/stats/overview',{k:keyVal(),g:guildVal()});
+    const d = await fetchOverview();
     if(d.error) return alert(d.error);
     const set = (id,val)=>{ const el=document.getElementById(id); if(el) el.innerText=val; };
     set('kpiMembers', d.members ?? '-');
@@ -3315,7 +6336,7 @@ async function saveCustomCommand(){ const d=await api('/api/customcommands/add',
 async function listCustomCommands(){ const d=await api('/api/customcommands/list',{k:keyVal(),g:guildVal()}); if(d.error) return alert(d.error); document.getElementById('customBox').innerHTML=(d.items||[]).map(x=>`!${escapeHtml(x.trigger)} → ${escapeHtml(x.response)}`).join('<br/>') || 'Aucune.'; }
 async function saveAutoResponse(){ const d=await api('/api/autoresponses/add',{k:keyVal(),g:guildVal(),trigger:document.getElementById('auto_trigger').value,response:document.getElementById('auto_response').value,exact_match:document.getElementById('auto_exact').checked}); if(d.error) return alert(d.error); alert('Auto-response ajoutée'); }
 async function loadAutoResponses(){ const d=await api('/api/autoresponses/list',{k:keyVal(),g:guildVal()}); if(d.error) return alert(d.error); document.getElementById('automationBox').innerHTML=(d.items||[]).map(x=>`${escapeHtml(x.trigger)} → ${escapeHtml(x.response)}`).join('<br/>') || 'Aucune.'; }
-(function(){ const _oldLoadAll = typeof loadAll === 'function' ? loadAll : null; if(_oldLoadAll){ loadAll = async function(){ await _oldLoadAll(); try{ const botState=(document.getElementById('botState')||{}).innerText||'unknown'; const guilds=(document.getElementById('guildCount')||{}).innerText||'0'; const uptime=(document.getElementById('uptime')||{}).innerText||'-'; const connected=botState==='connected'; const setText=(id,val)=>{ const el=document.getElementById(id); if(el) el.innerText=val; }; setText('dashBotState',botState); setText('dashGuilds',guilds); setText('dashUptime',uptime); const badge=document.getElementById('dashBotBadge'); if(badge){ badge.className = connected ? 'ultra-badge ok' : 'ultra-badge bad'; badge.innerText = connected ? 'Connecté' : 'Offline'; } await loadOverview(); const r=await fetch('/api/logs'); const arr=await r.json(); const box=document.getElementById('dashboardLogBox'); if(box && Array.isArray(arr)){ box.innerHTML = arr.slice().reverse().slice(0,12).map(x=>`<div>${escapeHtml(x)}</div>`).join(''); } }catch(e){} } }})();
+(function(){ const _oldLoadAll = typeof loadAll === 'function' ? loadAll : null; if(_oldLoadAll){ loadAll = async function(){ await _oldLoadAll(); try{ const botState=(document.getElementById('botState')||{}).innerText||'unknown'; const guilds=(document.getElementById('guildCount')||{}).innerText||'0'; const uptime=(document.getElementById('uptime')||{}).innerText||'-'; const connected=botState==='connected'; const setText=(id,val)=>{ const el=document.getElementById(id); if(el) el.innerText=val; }; setText('dashBotState',botState); setText('dashGuilds',guilds); setText('dashUptime',uptime); const badge=document.getElementById('dashBotBadge'); if(badge){ badge.className = connected ? 'ultra-badge ok' : 'ultra-badge bad'; badge.innerText = connected ? 'Connecté' : 'Offline'; } await loadOverview(); const arr=LOG_LINES; const box=document.getElementById('dashboardLogBox'); if(box && Array.isArray(arr)){ box.innerHTML = arr.slice().reverse().slice(0,12).map(x=>`<div>${escapeHtml(x)}</div>`).join(''); } }catch(e){} } }})();
 </script>""")
 
 # lightweight extra db
@@ -3324,22 +6345,159 @@ def ultra_db_init():
     con = db_connect(); cur = con.cursor()
     cur.execute("CREATE TABLE IF NOT EXISTS custom_commands (guild_id INTEGER NOT NULL, trigger TEXT NOT NULL, response TEXT NOT NULL, PRIMARY KEY (guild_id, trigger))")
     cur.execute("CREATE TABLE IF NOT EXISTS auto_responses (guild_id INTEGER NOT NULL, trigger TEXT NOT NULL, response TEXT NOT NULL, exact_match INTEGER DEFAULT 0, PRIMARY KEY (guild_id, trigger))")
-    con.commit(); con.close()
+    con.commit()
 
 def cc_add(gid, trigger, response):
-    con = db_connect(); cur = con.cursor(); cur.execute("INSERT OR REPLACE INTO custom_commands(guild_id,trigger,response) VALUES (?,?,?)", (gid, trigger.lower().strip(), response)); con.commit(); con.close()
+    con = db_connect(); cur = con.cursor(); cur.execute("INSERT OR REPLACE INTO custom_commands(guild_id,trigger,response) VALUES (?,?,?)", (gid, trigger.lower().strip(), response)); con.commit()
+    TRIGGERS.invalidate(gid)
 
 def cc_list(gid):
     return _db_all("SELECT * FROM custom_commands WHERE guild_id=? ORDER BY trigger ASC", (gid,)) if '_db_all' in globals() else []
 
 def ar_add(gid, trigger, response, exact):
-    con = db_connect(); cur = con.cursor(); cur.execute("INSERT OR REPLACE INTO auto_responses(guild_id,trigger,response,exact_match) VALUES (?,?,?,?)", (gid, trigger.lower().strip(), response, exact)); con.commit(); con.close()
+    con = db_connect(); cur = con.cursor(); cur.execute("INSERT OR REPLACE INTO auto_responses(guild_id,trigger,response,exact_match) VALUES (?,?,?,?)", (gid, trigger.lower().strip(), response, exact)); con.commit()
+    TRIGGERS.invalidate(gid)
 
 def ar_list(gid):
     return _db_all("SELECT * FROM auto_responses WHERE guild_id=? ORDER BY trigger ASC", (gid,)) if '_db_all' in globals() else []
 
 def _db_all(query, params=()):
-    con = db_connect(); cur = con.cursor(); cur.execute(query, params); rows = cur.fetchall(); con.close(); return [dict(r) for r in rows]
+    con = db_connect(); cur = con.cursor(); cur.execute(query, params); rows = cur.fetchall(); return [dict(r) for r in rows]
+
+cc_add_async = db_async(cc_add)
+cc_list_async = db_async(cc_list)
+ar_add_async = db_async(ar_add)
+ar_list_async = db_async(ar_list)
+
+TRIGGER_COOLDOWN_SEC = float(os.environ.get("TRIGGER_COOLDOWN_SEC", 5))
+
+class GuildTriggers:
+    """One guild's custom commands and auto-responses, compiled for per-message matching.
+
+    Custom commands are a dict keyed by name (what follows '!'), built-in
+    commands win on a clash. Exact auto-responses are a dict keyed by the
+    lowercased, whitespace-normalised message; substring auto-responses
+    share one AhoCorasick automaton, so a message is scanned once, and only
+    count when they sit on word boundaries ('hi' does not fire on 'this').
+    """
+
+    def __init__(self, commands: List[Dict[str, Any]], responses: List[Dict[str, Any]]):
+        self.commands: Dict[str, str] = {}
+        self.exact: Dict[str, str] = {}
+        self.substring: Dict[str, str] = {}
+        for r in commands:
+            key = str(r["trigger"]).lower().strip().lstrip("!").strip()
+            if key and key not in bot.all_commands:
+                self.commands[key] = r["response"]
+        for r in responses:
+            key = " ".join(str(r["trigger"]).lower().split())
+            if key:
+                (self.exact if r.get("exact_match") else self.substring)[key] = r["response"]
+        self._automaton = AhoCorasick(self.substring.keys()) if self.substring else None
+
+    def __len__(self):
+        return len(self.commands) + len(self.exact) + len(self.substring)
+
+    def match(self, content: str) -> Optional[Tuple[str, str]]:
+        """Return (trigger key, response) for a message, or None."""
+        text = " ".join(content.lower().split())
+        if self.commands and text.startswith("!"):
+            body = text[1:].strip()
+            name = body.split(" ", 1)[0]
+            response = self.commands.get(name) or self.commands.get(body)
+            if response:
+                return "!" + (name if name in self.commands else body), response
+        response = self.exact.get(text)
+        if response:
+            return text, response
+        if self._automaton is not None:
+            for start, key in self._automaton.iter_matches(text):
+                end = start + len(key)
+                if start > 0 and _is_word_char(key[0]) and _is_word_char(text[start - 1]):
+                    continue
+                if end < len(text) and _is_word_char(key[-1]) and _is_word_char(text[end]):
+                    continue
+                return key, self.substring[key]
+        return None
+
+class TriggerCache:
+    """Compiled GuildTriggers per guild plus per-channel trigger cooldowns.
+
+    Loaded once per guild on the DB thread and dropped by cc_add/ar_add, so
+    messages never query SQLite.
+    """
+
+    def __init__(self):
+        self._guilds: Dict[int, GuildTriggers] = {}
+        self._last_fired: Dict[Tuple[int, str], float] = {}
+        self.builds = 0
+        self.fired = 0
+        self.cooled = 0
+
+    def peek(self, guild_id: int) -> Optional[GuildTriggers]:
+        return self._guilds.get(guild_id)
+
+    def build(self, guild_id: int) -> GuildTriggers:
+        """Load both tables and compile them (DB thread)."""
+        triggers = GuildTriggers(cc_list(guild_id), ar_list(guild_id))
+        self._guilds[guild_id] = triggers
+        self.builds += 1
+        return triggers
+
+    def invalidate(self, guild_id: int):
+        self._guilds.pop(guild_id, None)
+
+    def allow(self, channel_id: int, key: str, now: float) -> bool:
+        """Per (channel, trigger) cooldown; records the firing when allowed."""
+        last = self._last_fired.get((channel_id, key))
+        if last is not None and now - last < TRIGGER_COOLDOWN_SEC:
+            self.cooled += 1
+            return False
+        if len(self._last_fired) > 10000:
+            cutoff = now - TRIGGER_COOLDOWN_SEC
+            self._last_fired = {k: v for k, v in self._last_fired.items() if v >= cutoff}
+        self._last_fired[(channel_id, key)] = now
+        self.fired += 1
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "guilds": len(self._guilds),
+            "triggers": sum(len(t) for t in self._guilds.values()),
+            "builds": self.builds,
+            "fired": self.fired,
+            "cooled": self.cooled,
+        }
+
+TRIGGERS = TriggerCache()
+
+async def guild_triggers_async(guild_id: int) -> GuildTriggers:
+    triggers = TRIGGERS.peek(guild_id)
+    if triggers is None:
+        triggers = await DB_EXECUTOR.run(TRIGGERS.build, guild_id)
+    return triggers
+
+async def triggers_on_message(message: discord.Message) -> bool:
+    """Answer custom commands and auto-responses; True when a custom command matched."""
+    if not message.guild or message.author.bot or not message.content:
+        return False
+    triggers = await guild_triggers_async(message.guild.id)
+    if not len(triggers):
+        return False
+    hit = triggers.match(message.content)
+    if hit is None:
+        return False
+    # custom commands are not bot commands: keep them away from process_commands
+    # (CommandNotFound), even when the cooldown swallows the reply
+    is_command = hit[0].startswith("!")
+    if not TRIGGERS.allow(message.channel.id, hit[0], time.time()):
+        return is_command
+    response = hit[1].replace("{user}", message.author.mention).replace("{server}", message.guild.name)
+    try:
+        await message.channel.send(response)
+    except Exception:
+        pass
+    return is_command
 
 @app.post('/api/customcommands/add')
 async def api_customcommands_add(request: Request):
@@ -3347,7 +6505,7 @@ async def api_customcommands_add(request: Request):
     if auth(data): return JSONResponse({'error': auth(data)}, status_code=403)
     gid = int(data.get('g') or 0); trig = str(data.get('trigger') or '').strip(); resp = str(data.get('response') or '').strip()
     if gid <= 0 or not trig or not resp: return {'error':'Paramètres invalides.'}
-    cc_add(gid, trig, resp); return {'ok': True}
+    await cc_add_async(gid, trig, resp); return {'ok': True}
 
 @app.post('/api/customcommands/list')
 async def api_customcommands_list(request: Request):
@@ -3355,7 +6513,7 @@ async def api_customcommands_list(request: Request):
     if auth(data): return JSONResponse({'error': auth(data)}, status_code=403)
     gid = int(data.get('g') or 0)
     if gid <= 0: return {'error':'Guild invalide.'}
-    return {'items': cc_list(gid)}
+    return {'items': await cc_list_async(gid)}
 
 @app.post('/api/autoresponses/add')
 async def api_autoresponses_add(request: Request):
@@ -3363,7 +6521,7 @@ async def api_autoresponses_add(request: Request):
     if auth(data): return JSONResponse({'error': auth(data)}, status_code=403)
     gid = int(data.get('g') or 0); trig = str(data.get('trigger') or '').strip(); resp = str(data.get('response') or '').strip(); exact = 1 if data.get('exact_match') else 0
     if gid <= 0 or not trig or not resp: return {'error':'Paramètres invalides.'}
-    ar_add(gid, trig, resp, exact); return {'ok': True}
+    await ar_add_async(gid, trig, resp, exact); return {'ok': True}
 
 @app.post('/api/autoresponses/list')
 async def api_autoresponses_list(request: Request):
@@ -3371,7 +6529,7 @@ async def api_autoresponses_list(request: Request):
     if auth(data): return JSONResponse({'error': auth(data)}, status_code=403)
     gid = int(data.get('g') or 0)
     if gid <= 0: return {'error':'Guild invalide.'}
-    return {'items': ar_list(gid)}
+    return {'items': await ar_list_async(gid)}
 
 try:
     ultra_db_init()
@@ -3572,7 +6730,7 @@ def leviathan_dyno_style_patch():
         """
 async function dynoHydrateOverview(){
   try{
-    const d = await api('/api/stats/overview', {k:keyVal(), g:guildVal()});
+    const d = await fetchOverview();
     if(d.error) return;
     const setText = (id, val) => { const el=document.getElementById(id); if(el) el.innerText = val; };
     setText('dynoMembers', d.members ?? '-');
@@ -3601,8 +6759,7 @@ async function dynoHydrateOverview(){
           badge.innerText = connected ? 'Connecté' : 'Offline';
         }
         await dynoHydrateOverview();
-        const r = await fetch('/api/logs');
-        const arr = await r.json();
+        const arr = LOG_LINES;
         const box = document.getElementById('dynoQuickLog');
         if(box && Array.isArray(arr)){
           box.innerHTML = arr.slice().reverse().slice(0, 14).map(x => `<div>${escapeHtml(x)}</div>`).join('');
@@ -3615,3 +6772,6 @@ async function dynoHydrateOverview(){
     )
 
 leviathan_dyno_style_patch()
+
+if __name__ == '__main__':
+    asyncio.run(main())